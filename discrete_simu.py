@@ -7,7 +7,9 @@ import simpy
 from numpy.random import RandomState
 import pylru
 from offline.core.sla import generate_random_slas
-from offline.core.substrate import Substrate
+from offline.core.substrate import Substrate, parse_links
+from offline.core.topology_cache import load_topology
+from offline.core.topology_prep import giant_component
 from offline.core.utils import printProgress
 from offline.discrete.ContentHistory import ContentHistory
 from offline.discrete.Contents import get_content_generator
@@ -38,6 +40,8 @@ root.addHandler(ch)
 
 link_id = "5511"
 #link_id = "dummy"
+# remove the degree 1 chains of the topology, they never host a service
+prune_links = False
 
 # CDN
 cdn_count = 6
@@ -191,24 +195,19 @@ g = nx.Graph()
 if link_id == "dummy":
     print("powerlaw graph selecteds")
     _, su = clean_and_create_experiment(("powerlaw", (2000, 3, 0.5, 1, 1000000000, 20, 200,)), seed=6)
-    g = su.get_nxgraph()
+    edges = list(su.get_nxgraph().edges())
 
 else:
     print("links %s graph selected" % link_id)
-    with open(os.path.join("offline/data", "links", "operator-%s.links" % link_id)) as f:
-        for line in f.read().split("\n"):
-            nodes = line.strip().split(" ")
-            while len(nodes) >= 2:
-                root = nodes.pop(0)
-                for node in nodes:
-                    g.add_edge(root, node)
+    # parsed once, then loaded from the topology cache
+    edges = [(node_1, node_2) for node_1, node_2, bandwidth, delay in
+             load_topology(os.path.join("offline/data", "links", "operator-%s.links" % link_id), parse_links).edges()]
 
 # take the biggest connected subgraph
-g = max(list({sg: len(sg.nodes()) for sg in nx.connected_component_subgraphs(g)}.items()),
-        key=operator.itemgetter(1))[0]
+names, edges = giant_component(edges, 100000000000000, prune=prune_links)
+g.add_nodes_from(names)
+g.add_edges_from([(node_1, node_2, {"bandwidth": bandwidth}) for node_1, node_2, bandwidth in edges])
 Topo.g = g
-for e0, e1 in g.edges():
-    g.edge[e0][e1]["bandwidth"] = g.degree(e0) * g.degree(e1) * 100000000000000
 
 rs = RandomState(seed=5)
 
@@ -275,7 +274,7 @@ setup_nodes(g)
 #exit(-1)
 # print("graph saved in graphml")
 
-:= ContentHistory(windows=POPULAR_WINDOWS_SIZE, count=POPULAR_HISTORY_COUNT)
+contentHistory = ContentHistory(windows=POPULAR_WINDOWS_SIZE, count=POPULAR_HISTORY_COUNT)
 
 content_draw = get_content_generator(rs, zipf_param, contentHistory, 5000000, 1, content_duration)
 
@@ -0,0 +1,172 @@
+import numpy as np
+
+# "exact" finds the best partition, "kmedoids" a good one, "auto" picks exact up to EXACT_LIMIT nodes
+CLUSTERING_MODES = ("auto", "exact", "kmedoids")
+
+# see set_clustering_mode
+clustering_mode = "auto"
+
+# the largest node count clustered exactly in "auto" mode
+EXACT_LIMIT = 12
+
+# the number of k-medoids runs, the first one starts from the greedy medoids, the others from random ones
+RESTARTS = 8
+
+
+def set_clustering_mode(mode):
+    '''
+    :param mode: one of CLUSTERING_MODES
+    '''
+    global clustering_mode
+    if mode not in CLUSTERING_MODES:
+        raise ValueError("not a valid clustering mode %s, use one of %s" % (mode, ", ".join(CLUSTERING_MODES)))
+    clustering_mode = mode
+
+
+def partition_score(distances, labels):
+    '''
+    :param distances: the symmetric matrix of the distances between the nodes
+    :param labels: the class of each node
+    :return: the sum, over the classes, of the distances between every pair of nodes of the class
+    '''
+    labels = np.asarray(labels)
+    return float((distances * (labels[:, None] == labels[None, :])).sum() / 2)
+
+
+def exact_clusters(distances, class_count):
+    '''
+    the best partition of the nodes into class_count non empty classes, by dynamic programming over the subsets of the
+    nodes: a subset is split into the class of its first node and the best partition of the remaining nodes
+    :return: the class of each node
+    '''
+    n = len(distances)
+    members = [[j for j in range(n) if mask >> j & 1] for mask in range(1 << n)]
+
+    # the score of each subset taken as a single class
+    cost = [0.0] * (1 << n)
+    for mask in range(1, 1 << n):
+        first = members[mask][0]
+        rest = mask & (mask - 1)
+        cost[mask] = cost[rest] + sum([distances[first][j] for j in members[rest]])
+
+    best = {}
+
+    def split(mask, count):
+        '''
+        :return: (score, first class) of the best partition of mask into count classes
+        '''
+        if count == 1:
+            return cost[mask], mask
+        if (mask, count) not in best:
+            res = (float("inf"), None)
+            low = mask & -mask
+            rest = mask ^ low
+            # the other members of the class of the first node
+            sub = rest
+            while True:
+                remaining = rest ^ sub
+                if len(members[remaining]) >= count - 1:
+                    score = cost[sub | low] + split(remaining, count - 1)[0]
+                    if score < res[0]:
+                        res = (score, sub | low)
+                if sub == 0:
+                    break
+                sub = (sub - 1) & rest
+            best[(mask, count)] = res
+        return best[(mask, count)]
+
+    labels = np.zeros(n, dtype=int)
+    mask = (1 << n) - 1
+    for count in range(class_count, 0, -1):
+        cluster = split(mask, count)[1]
+        labels[members[cluster]] = class_count - count
+        mask ^= cluster
+    return labels
+
+
+def improve(distances, labels, class_count):
+    '''
+    move nodes from a class to another as long as it lowers the partition score, without emptying a class
+    :return: the class of each node
+    '''
+    labels = np.array(labels)
+    n = len(distances)
+    for _ in range(n * n):
+        # the distance from each node to each class
+        to_class = distances.dot(np.eye(class_count)[labels])
+        sizes = np.bincount(labels, minlength=class_count)
+        delta = to_class - to_class[np.arange(n), labels][:, None]
+        delta[sizes[labels] == 1, :] = 0
+        node, target = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[node, target] >= -1e-9:
+            break
+        labels[node] = target
+    return labels
+
+
+def kmedoids_clusters(distances, class_count, restarts=RESTARTS, rs=None):
+    '''
+    an approximate partition of the nodes into class_count non empty classes: k-medoids runs from several starting
+    medoids, each refined by moving single nodes, and the best partition is kept
+    :return: the class of each node
+    '''
+    n = len(distances)
+    rs = np.random.RandomState(0) if rs is None else rs
+    best_labels, best_score = None, float("inf")
+
+    for restart in range(restarts):
+        if restart == 0:
+            # greedy start: the most central node, then the nodes that reduce the total distance the most
+            medoids = [int(np.argmin(distances.sum(axis=1)))]
+            while len(medoids) < class_count:
+                nearest = distances[:, medoids].min(axis=1)
+                gains = np.maximum(nearest[:, None] - distances, 0).sum(axis=0)
+                gains[medoids] = -1
+                medoids.append(int(np.argmax(gains)))
+        else:
+            medoids = list(rs.choice(n, class_count, replace=False))
+
+        for _ in range(n):
+            labels = np.argmin(distances[:, medoids], axis=1)
+            labels[medoids] = np.arange(class_count)
+            updated = []
+            for k in range(class_count):
+                cluster = np.flatnonzero(labels == k)
+                updated.append(int(cluster[np.argmin(distances[np.ix_(cluster, cluster)].sum(axis=1))]))
+            if updated == medoids:
+                break
+            medoids = updated
+
+        labels = improve(distances, labels, class_count)
+        score = partition_score(distances, labels)
+        if score < best_score:
+            best_labels, best_score = labels, score
+
+    return best_labels
+
+
+def cluster_nodes(nodes, class_count, distances, mode=None):
+    '''
+    split the nodes into class_count classes, minimizing the sum of the distances between the nodes of a same class
+    :param nodes: a sorted list of node names
+    :param class_count: the number of classes, at most len(nodes)
+    :param distances: the symmetric matrix of the distances between the nodes
+    :param mode: one of CLUSTERING_MODES, defaults to the one set by set_clustering_mode
+    :return: (score, {node: class}), classes are numbered from 1 in the order of their first node
+    '''
+    mode = clustering_mode if mode is None else mode
+    if len(nodes) == 0 or class_count < 1:
+        return 0, {}
+    class_count = min(class_count, len(nodes))
+    distances = np.asarray(distances, dtype=float)
+
+    if mode == "exact" or (mode == "auto" and len(nodes) <= EXACT_LIMIT):
+        labels = exact_clusters(distances, class_count)
+    else:
+        labels = kmedoids_clusters(distances, class_count)
+
+    classes = {}
+    res = {}
+    for node, label in zip(nodes, labels):
+        res[node] = classes.setdefault(label, len(classes) + 1)
+    return partition_score(distances, labels), res
@@ -0,0 +1,386 @@
+import heapq
+import logging
+import time
+
+import numpy as np
+from scipy.optimize import linprog, milp, Bounds
+
+from ..core.milp import EmbeddingModel, ConstraintBuilder
+from ..core.model import PRICING_FOLDER
+
+# a path prices in if its reduced cost is below -EPSILON times the cost of one of its hops
+EPSILON = 1e-6
+
+# column generation stops when the LP has not improved by more than STOP_GAP in STALL_ITERATIONS rounds
+STOP_GAP = 1e-4
+STALL_ITERATIONS = 5
+
+# the number of multipliers of the delay tried when the cheapest path toward a node is too long
+LAGRANGE_STEPS = 4
+
+
+class PathEmbeddingModel(EmbeddingModel):
+    '''
+    path formulation of optim.zpl.tpl: every service edge picks one substrate path between the nodes hosting its ends,
+    among the paths that meet its delay bound, instead of routing a flow on every arc. Paths are generated by column
+    generation on the LP relaxation, then the integer model is solved on the generated paths (price and branch).
+    '''
+
+    def __init__(self, model, pricing_dir=PRICING_FOLDER):
+        EmbeddingModel.__init__(self, model, pricing_dir)
+
+        # the delay bound of a service edge is the tightest of the service paths it belongs to
+        self.max_delay = [np.inf] * len(self.ES)
+        for path, i, j in self.SERVICE_PATHS:
+            if path in self.SERVICE_PATHS_DELAY and (i, j) in self.eidx:
+                k = self.eidx[(i, j)]
+                self.max_delay[k] = min(self.max_delay[k], self.SERVICE_PATHS_DELAY[path])
+
+        # the substrate nodes that may host each service node
+        starters = dict([(name, topo) for name, topo in self.STARTERS_MAPPING])
+        self.hosts = {}
+        for snode in self.NS:
+            if snode in starters:
+                self.hosts[snode] = [self.nidx[starters[snode]]]
+            elif snode in self.CDN_LABEL:
+                self.hosts[snode] = [n for n, node in enumerate(self.N) if (snode, node) in self.CDN_MAPPING]
+            else:
+                self.hosts[snode] = list(range(len(self.N)))
+
+        self.routed = [k for k, (i, j) in enumerate(self.ES) if i != j]
+
+        # columns are (service edge, source node, destination node, arcs)
+        self.columns = []
+        self.column_set = set()
+        self.seed_columns()
+
+        # the cost of leaving a service edge unrouted in the LP, more than any path can cost
+        self.hop_cost = np.max(self.bwS, initial=0) * self.netCost or 1.0
+        self.artificial_cost = self.hop_cost * (len(self.E) + 1) * 10
+
+    def add_column(self, k, source, destination, arcs):
+        '''
+        :return: True if the path was not a column yet
+        '''
+        column = (k, source, destination, tuple(arcs))
+        if column in self.column_set:
+            return False
+        self.column_set.add(column)
+        self.columns.append(column)
+        return True
+
+    def seed_columns(self):
+        '''
+        start with the colocated ends, which need no path, and with the fewest hops paths from every host of the source
+        of a service edge when it has few hosts (starters), or toward every host of its destination (CDNs)
+        '''
+        hops = np.ones(len(self.arcs))
+        for k in self.routed:
+            i, j = self.ES[k]
+            for n in set(self.hosts[i]) & set(self.hosts[j]):
+                self.add_column(k, n, n, ())
+
+            if len(self.hosts[i]) < len(self.N) and len(self.hosts[i]) <= len(self.hosts[j]):
+                for source in self.hosts[i]:
+                    reached = self.cheapest_paths(hops, 0.0, {source: 0.0})
+                    for n in self.hosts[j]:
+                        if n in reached and reached[n][3] <= self.max_delay[k]:
+                            self.add_column(k, source, n, self.path_to(reached, n))
+            elif len(self.hosts[j]) < len(self.N):
+                reverse = [self.aidx[(v, u)] for u, v in self.arcs]
+                for destination in self.hosts[j]:
+                    reached = self.cheapest_paths(hops, 0.0, {destination: 0.0})
+                    for n in self.hosts[i]:
+                        if n in reached and reached[n][3] <= self.max_delay[k]:
+                            arcs = [reverse[a] for a in reversed(self.path_to(reached, n))]
+                            self.add_column(k, n, destination, arcs)
+
+    def z(self, column):
+        return self.x_count + column
+
+    def artificial(self, k, n, side):
+        '''
+        the slack of the link between the paths of the service edge k and the node n, side is 0 for the source of the
+        edge and 1 for its destination
+        '''
+        return self.x_count + len(self.columns) + (k * len(self.N) + n) * 2 + side
+
+    def build(self, relaxed):
+        '''
+        :param relaxed: if True, the artificial variables are allowed and the columns are not bounded by 1
+        :return: c, bounds and the equality and inequality constraints
+        '''
+        var_count = self.x_count + len(self.columns) + len(self.ES) * len(self.N) * 2
+        c = np.zeros(var_count)
+        lb = np.zeros(var_count)
+        ub = np.ones(var_count)
+
+        for s, snode in enumerate(self.NS):
+            hosts = set(self.hosts[snode])
+            for n in range(len(self.N)):
+                if n not in hosts:
+                    ub[n * len(self.NS) + s] = 0
+        for name, topo in self.STARTERS_MAPPING:
+            lb[self.x(topo, name)] = 1
+
+        for col, (k, source, destination, arcs) in enumerate(self.columns):
+            c[self.z(col)] = self.bwS[k] * self.netCost * len(arcs)
+            if relaxed:
+                ub[self.z(col)] = np.inf
+
+        artificials = slice(self.x_count + len(self.columns), var_count)
+        if relaxed:
+            c[artificials] = self.artificial_cost
+        else:
+            ub[artificials] = 0
+
+        eq = ConstraintBuilder()
+        ineq = ConstraintBuilder()
+
+        # everyNodeIsMapped
+        for j in self.NS:
+            if j not in self.CDN_LABEL:
+                eq.add([(self.x(i, j), 1) for i in self.N], 1, 1)
+
+        # popRes
+        for i in self.N:
+            ineq.add([(self.x(i, j), self.cpuS[j]) for j in self.NS], -np.inf, self.cpu[self.nidx[i]])
+
+        # bwSubstrate, a path uses an edge at most once whatever the direction
+        usage = [[] for e in self.E]
+        for col, (k, source, destination, arcs) in enumerate(self.columns):
+            for a in arcs:
+                usage[self.arc_edge[a]].append((self.z(col), self.bwS[k]))
+        for e in range(len(self.E)):
+            ineq.add(usage[e], -np.inf, self.bw[e])
+
+        # the path of a service edge starts where its source is mapped and ends where its destination is mapped
+        starting = {}
+        ending = {}
+        for col, (k, source, destination, arcs) in enumerate(self.columns):
+            starting.setdefault((k, source), []).append((self.z(col), 1))
+            ending.setdefault((k, destination), []).append((self.z(col), 1))
+        # nodes that cannot host an end have no path starting or ending there, their rows are left out
+        self.link_rows = []
+        for k in self.routed:
+            i, j = self.ES[k]
+            for n in self.hosts[i]:
+                self.link_rows.append((k, n, 0))
+                eq.add(starting.get((k, n), []) + [(self.artificial(k, n, 0), 1), (self.x(self.N[n], i), -1)], 0, 0)
+            for n in self.hosts[j]:
+                self.link_rows.append((k, n, 1))
+                eq.add(ending.get((k, n), []) + [(self.artificial(k, n, 1), 1), (self.x(self.N[n], j), -1)], 0, 0)
+
+        return c, Bounds(lb, ub), eq, ineq, var_count
+
+    def solve_relaxation(self):
+        '''
+        :return: the result of the LP relaxation of the restricted master problem. It is solved again after each
+        pricing round, presolving it costs more than it saves.
+        '''
+        c, bounds, eq, ineq, var_count = self.build(relaxed=True)
+        eq_cons = eq.build(var_count)
+        ineq_cons = ineq.build(var_count)
+        return linprog(c, A_ub=ineq_cons.A, b_ub=ineq_cons.ub, A_eq=eq_cons.A, b_eq=eq_cons.ub,
+                       bounds=np.column_stack([bounds.lb, bounds.ub]), method="highs",
+                       options={"presolve": False})
+
+    def duals(self, res):
+        '''
+        :return: the duals of the bandwidth rows and of the source and destination link rows, indexed by [k][n]
+        '''
+        link_offset = len([j for j in self.NS if j not in self.CDN_LABEL])
+        bw_duals = res.ineqlin.marginals[len(self.N):]
+        duals = dict([(k, (np.zeros(len(self.N)), np.zeros(len(self.N)))) for k in self.routed])
+        for row, (k, n, side) in enumerate(self.link_rows):
+            duals[k][side][n] = res.eqlin.marginals[link_offset + row]
+        source_duals = dict([(k, duals[k][0]) for k in self.routed])
+        destination_duals = dict([(k, duals[k][1]) for k in self.routed])
+        return bw_duals, source_duals, destination_duals
+
+    def cheapest_paths(self, weights, multiplier, sources):
+        '''
+        dijkstra from a virtual node linked to every source, on weights + multiplier * delays
+        :param weights: the weight of each arc
+        :param sources: {node index: initial cost}, initial costs are >= 0
+        :return: {node index: (origin, last arc or -1, weight, delay)} for every reached node, see path_to
+        '''
+        best = {}
+        reached = {}
+        heap = []
+        for n, cost in list(sources.items()):
+            best[n] = cost
+            heapq.heappush(heap, (cost, n, n, -1, 0.0, 0.0))
+        while len(heap) > 0:
+            cost, n, origin, last, weight, delay = heapq.heappop(heap)
+            if n in reached or cost > best[n]:
+                continue
+            reached[n] = (origin, last, weight, delay)
+            for a in self.delta[n]:
+                v = self.nidx[self.arcs[a][1]]
+                next_cost = cost + weights[a] + multiplier * self.delays[a]
+                if v not in reached and next_cost < best.get(v, np.inf):
+                    best[v] = next_cost
+                    heapq.heappush(heap, (next_cost, v, origin, a, weight + weights[a], delay + self.delays[a]))
+        return reached
+
+    def path_to(self, reached, n):
+        '''
+        :return: the arcs of the path toward n found by cheapest_paths
+        '''
+        arcs = []
+        last = reached[n][1]
+        while last >= 0:
+            arcs.append(last)
+            last = reached[self.nidx[self.arcs[last][0]]][1]
+        return tuple(reversed(arcs))
+
+    def price(self, res, columns=10):
+        '''
+        add the paths with a negative reduced cost, at most columns per service edge
+        :return: the number of columns added
+        '''
+        bw_duals, source_duals, destination_duals = self.duals(res)
+        # marginals of <= rows are <= 0 in a minimization, arc weights are never negative
+        edge_price = self.netCost - np.minimum(bw_duals, 0)
+
+        added = 0
+        for k in self.routed:
+            i, j = self.ES[k]
+            if len(self.hosts[i]) == 0 or len(self.hosts[j]) == 0:
+                continue
+            weights = self.bwS[k] * edge_price[self.arc_edge]
+            pi = source_duals[k]
+            shift = max([pi[n] for n in self.hosts[i]])
+            sources = dict([(n, shift - pi[n]) for n in self.hosts[i]])
+
+            # the delay is penalized more and more until every destination is reached within the bound
+            scale = np.sum(weights) / max(np.sum(self.delays), EPSILON)
+            candidates = {}
+            for multiplier in [0.0] + [scale * 4 ** step for step in range(LAGRANGE_STEPS)]:
+                reached = self.cheapest_paths(weights, multiplier, sources)
+                too_long = False
+                for n in self.hosts[j]:
+                    if n not in reached:
+                        continue
+                    origin, last, weight, delay = reached[n]
+                    if delay > self.max_delay[k]:
+                        too_long = True
+                        continue
+                    reduced_cost = weight - pi[origin] - destination_duals[k][n]
+                    if reduced_cost < -EPSILON * self.hop_cost and (n not in candidates or reduced_cost < candidates[n][0]):
+                        candidates[n] = (reduced_cost, origin, n, self.path_to(reached, n))
+                if not too_long:
+                    break
+
+            for reduced_cost, origin, destination, arcs in sorted(candidates.values())[:columns]:
+                if self.add_column(k, origin, destination, arcs):
+                    added += 1
+        return added
+
+    def generate_columns(self, max_iterations=50, columns=10):
+        '''
+        solve the LP relaxation and price in new paths until none improves it. The LP is degenerate, most new paths
+        enter it at 0, so pricing also stops once the LP has not improved for STALL_ITERATIONS rounds.
+        :return: the value of the last LP relaxation, or None if it is infeasible
+        '''
+        res = None
+        best = np.inf
+        stalled = 0
+        for iteration in range(max_iterations):
+            res = self.solve_relaxation()
+            if res.status != 0:
+                return None
+            if res.fun < best - STOP_GAP * abs(best):
+                best = res.fun
+                stalled = 0
+            else:
+                stalled += 1
+            if stalled >= STALL_ITERATIONS:
+                break
+            added = self.price(res, columns)
+            logging.debug("column generation iteration %d: lp %f, %d new paths" % (iteration, res.fun, added))
+            if added == 0:
+                break
+        return res.fun
+
+    def solve_master(self, options=None, stats=None):
+        '''
+        solve the integer model on the paths generated so far
+        :param options: options passed to the HiGHS solver
+        :param stats: if provided, filled with the size of the integer model, the node count and the solving time
+        :return: (objective_function, node_solutions, edge_solutions, status, gap), or None if no solution is made of
+        these paths
+        '''
+        options = options or {}
+        c, bounds, eq, ineq, var_count = self.build(relaxed=False)
+        start = time.time()
+        res = milp(c, integrality=np.ones(var_count), bounds=bounds,
+                   constraints=[eq.build(var_count), ineq.build(var_count)], options=options)
+        if stats is not None:
+            stats.update({"variables": var_count, "constraints": len(eq.lb) + len(ineq.lb),
+                          "nodes": getattr(res, "mip_node_count", None), "solving_time": time.time() - start})
+        if res.x is None:
+            return None
+
+        gap = getattr(res, "mip_gap", None)
+        if res.status == 1:
+            status = "timelimit"
+        elif "mip_rel_gap" in options and gap is not None and gap > 0:
+            status = "gaplimit"
+        else:
+            status = "optimal"
+
+        node_solutions = []
+        for n, node in enumerate(self.N):
+            for s, snode in enumerate(self.NS):
+                if res.x[n * len(self.NS) + s] > 0.5:
+                    node_solutions.append((node, snode))
+
+        edge_solutions = []
+        for col, (k, source, destination, arcs) in enumerate(self.columns):
+            if res.x[self.z(col)] > 0.5:
+                i, j = self.ES[k]
+                edge_solutions += [self.arcs[a] + (i, j) for a in arcs]
+
+        return res.fun + self.constant_cost(), node_solutions, edge_solutions, status, gap
+
+    def solve(self, options=None, max_iterations=50, columns=10, stats=None):
+        '''
+        :param options: options passed to the HiGHS solver for the integer model
+        :param stats: see solve_master
+        :param max_iterations: the maximum number of pricing rounds
+        :param columns: the maximum number of paths added per service edge and pricing round
+        :return: see solve_master
+        '''
+        if self.generate_columns(max_iterations, columns) is None:
+            return None
+        return self.solve_master(options, stats)
+
+
+def solve_paths(model, pricing_dir=PRICING_FOLDER, options=None, time_limit=None, gap_limit=None, fallback=True,
+                stats=None):
+    '''
+    solve the embedding model with the path formulation, see PathEmbeddingModel
+    :param model: a dict of tables, as returned by Service.dump_model and Substrate.dump_model
+    :param time_limit: stop the integer model after this many seconds and return the best solution found so far
+    :param gap_limit: stop the integer model once the relative gap is below this value
+    :param fallback: solve the arc model if no solution is made of the generated paths
+    :param stats: see milp.solve_milp
+    :return: the same as milp.solve_milp
+    '''
+    options = dict(options or {})
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if gap_limit is not None:
+        options["mip_rel_gap"] = gap_limit
+
+    path_model = PathEmbeddingModel(model, pricing_dir)
+    # the relaxation of the arc model is not feasible either
+    if path_model.generate_columns() is None:
+        return None
+    solution = path_model.solve_master(options, stats)
+    if solution is None and fallback:
+        logging.debug("no solution on the generated paths, solving the arc model")
+        return EmbeddingModel(model, pricing_dir).solve(options, stats)
+    return solution
@@ -0,0 +1,57 @@
+import logging
+from itertools import islice
+
+import networkx as nx
+
+
+def get_corridor(model, k_paths=3):
+    '''
+    the substrate nodes a good embedding of the model is expected to use: every node that is within the e2e delay of a
+    starter, since the vhgs and vcdns are on delay bounded paths from the starters, plus the nodes of the k hop-shortest
+    paths from every starter to every CDN candidate, since the network cost is proportional to the number of hops.
+
+    :param model: a dict of tables, as returned by solver.dump_model
+    :param k_paths: the number of shortest paths kept between a starter and a CDN candidate
+    :return: the set of the names of the substrate nodes of the corridor
+    '''
+    g = nx.Graph()
+    g.add_nodes_from([name for name, cpu in model["substrate.nodes"]])
+    g.add_edges_from([(u, v, {"delay": delay}) for u, v, bw, delay in model["substrate.edges"]])
+
+    starters = set([topo for name, topo, bw in model["starters.nodes"]])
+    cdns = set([topo for name, topo in model["CDN.nodes"]])
+    max_delay = max([delay for path, delay in model["service.path.delay"]] + [0])
+
+    corridor = set(starters) | cdns
+    for starter in starters:
+        corridor.update(nx.single_source_dijkstra_path_length(g, starter, cutoff=max_delay, weight="delay"))
+        for cdn in cdns:
+            if starter == cdn or not nx.has_path(g, starter, cdn):
+                continue
+            for path in islice(nx.shortest_simple_paths(g, starter, cdn), k_paths):
+                corridor.update(path)
+
+    return corridor
+
+
+def reduce_model(model, k_paths=3):
+    '''
+    restrict the substrate of the model to its corridor, see get_corridor. The reduction is a heuristic, the reduced
+    model may be infeasible while the full one is not.
+
+    :param model: a dict of tables, as returned by solver.dump_model
+    :param k_paths: the number of shortest paths kept between a starter and a CDN candidate
+    :return: the reduced model, or the model itself if nothing can be removed
+    '''
+    corridor = get_corridor(model, k_paths)
+    nodes = [row for row in model["substrate.nodes"] if row[0] in corridor]
+    edges = [row for row in model["substrate.edges"] if row[0] in corridor and row[1] in corridor]
+    if len(nodes) == len(model["substrate.nodes"]) and len(edges) == len(model["substrate.edges"]):
+        return model
+
+    logging.debug("corridor keeps %d/%d nodes and %d/%d edges" % (
+        len(nodes), len(model["substrate.nodes"]), len(edges), len(model["substrate.edges"])))
+    reduced = dict(model)
+    reduced["substrate.nodes"] = nodes
+    reduced["substrate.edges"] = edges
+    return reduced
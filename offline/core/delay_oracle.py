@@ -0,0 +1,116 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from ..core.distance_cache import LRUCache, substrate_key
+
+# up to this many nodes, all the delays are computed at once, above only the rows of the sources that are asked for
+DENSE_LIMIT = 2000
+
+# the memory used by the rows kept by an oracle above DENSE_LIMIT, in bytes
+ROWS_MEMORY = 256 * 1024 * 1024
+
+# the oracles of the last substrates, by substrate_key
+oracles = LRUCache("delay oracle", 8, shards=1)
+
+
+class DelayOracle:
+    '''
+    the delays of the shortest paths between the nodes of a substrate, computed with a single dijkstra over an integer
+    indexed copy of the substrate
+    '''
+
+    def __init__(self, nodes, edges, key=None):
+        '''
+        :param nodes: the names of the substrate nodes
+        :param edges: the (node_1, node_2, delay) undirected edges of the substrate
+        :param key: the substrate_key of the substrate, computed if not given
+        '''
+        self.names = list(nodes)
+        self.index = dict([(name, i) for i, name in enumerate(self.names)])
+        delays = {}
+        for node_1, node_2, delay in edges:
+            for name in (node_1, node_2):
+                if name not in self.index:
+                    self.index[name] = len(self.names)
+                    self.names.append(name)
+            i, j = sorted((self.index[node_1], self.index[node_2]))
+            if i != j:
+                # keep the fastest of parallel edges
+                delays[(i, j)] = min(delay, delays.get((i, j), delay))
+
+        n = len(self.names)
+        pairs = sorted(delays.keys())
+        self.graph = csr_matrix((np.array([delays[pair] for pair in pairs], dtype=float),
+                                 (np.array([i for i, j in pairs], dtype=int),
+                                  np.array([j for i, j in pairs], dtype=int))), shape=(n, n))
+        self.key = substrate_key(nodes, edges) if key is None else key
+        self.rows = LRUCache("delay rows", max(16, ROWS_MEMORY // (8 * max(n, 1))), register=False)
+        self.matrix = dijkstra(self.graph, directed=False) if n <= DENSE_LIMIT else None
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def indices(self, names):
+        return [self.index[name] for name in names]
+
+    def get_rows(self, indices):
+        '''
+        :return: the rows of the sources, the missing ones are computed in a single dijkstra, only used above
+        DENSE_LIMIT
+        '''
+        rows = dict([(i, self.rows.get(i)) for i in set(indices)])
+        missing = sorted([i for i, row in list(rows.items()) if row is None])
+        if len(missing) > 0:
+            for i, row in zip(missing, dijkstra(self.graph, directed=False, indices=missing)):
+                self.rows.put(i, row)
+                rows[i] = row
+        return [rows[i] for i in indices]
+
+    def block(self, sources, targets):
+        '''
+        :param sources: a list of node names
+        :param targets: a list of node names
+        :return: the |sources|x|targets| array of delays, inf for unreachable pairs
+        '''
+        rows = self.indices(sources)
+        columns = self.indices(targets)
+        if self.matrix is not None:
+            return self.matrix[np.ix_(rows, columns)]
+        return np.array([row[columns] for row in self.get_rows(rows)]).reshape(len(rows), len(columns))
+
+    def delay(self, node1, node2):
+        '''
+        :return: the delay of the shortest path between node1 and node2, None if there is none
+        '''
+        i = self.index[node1]
+        j = self.index[node2]
+        if self.matrix is not None:
+            value = self.matrix[i, j]
+        else:
+            value = self.get_rows([i])[0][j]
+        return float(value) if value != np.inf else None
+
+    def sum_delays(self, nodes):
+        '''
+        :return: the sum of the delays between every pair of distinct nodes, unreachable pairs are ignored
+        '''
+        nodes = sorted(set(nodes))
+        delays = self.block(nodes, nodes)[np.triu_indices(len(nodes), 1)]
+        return float(delays[np.isfinite(delays)].sum())
+
+
+def get_delay_oracle(substrate):
+    '''
+    :return: the delay oracle of the substrate, looked up again only when one of its delays has changed (see
+    Substrate.set_delay), and built only if no recent substrate has the same delays
+    '''
+    residual = substrate.get_residual()
+    version, oracle = getattr(substrate, "delay_oracle", (None, None))
+    if oracle is None or version != residual.delay_version:
+        nodes = residual.names
+        edges = [(node_1, node_2, delay) for (node_1, node_2), delay in zip(residual.ends, residual.delay.tolist())]
+        key = substrate_key(nodes, edges)
+        oracle = oracles.get_or_compute(key, lambda: DelayOracle(nodes, edges, key))
+        substrate.delay_oracle = (residual.delay_version, oracle)
+    return oracle
@@ -0,0 +1,120 @@
+import collections
+import hashlib
+import logging
+import os
+import weakref
+from threading import Lock
+
+MISSING = object()
+
+# every registered LRUCache of the process, see cache_stats
+caches = []
+
+# every LRUCache of the process, registered or not
+instances = weakref.WeakSet()
+
+
+class LRUCache:
+    '''
+    in-memory cache bounded in number of entries with LRU eviction. Entries are spread over shards that have their own
+    lock, threads only wait for each other when they use the same shard, and never while a value is computed.
+    Each process has its own entries, keys must then describe the content they stand for.
+    '''
+
+    def __init__(self, name, max_entries, shards=8, register=True):
+        self.name = name
+        self.max_entries = max_entries
+        self.shard_entries = max(1, max_entries // shards)
+        self.shards = [collections.OrderedDict() for _ in range(shards)]
+        self.locks = [Lock() for _ in range(shards)]
+        self.hits = [0] * shards
+        self.misses = [0] * shards
+        self.evictions = [0] * shards
+        instances.add(self)
+        if register:
+            caches.append(self)
+
+    def __shard(self, key):
+        return hash(key) % len(self.shards)
+
+    def get(self, key, default=None):
+        i = self.__shard(key)
+        with self.locks[i]:
+            value = self.shards[i].get(key, MISSING)
+            if value is MISSING:
+                self.misses[i] += 1
+                return default
+            self.shards[i].move_to_end(key)
+            self.hits[i] += 1
+            return value
+
+    def put(self, key, value):
+        i = self.__shard(key)
+        with self.locks[i]:
+            self.shards[i][key] = value
+            self.shards[i].move_to_end(key)
+            while len(self.shards[i]) > self.shard_entries:
+                self.shards[i].popitem(last=False)
+                self.evictions[i] += 1
+
+    def get_or_compute(self, key, compute):
+        '''
+        :param compute: called without arguments on a miss, two threads missing the same key both compute it
+        '''
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        for i in range(len(self.shards)):
+            with self.locks[i]:
+                self.shards[i].clear()
+
+    def reset_locks(self):
+        # a lock held by another thread when the process forked is never released in the child
+        self.locks = [Lock() for _ in self.shards]
+
+    def stats(self):
+        hits = sum(self.hits)
+        misses = sum(self.misses)
+        return {"name": self.name, "hits": hits, "misses": misses, "evictions": sum(self.evictions),
+                "entries": sum([len(shard) for shard in self.shards]), "max_entries": self.max_entries,
+                "hit_rate": float(hits) / (hits + misses) if hits + misses > 0 else 0.0}
+
+    def log_stats(self):
+        stats = self.stats()
+        stats["hit_rate"] *= 100
+        logging.info("%(name)s cache: %(hits)d hits, %(misses)d misses (%(hit_rate).1f%% hit rate), %(evictions)d "
+                     "evictions, %(entries)d/%(max_entries)d entries" % stats)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lambda: [cache.reset_locks() for cache in list(instances)])
+
+
+def substrate_key(nodes, edges):
+    '''
+    :param nodes: the names of the nodes of a substrate
+    :param edges: the (node_1, node_2, delay) edges of the substrate
+    :return: a hash of the delays of the substrate, substrates with the same delays share their cached distances
+    '''
+    h = hashlib.sha1()
+    for node in sorted([str(node) for node in nodes]):
+        h.update(("%s\n" % node).encode("utf-8"))
+    for node_1, node_2, delay in sorted([tuple(sorted((str(n1), str(n2)))) + (float(d),) for n1, n2, d in edges]):
+        h.update(("%s %s %r\n" % (node_1, node_2, delay)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def cache_stats():
+    '''
+    :return: the stats of every cache, see LRUCache.stats
+    '''
+    return [cache.stats() for cache in caches]
+
+
+def log_cache_stats():
+    for cache in caches:
+        cache.log_stats()
@@ -0,0 +1,153 @@
+import logging
+import time
+
+import numpy as np
+
+from ..core.clustering import EXACT_LIMIT, cluster_nodes
+from ..core.delay_oracle import DelayOracle, oracles
+from ..core.distance_cache import substrate_key
+from ..core.model import PRICING_FOLDER, read_pricing
+from ..pricing.generator import get_vmg_calculator, get_vcdn_calculator
+
+# see enable_grid_search
+grid_search = None
+
+
+def grid_points(start_count, max_vhg_count=10, max_vcdn_count=10):
+    '''
+    :param start_count: the number of starters of the sla
+    :return: the (vhg_count, vcdn_count) to explore, in the order of the nested loops they replace
+    '''
+    return [(vhg_count, vcdn_count) for vhg_count in range(1, min(max_vhg_count, start_count) + 1) for vcdn_count in
+            range(1, min(max_vcdn_count, vhg_count) + 1)]
+
+
+def hop_oracle(substrate):
+    '''
+    :return: an oracle of the number of hops between the nodes of the substrate, see DelayOracle
+    '''
+    nodes = [node.name for node in substrate.nodes]
+    edges = [(edge.node_1.name, edge.node_2.name, 1) for edge in substrate.edges]
+    key = substrate_key(nodes, edges)
+    return oracles.get_or_compute(key, lambda: DelayOracle(nodes, edges, key))
+
+
+def cpu_cost(count, bandwidth, calculator):
+    '''
+    :return: the cheapest cpu of count instances sharing the bandwidth, exact for the affine calculators of the pricing
+    folder, a lower bound for convex (even split) or concave (uneven split) ones
+    '''
+    return min(count * calculator(float(bandwidth) / count), calculator(bandwidth) + (count - 1) * calculator(0))
+
+
+def network_cost(hops, bandwidths, vhg_count):
+    '''
+    a lower bound of the bandwidth x hops of the starter to vhg edges, whatever the topology
+    :param hops: the matrix of the hops between the starters
+    :param bandwidths: the bandwidth of each starter
+    :return: the largest of two bounds: the starters that do not share a node with a vhg are at least one hop away
+    from it, and the starters of a vhg are at least (sum of their pairwise hops) / (size - 1) hops away from it in
+    total, summed over the best partition of the starters
+    '''
+    starts = len(bandwidths)
+    if vhg_count >= starts:
+        return 0.0
+
+    # starters on the same node share a vhg for free
+    distinct = sorted([bandwidths[row].sum() for row in np.unique(hops == 0, axis=0)])
+    res = float(sum(distinct[:max(0, len(distinct) - vhg_count)]))
+
+    # the partition found by k-medoids may not be the best one, its score is then not a bound
+    if starts <= EXACT_LIMIT:
+        score = cluster_nodes(list(range(starts)), vhg_count, hops, mode="exact")[0]
+        res = max(res, min(bandwidths) * score / (starts - vhg_count))
+    return res
+
+
+def estimate_costs(sla, points, pricing_dir=PRICING_FOLDER):
+    '''
+    an optimistic objective function of the candidates of each point: the cpu of the vhgs and vcdns priced with the
+    calculators of the pricing folder, and the network cost of bringing the starters to their vhgs
+    :param sla: the sla the candidates are built for
+    :param points: a list of (vhg_count, vcdn_count)
+    :return: the estimate of each point
+    '''
+    cpuCost_vHG, cpuCost_vCDN, netCost = read_pricing(pricing_dir)
+    vmg_calc = get_vmg_calculator()
+    vcdn_calc = get_vcdn_calculator()
+
+    starts = sla.get_start_nodes()
+    names = [start.topoNode.name for start in starts]
+    bandwidths = np.array([start.attributes["bandwidth"] for start in starts], dtype=float)
+    hops = hop_oracle(sla.substrate).block(names, names)
+    hops[~np.isfinite(hops)] = 0
+
+    network = dict([(vhg_count, network_cost(hops, bandwidths, vhg_count)) for vhg_count in
+                    set([vhg_count for vhg_count, vcdn_count in points])])
+    # the vcdns take a share of the vhg bandwidth that depends on the topology, they are priced without it
+    return [cpuCost_vHG * cpu_cost(vhg_count, bandwidths.sum(), vmg_calc) + cpuCost_vCDN * vcdn_count * vcdn_calc(0) +
+            netCost * network[vhg_count] for vhg_count, vcdn_count in points]
+
+
+class GridSearch:
+    '''
+    evaluate the (vhg_count, vcdn_count) of a sla by increasing estimate, and stop once the estimate of the remaining
+    ones is not below the best objective function found so far
+    '''
+
+    def __init__(self, pricing_dir=PRICING_FOLDER):
+        self.pricing_dir = pricing_dir
+        self.points = 0
+        self.evaluated = 0
+        self.skipped = 0
+        self.saved = 0
+        self.estimate_time = 0.0
+
+    def search(self, sla, points, evaluate, embeddings=None):
+        '''
+        :param sla: the sla the candidates are built for, see estimate_costs
+        :param points: a list of (vhg_count, vcdn_count)
+        :param evaluate: embeds the candidates of a point, returns the best objective function (None if no solution)
+        :param embeddings: the number of candidates of a point, to count the embeddings saved, 1 if not given
+        :return: the list of (point, objective_function) of the evaluated points that have a solution
+        '''
+        start = time.time()
+        estimates = estimate_costs(sla, points, self.pricing_dir)
+        self.estimate_time += time.time() - start
+
+        self.points += len(points)
+        remaining = sorted(zip(estimates, range(len(points))))
+        best = float("inf")
+        res = []
+        for position, (estimate, index) in enumerate(remaining):
+            if estimate >= best:
+                skipped = [points[index] for estimate, index in remaining[position:]]
+                self.skipped += len(skipped)
+                self.saved += sum([embeddings(point) if embeddings is not None else 1 for point in skipped])
+                break
+
+            self.evaluated += 1
+            objective_function = evaluate(points[index])
+            logging.debug("(%d,%d) estimated at %lf, found %s" % (points[index] + (estimate, objective_function)))
+            if objective_function is not None:
+                res.append((points[index], objective_function))
+                best = min(best, objective_function)
+        return res
+
+    def stats(self):
+        return {"points": self.points, "evaluated": self.evaluated, "skipped": self.skipped, "saved": self.saved,
+                "estimate_time": self.estimate_time}
+
+    def log_stats(self):
+        logging.info("grid search: %(points)d vhg/vcdn counts, %(evaluated)d evaluated, %(skipped)d skipped by their "
+                     "estimate, %(saved)d embeddings saved, %(estimate_time).2fs computing estimates" % self.stats())
+
+
+def enable_grid_search(pricing_dir=PRICING_FOLDER):
+    '''
+    explore the vhg and vcdn counts of the automatic mode best-first, see GridSearch
+    :return: the search statistics
+    '''
+    global grid_search
+    grid_search = GridSearch(pricing_dir)
+    return grid_search
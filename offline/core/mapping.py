@@ -3,7 +3,7 @@ import pickle
 
 import networkx as nx
 from networkx.readwrite import json_graph
-from sqlalchemy import Column, Integer, Float, ForeignKey
+from sqlalchemy import Column, Integer, Float, ForeignKey, String
 from sqlalchemy import and_
 from sqlalchemy.orm import relationship, aliased
 
@@ -27,6 +27,9 @@ class Mapping(Base):
     substrate = relationship("Substrate", cascade="none")
 
     objective_function = Column(Float)
+    # how the solver stopped (optimal, gaplimit, timelimit...) and the relative gap of the solution, if known
+    status = Column(String)
+    gap = Column(Float)
 
     def to_json(self):
         session = Session()
@@ -83,11 +86,14 @@ class Mapping(Base):
         return [(em.edge.node_1.name, em.edge.node_2.name, em.serviceEdge.node_1.name, em.serviceEdge.node_2.name) for
                 em in self.edge_mappings]
 
-    def __init__(self, node_mappings=node_mappings, edge_mappings=edge_mappings, objective_function=objective_function):
+    def __init__(self, node_mappings=node_mappings, edge_mappings=edge_mappings, objective_function=objective_function,
+                 status=None, gap=None):
 
         self.node_mappings = node_mappings
         self.edge_mappings = edge_mappings
         self.objective_function = objective_function
+        self.status = status
+        self.gap = gap
 
     def save(self, file="mapping", id="default"):
         with open(os.path.join(RESULTS_FOLDER, file + "_" + id), "w") as f:
@@ -0,0 +1,231 @@
+import os
+import time
+
+import numpy as np
+from scipy.optimize import milp, LinearConstraint, Bounds
+from scipy.sparse import coo_matrix
+
+from ..core.model import PRICING_FOLDER, read_pricing
+
+
+class ConstraintBuilder:
+    '''
+    accumulate sparse rows lb <= a.x <= ub
+    '''
+
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+        self.vals = []
+        self.lb = []
+        self.ub = []
+
+    def add(self, coefs, lb, ub):
+        '''
+        :param coefs: a list of (variable index, coefficient)
+        '''
+        row = len(self.lb)
+        for col, val in coefs:
+            self.rows.append(row)
+            self.cols.append(col)
+            self.vals.append(val)
+        self.lb.append(lb)
+        self.ub.append(ub)
+
+    def build(self, var_count):
+        a = coo_matrix((self.vals, (self.rows, self.cols)), shape=(len(self.lb), var_count)).tocsr()
+        return LinearConstraint(a, np.array(self.lb, dtype=float), np.array(self.ub, dtype=float))
+
+
+class EmbeddingModel:
+    '''
+    in-memory version of optim.zpl.tpl, the x[N cross NS] / y[(E union Et) cross ES] VNF embedding model
+    '''
+
+    def __init__(self, model, pricing_dir=PRICING_FOLDER):
+        '''
+        :param model: a dict of tables, as returned by Service.dump_model and Substrate.dump_model
+        :param pricing_dir: where to read the prices from
+        '''
+        self.cpuCost_vHG, self.cpuCost_vCDN, self.netCost = read_pricing(pricing_dir)
+
+        # substrate
+        self.N = [name for name, cpu in model["substrate.nodes"]]
+        self.cpu = np.array([cpu for name, cpu in model["substrate.nodes"]], dtype=float)
+        self.nidx = {name: i for i, name in enumerate(self.N)}
+
+        self.E = [(u, v) for u, v, bw, delay in model["substrate.edges"]]
+        self.bw = np.array([bw for u, v, bw, delay in model["substrate.edges"]], dtype=float)
+
+        # arcs are E union Et, each arc knows the edge it comes from
+        self.arcs = []
+        self.arc_edge = []
+        self.aidx = {}
+        for e, (u, v, bw, delay) in enumerate(model["substrate.edges"]):
+            for arc in [(u, v), (v, u)]:
+                if arc not in self.aidx:
+                    self.aidx[arc] = len(self.arcs)
+                    self.arcs.append(arc)
+                    self.arc_edge.append(e)
+        self.delays = np.array([model["substrate.edges"][e][3] for e in self.arc_edge], dtype=float)
+        self.delta = [[] for u in self.N]
+        for a, (u, v) in enumerate(self.arcs):
+            self.delta[self.nidx[u]].append(a)
+
+        # service
+        self.NS = [name for name, cpu, bw in model["service.nodes"]]
+        self.cpuS = {name: cpu for name, cpu, bw in model["service.nodes"]}
+        self.sidx = {name: i for i, name in enumerate(self.NS)}
+        self.ES = [(i, j) for i, j, bw in model["service.edges"]]
+        self.bwS = np.array([bw for i, j, bw in model["service.edges"]], dtype=float)
+        self.eidx = {edge: k for k, edge in enumerate(self.ES)}
+
+        self.CDN_MAPPING = set(model["CDN.nodes"])
+        self.CDN_LABEL = set([name for name, mapping in model["CDN.nodes"]])
+        self.STARTERS_MAPPING = [(name, topo) for name, topo, bw in model["starters.nodes"]]
+        self.VHG_LABEL = model["VHG.nodes"]
+        self.VCDN_LABEL = model["VCDN.nodes"]
+        self.SERVICE_PATHS = model["service.path"]
+        self.SERVICE_PATHS_DELAY = dict(model["service.path.delay"])
+
+        self.x_count = len(self.N) * len(self.NS)
+        self.var_count = self.x_count + len(self.arcs) * len(self.ES)
+
+    def x(self, node, snode):
+        return self.nidx[node] * len(self.NS) + self.sidx[snode]
+
+    def y(self, arc, sedge):
+        return self.x_count + arc * len(self.ES) + sedge
+
+    def constant_cost(self):
+        '''
+        :return: the part of the objective function that does not depend on the variables
+        '''
+        return sum([self.cpuCost_vHG * self.cpuS[vhg] for vhg in self.VHG_LABEL]) + sum(
+            [self.cpuCost_vCDN * self.cpuS[vcdn] for vcdn in self.VCDN_LABEL])
+
+    def build(self):
+        '''
+        :return: c, integrality, bounds, constraints ready to be fed to scipy.optimize.milp
+        '''
+        c = np.zeros(self.var_count)
+        for k in range(len(self.ES)):
+            c[self.x_count + k:self.var_count:len(self.ES)] = self.bwS[k] * self.netCost
+
+        lb = np.zeros(self.var_count)
+        ub = np.ones(self.var_count)
+
+        # sources
+        for name, topo in self.STARTERS_MAPPING:
+            lb[self.x(topo, name)] = 1
+
+        # cdnNo
+        for name in self.CDN_LABEL:
+            for node in self.N:
+                if (name, node) not in self.CDN_MAPPING:
+                    ub[self.x(node, name)] = 0
+
+        cons = ConstraintBuilder()
+
+        # everyNodeIsMapped
+        for j in self.NS:
+            if j not in self.CDN_LABEL:
+                cons.add([(self.x(i, j), 1) for i in self.N], 1, 1)
+
+        # popRes
+        for i in self.N:
+            cons.add([(self.x(i, j), self.cpuS[j]) for j in self.NS], -np.inf, self.cpu[self.nidx[i]])
+
+        # bwSubstrate (bwSubstrate_cdn and bwtSubstrate_cdn are implied by it)
+        for e, (u, v) in enumerate(self.E):
+            coefs = []
+            for k in range(len(self.ES)):
+                coefs.append((self.y(self.aidx[(u, v)], k), self.bwS[k]))
+                coefs.append((self.y(self.aidx[(v, u)], k), self.bwS[k]))
+            cons.add(coefs, -np.inf, self.bw[e])
+
+        # E2EdelayConstraint
+        for path, i, j in self.SERVICE_PATHS:
+            if path not in self.SERVICE_PATHS_DELAY or (i, j) not in self.eidx:
+                continue
+            k = self.eidx[(i, j)]
+            cons.add([(self.y(a, k), self.delays[a]) for a in range(len(self.arcs))], -np.inf,
+                     self.SERVICE_PATHS_DELAY[path])
+
+        for k, (i, j) in enumerate(self.ES):
+            if i == j:
+                continue
+            for u in self.N:
+                out_arcs = self.delta[self.nidx[u]]
+                # flowconservation and flowconservation_cdn
+                coefs = [(self.y(a, k), 1) for a in out_arcs]
+                coefs += [(self.y(self.aidx[(self.arcs[a][1], u)], k), -1) for a in out_arcs]
+                coefs += [(self.x(u, i), -1), (self.x(u, j), 1)]
+                cons.add(coefs, 0, 0)
+
+                # noBigloop
+                cons.add([(self.y(a, k), 1) for a in out_arcs], -np.inf, 1)
+
+            # noloop
+            for u, v in self.E:
+                cons.add([(self.y(self.aidx[(u, v)], k), 1), (self.y(self.aidx[(v, u)], k), 1)], -np.inf, 1)
+
+        return c, np.ones(self.var_count), Bounds(lb, ub), cons.build(self.var_count)
+
+    def solve(self, options=None, stats=None):
+        '''
+        :param options: options passed to the HiGHS solver
+        :param stats: if provided, filled with the size of the model, the node count and the solving time
+        :return: (objective_function, node_solutions, edge_solutions, status, gap), or None if no solution was found
+        '''
+        options = options or {}
+        c, integrality, bounds, constraints = self.build()
+        start = time.time()
+        res = milp(c, integrality=integrality, bounds=bounds, constraints=constraints, options=options)
+        if stats is not None:
+            stats.update({"variables": len(c), "constraints": constraints.A.shape[0],
+                          "nodes": getattr(res, "mip_node_count", None), "solving_time": time.time() - start})
+        if res.x is None:
+            return None
+
+        gap = getattr(res, "mip_gap", None)
+        if res.status == 1:
+            status = "timelimit"
+        elif "mip_rel_gap" in options and gap is not None and gap > 0:
+            status = "gaplimit"
+        else:
+            status = "optimal"
+
+        node_solutions = []
+        for n, node in enumerate(self.N):
+            for s, snode in enumerate(self.NS):
+                if res.x[n * len(self.NS) + s] > 0.5:
+                    node_solutions.append((node, snode))
+
+        edge_solutions = []
+        for a, (u, v) in enumerate(self.arcs):
+            for k, (i, j) in enumerate(self.ES):
+                if res.x[self.y(a, k)] > 0.5:
+                    edge_solutions.append((u, v, i, j))
+
+        return res.fun + self.constant_cost(), node_solutions, edge_solutions, status, gap
+
+
+def solve_milp(model, pricing_dir=PRICING_FOLDER, options=None, time_limit=None, gap_limit=None, stats=None):
+    '''
+    solve the embedding model in process, without writing anything on disk
+    :param model: a dict of tables, as returned by Service.dump_model and Substrate.dump_model
+    :param pricing_dir: where to read the prices from
+    :param options: options passed to the HiGHS solver
+    :param time_limit: stop after this many seconds and return the best solution found so far
+    :param gap_limit: stop once the relative gap is below this value
+    :param stats: if provided, filled with the size of the model, the node count and the solving time
+    :return: (objective_function, [(node, service_node)], [(node_1, node_2, service_node_1, service_node_2)], status,
+    gap) or None
+    '''
+    options = dict(options or {})
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if gap_limit is not None:
+        options["mip_rel_gap"] = gap_limit
+    return EmbeddingModel(model, pricing_dir).solve(options, stats)
@@ -0,0 +1,85 @@
+import os
+
+# the pricing parameters of the model, read by optim.zpl.tpl and by the in-memory backends
+PRICING_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../pricing')
+
+
+def read_pricing(pricing_dir=PRICING_FOLDER):
+    '''
+    read the pricing parameters the same way optim.zpl does (first field of the first line)
+    :param pricing_dir: the pricing folder
+    :return: cpuCost_vHG, cpuCost_vCDN, netCost
+    '''
+    res = []
+    for file in [os.path.join("vmg", "pricing_for_one_instance.properties"),
+                 os.path.join("cdn", "pricing_for_one_instance.properties"),
+                 "net.cost.data"]:
+        with open(os.path.join(pricing_dir, file)) as f:
+            res.append(float(f.read().split()[0]))
+    return tuple(res)
+
+
+# how each table of the embedding model is rendered in the .data files read by optim.zpl.tpl
+TABLE_FORMATS = {
+    "substrate.edges": lambda row: "%s\t%s\t%e\t%e\n" % row,
+    "substrate.nodes": lambda row: "%s\t%e\n" % row,
+    "service.edges": lambda row: "%s\t\t%s\t\t%lf\n" % (row[0].ljust(20), row[1], row[2]),
+    "service.nodes": lambda row: "%s\t\t%lf\t\t%lf\n" % (row[0].ljust(20), row[1], row[2]),
+    "CDN.nodes": lambda row: "%s %s\n" % row,
+    "starters.nodes": lambda row: "%s %s %lf\n" % row,
+    "VHG.nodes": lambda row: "%s\n" % row,
+    "VCDN.nodes": lambda row: "%s\n" % row,
+    "service.path.delay": lambda row: "%s %lf\n" % row,
+    "service.path": lambda row: "%s %s %s\n" % row,
+}
+
+# the tables written by Service.dump_model, the others by Substrate.dump_model
+SERVICE_TABLES = [table for table in TABLE_FORMATS if not table.startswith("substrate.")]
+
+
+def write_model(model, folder):
+    '''
+    write the tables of the model as .data files
+    :param model: a dict of tables indexed by data file name
+    :param folder: the folder where the files are written
+    '''
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    for table, rows in list(model.items()):
+        with open(os.path.join(folder, "%s.data" % table), "w") as f:
+            for row in rows:
+                f.write(TABLE_FORMATS[table](row))
+
+
+def render_model(model):
+    '''
+    :param model: a dict of tables indexed by data file name
+    :return: a list of (table name, content of its .data file)
+    '''
+    return [(table, "".join([TABLE_FORMATS[table](row) for row in rows])) for table, rows in list(model.items())]
+
+
+def read_model(folder):
+    '''
+    :param folder: a folder where a model has been written
+    :return: a list of (table name, content of its .data file)
+    '''
+    res = []
+    for table in sorted(TABLE_FORMATS):
+        if os.path.exists(os.path.join(folder, "%s.data" % table)):
+            with open(os.path.join(folder, "%s.data" % table)) as f:
+                res.append((table, f.read()))
+    return res
+
+
+def get_model_postfix(tables):
+    '''
+    :param tables: a list of (table name, content)
+    :return: the "_<service id>_<sla id>" postfix of the service names of the model, or None
+    '''
+    for table, content in tables:
+        if table == "service.nodes" and len(content.split()) > 0:
+            name = content.split()[0]
+            return "_" + "_".join(name.split("_")[-2:])
+    return None
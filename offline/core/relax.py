@@ -1,19 +1,138 @@
-#!/usr/bin/env python
+import logging
+import multiprocessing
+import os
+import time
 
-import argparse
-import pickle
+PRICING_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../pricing')
 
-parser = argparse.ArgumentParser(description='relax your SLA')
-parser.add_argument('--vhg', help="the number of failure until the algorithm stops", default=1)
-parser.add_argument('--vcdn', help="integer seed used for random number generation", default=1)
-args = parser.parse_args()
+# "fixed" only bounds a candidate by the cpu cost of its vhgs and vcdns, "lp" adds the LP relaxation of its network cost
+BOUNDS = ("fixed", "lp")
 
-with open("service.pickle","r") as f:
-    service=pickle.load(f)
+# see enable_bound_pruning
+candidate_pruning = None
 
-service.vhgcount = int(args.vhg)
-service.vcdncount = int(args.vcdn)
 
-with open("service.pickle","w") as f:
-    pickle.dump(service,f)
-    service.write()
\ No newline at end of file
+def lower_bound(model, pricing_dir=PRICING_FOLDER, bound="lp"):
+    '''
+    a lower bound of the objective function of the embedding model, also a lower bound of the model completed with the
+    CDN edges since they only add constraints and network cost
+    :param model: a dict of tables, as returned by solver.dump_model
+    :param bound: one of BOUNDS
+    :return: the bound, inf if the LP relaxation is infeasible
+    '''
+    # scipy>=1.9 is only needed here
+    import numpy as np
+    from scipy.optimize import milp
+    from ..core.milp import EmbeddingModel
+
+    embedding = EmbeddingModel(model, pricing_dir)
+    if bound == "fixed":
+        return embedding.constant_cost()
+
+    c, integrality, bounds, constraints = embedding.build()
+    res = milp(c, integrality=np.zeros(len(c)), bounds=bounds, constraints=constraints)
+    if res.x is None:
+        return float("inf")
+    return res.fun + embedding.constant_cost()
+
+
+def bound_model(job):
+    '''
+    :param job: (model, bound), see lower_bound
+    '''
+    model, bound = job
+    return lower_bound(model, bound=bound)
+
+
+def bound_many(models, bound="lp", processes=1):
+    '''
+    :return: the lower bounds of the models, in a process pool if processes > 1
+    '''
+    jobs = [(model, bound) for model in models]
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(processes, len(jobs)))
+        try:
+            return pool.map(bound_model, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    return [bound_model(job) for job in jobs]
+
+
+class BoundPruning:
+    '''
+    evaluate candidates by increasing lower bound, and skip the ones whose bound is not below the best objective function
+    found so far
+    '''
+
+    def __init__(self, bound="lp"):
+        if bound not in BOUNDS:
+            raise ValueError("not a valid bound %s, use one of %s" % (bound, ", ".join(BOUNDS)))
+        self.bound = bound
+        self.candidates = 0
+        self.evaluated = 0
+        self.pruned = 0
+        self.infeasible = 0
+        self.bound_time = 0.0
+
+    def bounds(self, models, processes=1):
+        '''
+        :return: the lower bounds of the models, see lower_bound
+        '''
+        start = time.time()
+        res = bound_many(models, self.bound, processes)
+        self.bound_time += time.time() - start
+        return res
+
+    def evaluate(self, candidates, bounds, solve_batch, batch_size=1):
+        '''
+        :param candidates: the candidates to evaluate
+        :param bounds: the lower bound of each candidate
+        :param solve_batch: solves a list of candidates, returns their objective functions (None if no solution)
+        :param batch_size: the number of candidates given to solve_batch at once, the best objective function is only
+        updated between batches
+        :return: the list of (candidate, objective_function) of the evaluated candidates that have a solution
+        '''
+        self.candidates += len(candidates)
+        remaining = sorted(zip(bounds, range(len(candidates))))
+        best = float("inf")
+        res = []
+        while len(remaining) > 0:
+            batch = []
+            while len(remaining) > 0 and len(batch) < batch_size:
+                bound, index = remaining.pop(0)
+                if bound == float("inf"):
+                    self.infeasible += 1
+                elif bound >= best:
+                    self.pruned += 1
+                else:
+                    batch.append(candidates[index])
+            if len(batch) == 0:
+                continue
+
+            self.evaluated += len(batch)
+            for candidate, objective_function in zip(batch, solve_batch(batch)):
+                if objective_function is not None:
+                    res.append((candidate, objective_function))
+                    best = min(best, objective_function)
+        return res
+
+    def stats(self):
+        return {"candidates": self.candidates, "evaluated": self.evaluated, "pruned": self.pruned,
+                "infeasible": self.infeasible, "bound_time": self.bound_time}
+
+    def log_stats(self):
+        logging.info("bound pruning: %(candidates)d candidates, %(evaluated)d evaluated, %(pruned)d pruned by their "
+                     "bound, %(infeasible)d with an infeasible relaxation, %(bound_time).2fs computing bounds" %
+                     self.stats())
+
+
+def enable_bound_pruning(bound="lp"):
+    '''
+    bound the candidates before solving them, and skip the ones that cannot beat the best candidate found so far
+    :param bound: one of BOUNDS
+    :return: the pruning statistics
+    '''
+    global candidate_pruning
+    candidate_pruning = BoundPruning(bound)
+    return candidate_pruning
@@ -0,0 +1,165 @@
+import weakref
+
+import numpy as np
+from sqlalchemy import event
+
+from ..time.persistence import session_factory
+
+# the residual states whose changes are not written to their nodes and edges yet, see ResidualState.write_back
+pending = weakref.WeakSet()
+
+
+@event.listens_for(session_factory, "before_flush")
+def on_before_flush(session, flush_context, instances):
+    for state in list(pending):
+        state.write_back()
+
+
+class ResidualState:
+    '''
+    the residual cpu of the nodes and bandwidth of the edges of a substrate, as arrays in the order of its nodes and
+    edges. Services are consumed and released on the arrays, and the changed values are only written to the Node and
+    Edge objects by write_back, or when the session flushes other changes. Every change bumps version, changes of delay also bump delay_version, so
+    that caches depending only on the delays are kept while capacities change.
+    '''
+
+    def __init__(self, nodes, edges):
+        '''
+        :param nodes: the Node objects of the substrate
+        :param edges: the Edge objects of the substrate
+        '''
+        self.nodes = list(nodes)
+        self.edges = list(edges)
+        self.node_index = dict([(node.id, i) for i, node in enumerate(self.nodes)])
+        self.edge_index = dict([(edge.id, j) for j, edge in enumerate(self.edges)])
+        self.names = [node.name for node in self.nodes]
+        self.ends = [(edge.node_1.name, edge.node_2.name) for edge in self.edges]
+        # the order of the rows of the model, see Substrate.dump_model
+        self.node_order = sorted(range(len(self.names)), key=lambda i: self.names[i])
+        self.edge_order = sorted(range(len(self.ends)), key=lambda j: self.ends[j][0])
+
+        self.cpu = np.array([node.cpu_capacity for node in self.nodes], dtype=float)
+        self.bandwidth = np.array([edge.bandwidth for edge in self.edges], dtype=float)
+        self.delay = np.array([edge.delay for edge in self.edges], dtype=float)
+
+        self.version = 0
+        self.delay_version = 0
+        self.dirty_nodes = set()
+        self.dirty_edges = set()
+
+    def consume(self, mapping, factor=-1):
+        '''
+        take the cpu and bandwidth of a mapping from the residual capacities, in O(|mapping|)
+        :param mapping: the mapping of a service on the substrate
+        :param factor: -1 to consume the mapping, +1 to release it
+        '''
+        nodes = [self.node_index[ns.node.id] for ns in mapping.node_mappings]
+        edges = [self.edge_index[es.edge.id] for es in mapping.edge_mappings]
+        # a node or an edge may appear several times
+        np.add.at(self.cpu, nodes, [factor * ns.service_node.cpu for ns in mapping.node_mappings])
+        np.add.at(self.bandwidth, edges, [factor * es.serviceEdge.bandwidth for es in mapping.edge_mappings])
+
+        self.dirty_nodes.update(nodes)
+        self.dirty_edges.update(edges)
+        self.version += 1
+        pending.add(self)
+
+    def set_delay(self, edge, delay):
+        '''
+        :param edge: an Edge of the substrate
+        '''
+        j = self.edge_index[edge.id]
+        if self.delay[j] != delay:
+            self.delay[j] = delay
+            self.dirty_edges.add(j)
+            self.version += 1
+            self.delay_version += 1
+            pending.add(self)
+
+    def write_back(self):
+        '''
+        write the changed capacities and delays to the Node and Edge objects
+        '''
+        for i in self.dirty_nodes:
+            self.nodes[i].cpu_capacity = float(self.cpu[i])
+        for j in self.dirty_edges:
+            self.edges[j].bandwidth = float(self.bandwidth[j])
+            self.edges[j].delay = float(self.delay[j])
+        self.dirty_nodes.clear()
+        self.dirty_edges.clear()
+        pending.discard(self)
+
+
+class SnapshotLog:
+    '''
+    the residual capacities of a substrate at successive steps, each step keeping only the values that changed since
+    the previous one: memory grows with the number of changes, not with the size of the substrate times the steps
+    '''
+
+    def __init__(self, residual):
+        '''
+        :param residual: the ResidualState of the substrate, its current capacities are the base of the log
+        '''
+        self.residual = residual
+        self.base_cpu = residual.cpu.copy()
+        self.base_bandwidth = residual.bandwidth.copy()
+        # the capacities of the last step, the next one is diffed against them
+        self.cpu = self.base_cpu.copy()
+        self.bandwidth = self.base_bandwidth.copy()
+        # for each step, the (indices, values) of the nodes and of the edges that changed
+        self.steps = []
+        self.cpu_sums = []
+        self.bandwidth_sums = []
+
+    def __getstate__(self):
+        # the steps are pickled with the results, not the substrate they were recorded from
+        state = dict(self.__dict__)
+        state["residual"] = None
+        return state
+
+    def snapshot(self):
+        '''
+        record the current capacities as a new step
+        :return: the Snapshot of the step
+        '''
+        nodes = np.flatnonzero(self.residual.cpu != self.cpu)
+        edges = np.flatnonzero(self.residual.bandwidth != self.bandwidth)
+        self.cpu[nodes] = self.residual.cpu[nodes]
+        self.bandwidth[edges] = self.residual.bandwidth[edges]
+        self.steps.append((nodes, self.cpu[nodes], edges, self.bandwidth[edges]))
+        self.cpu_sums.append(float(self.cpu.sum()))
+        self.bandwidth_sums.append(float(self.bandwidth.sum()))
+        return Snapshot(self, len(self.steps) - 1)
+
+    def get_state(self, step):
+        '''
+        :return: the (cpu, bandwidth) arrays of the step, replayed from the base
+        '''
+        cpu = self.base_cpu.copy()
+        bandwidth = self.base_bandwidth.copy()
+        for nodes, cpus, edges, bandwidths in self.steps[:step + 1]:
+            cpu[nodes] = cpus
+            bandwidth[edges] = bandwidths
+        return cpu, bandwidth
+
+
+class Snapshot:
+    '''
+    the residual capacities of a substrate at a step of a SnapshotLog, in place of a copy of the substrate
+    '''
+
+    def __init__(self, log, step):
+        self.log = log
+        self.step = step
+
+    def get_state(self):
+        '''
+        :return: the (cpu, bandwidth) arrays of the step, in the order of the nodes and edges of the substrate
+        '''
+        return self.log.get_state(self.step)
+
+    def get_nodes_sum(self):
+        return self.log.cpu_sums[self.step]
+
+    def get_edges_sum(self):
+        return self.log.bandwidth_sums[self.step]
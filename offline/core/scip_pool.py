@@ -0,0 +1,176 @@
+import atexit
+import logging
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+from threading import Condition
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../results')
+
+# printed by scip once "write solution <file>" is done, or when the file cannot be written
+SOLUTION_WRITTEN = "written solution information to file <%s>"
+SOLUTION_ERROR = "error creating file <%s>"
+
+
+class ScipError(Exception):
+    pass
+
+
+def run_scip_process(commands, solution_file):
+    '''
+    run the commands then write the solution in a new scip process
+    :return: the output of scip
+    '''
+    args = ["scip"]
+    for command in commands + ["write solution %s" % solution_file, "q"]:
+        args += ["-c", command]
+    return subprocess.Popen(args, stdout=subprocess.PIPE, universal_newlines=True).communicate()[0]
+
+
+class ScipWorker:
+    '''
+    a persistent interactive scip session, commands are sent on stdin and stdout is read back until the solution
+    file has been written
+    '''
+
+    def __init__(self, scratch):
+        '''
+        :param scratch: a folder private to this worker, used as the working directory of scip
+        '''
+        self.scratch = scratch
+        if not os.path.exists(self.scratch):
+            os.makedirs(self.scratch)
+        self.process = None
+        self.solve_count = 0
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(["scip"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, cwd=self.scratch, universal_newlines=True)
+
+    def run(self, commands, solution_file):
+        '''
+        run the commands then write the solution, restarting scip once if the session died
+        :param commands: a list of scip shell commands (eg. ["read optim.zpl", "optimize"])
+        :param solution_file: where the solution is written
+        :return: the output of scip for these commands
+        '''
+        try:
+            output = self.__run(commands, solution_file)
+        except (ScipError, BrokenPipeError):
+            logging.warning("scip worker in %s died, restarting it" % self.scratch)
+            self.close()
+            self.start()
+            output = self.__run(commands, solution_file)
+        self.solve_count += 1
+        return output
+
+    def __run(self, commands, solution_file):
+        # parameters are not reset when a new problem is read, so reset them to behave like a fresh process
+        for command in ["set default"] + commands + ["write solution %s" % solution_file]:
+            self.process.stdin.write("%s\n" % command)
+        self.process.stdin.flush()
+
+        markers = (SOLUTION_WRITTEN % solution_file, SOLUTION_ERROR % solution_file)
+        output = []
+        while True:
+            line = self.process.stdout.readline()
+            if line == "":
+                raise ScipError("scip exited with code %s" % self.process.poll())
+            output.append(line)
+            if markers[0] in line:
+                return "".join(output)
+            if markers[1] in line:
+                # like a scip process, the caller fails to read the solution
+                logging.error("scip could not write %s" % solution_file)
+                return "".join(output)
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write("quit\n")
+            self.process.stdin.close()
+            self.process.wait()
+        except (IOError, OSError):
+            self.process.kill()
+        self.process = None
+
+
+class ScipPool:
+    '''
+    a bounded pool of scip workers, shared by the threads of a process. Workers are started on demand, so a pool
+    inherited by a forked process starts its own workers only when it is used there.
+    '''
+
+    def __init__(self, size, folder=os.path.join(RESULTS_FOLDER, "scip_workers")):
+        '''
+        :param size: the maximum number of scip sessions running at the same time
+        :param folder: the parent folder of the scratch folders of the workers
+        '''
+        assert size > 0
+        self.size = size
+        self.folder = folder
+        self.condition = Condition()
+        self.pid = None
+        self.workers = []
+        self.idle = []
+
+    def __check_pid(self):
+        # the workers of the parent process can't be used after a fork
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.workers = []
+            self.idle = []
+
+    def acquire(self):
+        with self.condition:
+            self.__check_pid()
+            while len(self.idle) == 0 and len(self.workers) >= self.size:
+                self.condition.wait()
+            if len(self.idle) > 0:
+                return self.idle.pop()
+            worker = ScipWorker(os.path.join(self.folder, "%d-%d" % (self.pid, len(self.workers))))
+            self.workers.append(worker)
+            return worker
+
+    def release(self, worker):
+        with self.condition:
+            if worker in self.workers:
+                self.idle.append(worker)
+            self.condition.notify()
+
+    @contextmanager
+    def worker(self):
+        worker = self.acquire()
+        try:
+            yield worker
+        finally:
+            self.release(worker)
+
+    def run(self, commands, solution_file):
+        '''
+        run the commands on the first idle worker
+        :return: the output of scip
+        '''
+        with self.worker() as worker:
+            return worker.run(commands, solution_file)
+
+    def close(self):
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+            for worker in self.workers:
+                worker.close()
+                shutil.rmtree(worker.scratch, ignore_errors=True)
+            logging.debug("closed %d scip workers after %d solves" % (
+                len(self.workers), sum([worker.solve_count for worker in self.workers])))
+            self.workers = []
+            self.idle = []
+
+
+def create_pool(size):
+    pool = ScipPool(size)
+    atexit.register(pool.close)
+    return pool
@@ -3,15 +3,18 @@ import multiprocessing
 import os
 import sys
 from collections import Counter
-from multiprocessing.pool import ThreadPool
 
 from sqlalchemy import Column, Integer, ForeignKey
 from sqlalchemy import and_
 from sqlalchemy.orm import relationship
 
+from offline.core.service_topo_generator import ServiceTopoFullGenerator
 from offline.core.service_topo_heuristic import ServiceTopoHeuristic
+from ..core.model import write_model, SERVICE_TABLES
 from ..core.sla import Sla, SlaNodeSpec
-from ..core.solver import solve
+from ..core import grid_search, relax, solver
+from ..core.solver import solve, solve_many, dump_model, build_mapping, get_solve_limits
+from ..core.solve_stats import record_solve
 from ..time.persistence import ServiceNode, ServiceEdge, Base, service_to_sla
 from ..time.persistence import Session
 
@@ -21,9 +24,9 @@ RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../r
 
 def f(x):
     session = Session()
-    slasIDS, vhg_count, vcdn_count, use_heuristic = x
-    service = Service(slasIDS=slasIDS, serviceSpecFactory=ServiceSpecFactory, vhg_count=vhg_count,
-                      vcdn_count=vcdn_count, use_heuristic=use_heuristic)
+    topo, slasIDS, vhg_count, vcdn_count, use_heuristic = x
+    service = Service(topo_instance=topo, slasIDS=slasIDS, serviceSpecFactory=ServiceSpecFactory,
+                      vhg_count=vhg_count, vcdn_count=vcdn_count, use_heuristic=use_heuristic)
     session.add(service)
     return service.id
 
@@ -188,10 +191,11 @@ class Service(Base):
 
     @classmethod
     def get_optimal(cls, slas, serviceSpecFactory=ServiceSpecFactory, max_vhg_count=10, max_vcdn_count=10,
-                    threads=multiprocessing.cpu_count() - 1, remove_service=True, use_heuristic=True):
+                    threads=1, remove_service=True, use_heuristic=True):
+        '''
+        :param threads: if > 1, the candidates are solved in a pool of as many processes, see embed_candidates
+        '''
         session = Session()
-        threadpool = ThreadPool(threads)
-        thread_param = []
 
         max_vhg_count = min(max_vhg_count,
                             len(set([nodes.topoNode.name for sla in slas for nodes in sla.get_start_nodes()])))
@@ -203,13 +207,41 @@ class Service(Base):
         best_cost = sys.float_info.max
         best_service = None
 
-        for vhg_count in range(1, max_vhg_count + 1, ):
-            for vcdn_count in range(1, min(vhg_count, max_vcdn_count) + 1):
-                thread_param.append(([sla.id for sla in slas], vhg_count, vcdn_count, use_heuristic))
+        merged_sla = cls.get_merged_sla(slas)
+
+        def candidates_param(vhg_count, vcdn_count):
+            if use_heuristic:
+                topoContainer = ServiceTopoHeuristic(sla=merged_sla, vhg_count=vhg_count, vcdn_count=vcdn_count)
+            else:
+                topoContainer = ServiceTopoFullGenerator(sla=merged_sla, vhg_count=vhg_count, vcdn_count=vcdn_count)
+            return [(topo, [sla.id for sla in slas], vhg_count, vcdn_count, use_heuristic) for topo in
+                    topoContainer.getTopos()]
+
+        def embed(thread_param):
+            if threads > 1 or relax.candidate_pruning is not None:
+                services = [service.id for service in
+                            cls.embed_candidates([x[:4] for x in thread_param], max(threads, 1),
+                                                 use_heuristic=use_heuristic)]
+            else:
+                services = [f(x) for x in thread_param]
+            return session.query(Service).filter(Service.id.in_(services)).all()
+
+        points = grid_search.grid_points(max_vhg_count, max_vhg_count, max_vcdn_count)
+        if grid_search.grid_search is None:
+            services = embed([param for vhg_count, vcdn_count in points for param in
+                              candidates_param(vhg_count, vcdn_count)])
+        else:
+            # the vhg and vcdn counts are explored best-first, see grid_search.GridSearch
+            services = []
+
+            def evaluate(point):
+                embedded = embed(candidates_param(*point))
+                services.extend(embedded)
+                objective_functions = [service.mapping.objective_function for service in embedded if
+                                       service.mapping is not None]
+                return min(objective_functions) if len(objective_functions) > 0 else None
 
-        # services = threadpool.map(f, thread_param)
-        services = [f(x) for x in thread_param]
-        services = session.query(Service).filter(Service.id.in_(services)).all()
+            grid_search.grid_search.search(merged_sla, points, evaluate)
 
         for service in services:
             if service.mapping is not None:
@@ -237,7 +269,7 @@ class Service(Base):
         return best_service
 
     def __init__(self, topo_instance, slasIDS, serviceSpecFactory=ServiceSpecFactory, vhg_count=1, vcdn_count=1,
-                 use_heuristic=True,solve=True):
+                 use_heuristic=True,solve=True, embed=True):
         session = Session()
 
         self.slas = session.query(Sla).filter(Sla.id.in_(slasIDS)).all()
@@ -268,6 +300,9 @@ class Service(Base):
 
         session.add(self)
         session.flush()
+        if not embed:  # embedding is done by the caller, see embed_candidates
+            return
+
         if use_heuristic:
             # create temp mapping for vhg<->vcdn hints
             assert self.id is not None
@@ -275,26 +310,7 @@ class Service(Base):
             session.flush()
 
             if self.mapping is not None:
-                self.topo = list(ServiceTopoHeuristic(sla=self.merged_sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
-                                                 hint_node_mappings=self.mapping.node_mappings).getTopos())[0]
-
-                # add the CDN Edges to the graph
-                for sla in [self.merged_sla]:
-
-                    for node_1, node_2, bandwidth in self.topo.getServiceCDNEdges():
-                        snode_1 = session.query(ServiceNode).filter(
-                            and_(ServiceNode.sla_id == sla.id, ServiceNode.service_id == self.id,
-                                 ServiceNode.name == node_1)).one()
-
-                        snode_2 = session.query(ServiceNode).filter(
-                            and_(ServiceNode.sla_id == sla.id, ServiceNode.service_id == self.id,
-                                 ServiceNode.name == node_2)).one()
-
-                        sedge = ServiceEdge(node_1=snode_1, node_2=snode_2, bandwidth=bandwidth, sla_id=sla.id)
-                        session.add(sedge)
-                        self.serviceEdges.append(sedge)
-                    session.flush()
-
+                self.add_cdn_edges()
                 session.delete(self.mapping)
                 session.flush()
                 if solve: #to perf measurements purposes, we should alway solve...
@@ -305,6 +321,124 @@ class Service(Base):
 
         session.flush()
 
+    def add_cdn_edges(self):
+        '''
+        recompute the topology using the current mapping as vhg<->cdn hints, and add the CDN Edges to the service
+        '''
+        session = Session()
+        self.topo = list(ServiceTopoHeuristic(sla=self.merged_sla, vhg_count=self.vhg_count, vcdn_count=self.vcdn_count,
+                                              hint_node_mappings=self.mapping.node_mappings).getTopos())[0]
+
+        for sla in [self.merged_sla]:
+
+            for node_1, node_2, bandwidth in self.topo.getServiceCDNEdges():
+                snode_1 = session.query(ServiceNode).filter(
+                    and_(ServiceNode.sla_id == sla.id, ServiceNode.service_id == self.id,
+                         ServiceNode.name == node_1)).one()
+
+                snode_2 = session.query(ServiceNode).filter(
+                    and_(ServiceNode.sla_id == sla.id, ServiceNode.service_id == self.id,
+                         ServiceNode.name == node_2)).one()
+
+                sedge = ServiceEdge(node_1=snode_1, node_2=snode_2, bandwidth=bandwidth, sla_id=sla.id)
+                session.add(sedge)
+                self.serviceEdges.append(sedge)
+            session.flush()
+
+    @classmethod
+    def embed_candidates(cls, candidates, processes, use_heuristic=True):
+        '''
+        create candidate services and solve their models in a process pool. Workers only get the models as plain
+        data and their own working directory, the mapping of the cheapest candidate is then created in the session.
+        If bound pruning is enabled (see relax.enable_bound_pruning), candidates are solved by increasing lower bound,
+        processes at a time, and the ones that cannot beat the best candidate so far are not solved.
+
+        :param candidates: a list of (topo_instance, slasIDS, vhg_count, vcdn_count)
+        :param processes: the size of the process pool
+        :param use_heuristic: solve without CDN edges first, and use the mapping to add them
+        :return: the list of services, only the cheapest one has a mapping
+        '''
+        session = Session()
+        services = [cls(topo_instance=topo, slasIDS=slasIDS, vhg_count=vhg_count, vcdn_count=vcdn_count,
+                        use_heuristic=use_heuristic, embed=False) for topo, slasIDS, vhg_count, vcdn_count in
+                    candidates]
+        services = [service for service in services if len(service.slas) > 0]
+
+        pruning = relax.candidate_pruning
+        if pruning is None:
+            results = cls.solve_candidates(services, processes, use_heuristic)
+        else:
+            bounds = pruning.bounds([dump_model(service, service.slas[0].substrate) for service in services],
+                                    processes)
+            results = []
+
+            def solve_batch(batch):
+                solved = dict([(service.id, solution) for service, solution in
+                               cls.solve_candidates(batch, processes, use_heuristic)])
+                results.extend([(service, solved[service.id]) for service in batch if service.id in solved])
+                return [solved[service.id][0] if service.id in solved else None for service in batch]
+
+            pruning.evaluate(services, bounds, solve_batch, max(processes, 1))
+            pruning.log_stats()
+
+        if len(results) > 0:
+            winner, solution = min(results, key=lambda x: x[1][0])
+            objective_function, node_solutions, edge_solutions, status, gap = solution
+            mapping = build_mapping(node_solutions, edge_solutions, objective_function, service=winner,
+                                    substrate=winner.slas[0].substrate, status=status, gap=gap)
+            mapping.substrate = winner.slas[0].substrate
+            winner.mapping = mapping
+            session.add(mapping)
+            session.flush()
+
+        return services
+
+    @classmethod
+    def solve_candidates(cls, services, processes, use_heuristic=True):
+        '''
+        solve the models of candidate services created with embed=False, see embed_candidates. The telemetry of every
+        solve is recorded, see solve_stats.SolveStats
+        :return: the list of (service, solution) of the services that have a solution
+        '''
+        session = Session()
+
+        def jobs(services, reopt):
+            return [(dump_model(service, service.slas[0].substrate), str(service.id), use_heuristic, reopt,
+                     solver.solver_backend, get_solve_limits()) for service in services]
+
+        def solve_jobs(services, reopt):
+            stats = []
+            solutions = solve_many(jobs(services, reopt), processes, stats)
+            for service, job_stats in zip(services, stats):
+                record_solve(job_stats, service=service)
+            return solutions
+
+        solutions = solve_jobs(services, False)
+
+        if use_heuristic:
+            # use the temp mappings for vhg<->vcdn hints, then solve again with the CDN edges
+            hinted_services = []
+            for service, solution in zip(services, solutions):
+                if solution is None:
+                    logging.warning("mapping failed for slas %s" % (" ".join(str(sla.id) for sla in service.slas)))
+                    continue
+                objective_function, node_solutions, edge_solutions, status, gap = solution
+                service.mapping = build_mapping(node_solutions, edge_solutions, objective_function, service=service,
+                                                substrate=service.slas[0].substrate, status=status, gap=gap)
+                service.add_cdn_edges()
+                session.delete(service.mapping)
+                session.flush()
+                service.mapping = None
+                hinted_services.append(service)
+            services = hinted_services
+            solutions = solve_jobs(services, True)
+
+        for service, solution in zip(services, solutions):
+            if solution is None:
+                logging.warning("mapping failed for slas %s" % (" ".join(str(sla.id) for sla in service.slas)))
+
+        return [(service, solution) for service, solution in zip(services, solutions) if solution is not None]
+
     def __solve(self, path=".", use_heuristic=True,reopt=False):
         """
         Solve the service according to specs
@@ -336,76 +470,54 @@ class Service(Base):
         self.sla.sla_node_specs = sla_node_specs
         return vhg_hints
 
-    def write(self, path="."):
-
-        if not os.path.exists(os.path.join(RESULTS_FOLDER, path)):
-            os.makedirs(os.path.join(RESULTS_FOLDER, path))
-
-        mode = "w"
+    def dump_model(self):
+        '''
+        :return: the service part of the embedding model, as a dict of tables indexed by data file name
+        '''
+        # every table is written, even an empty one, so that optim.zpl never reads a stale file
+        model = dict([(table, []) for table in SERVICE_TABLES])
         # slas = self.slas
         slas = [self.merged_sla]
 
-        # write info on the edge
-        with open(os.path.join(RESULTS_FOLDER, path, "service.edges.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-                for start, end, bw in self.topo.dump_edges():
-                    f.write("%s\t\t%s_%s\t\t%lf\n" % (("%s_%s" % (start, postfix)).ljust(20), end, postfix, bw))
-
-        with open(os.path.join(RESULTS_FOLDER, path, "service.nodes.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-
-                for snode_id, cpu, bw in self.topo.getServiceNodes():
-                    f.write("%s\t\t%lf\t\t%lf\n" % (("%s_%s" % (snode_id, postfix)).ljust(20), cpu, bw))
-                    # sys.stdout.write("%s_%s %lf\n" % (snode_id, postfix, cpu))
-
-
-                    # write constraints on CDN placement
-        with open(os.path.join(RESULTS_FOLDER, path, "CDN.nodes.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-                self.merged_sla.get_cdn_nodes()
-                for node, mapping, bw in self.topo.get_CDN():
-                    f.write("%s_%s %s\n" % (node, postfix, mapping))
-
-        # write constraints on starter placement
-        with open(os.path.join(RESULTS_FOLDER, path, "starters.nodes.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-                for s, topo, bw in self.topo.get_Starters():
-                    f.write("%s_%s %s %lf\n" % (s, postfix, topo, bw))
-
-        # write the names of the VHG Nodes
-        with open(os.path.join(RESULTS_FOLDER, path, "VHG.nodes.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-                for vhg in self.topo.get_vhg():
-                    f.write("%s_%s\n" % (vhg, postfix))
-
-        # write the names of the VCDN nodes
-        with open(os.path.join(RESULTS_FOLDER, path, "VCDN.nodes.data"), mode) as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-                for vcdn in self.topo.get_vcdn():
-                    f.write("%s_%s\n" % (vcdn, postfix))
-
-                    # write path to associate e2e delay
-
-        with open(os.path.join(RESULTS_FOLDER, path, "service.path.delay.data"), "w") as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-
-                for apath in self.topo.dump_delay_paths():
-                    f.write("%s_%s %lf\n" % (apath, postfix, self.topo.delay))
-
-        # write e2e delay constraint
-        with open(os.path.join(RESULTS_FOLDER, path, "service.path.data"), "w") as f:
-            for sla in slas:
-                postfix = "%d_%d" % (self.id, sla.id)
-
-                for apath, s1, s2 in self.topo.dump_delay_routes():
-                    f.write("%s_%s %s_%s %s_%s\n" % (apath, postfix, s1, postfix, s2, postfix))
+        for sla in slas:
+            postfix = "%d_%d" % (self.id, sla.id)
+
+            # info on the edges
+            for start, end, bw in self.topo.dump_edges():
+                model["service.edges"].append(("%s_%s" % (start, postfix), "%s_%s" % (end, postfix), bw))
+
+            for snode_id, cpu, bw in self.topo.getServiceNodes():
+                model["service.nodes"].append(("%s_%s" % (snode_id, postfix), cpu, bw))
+
+            # constraints on CDN placement
+            for node, mapping, bw in self.topo.get_CDN():
+                model["CDN.nodes"].append(("%s_%s" % (node, postfix), mapping))
+
+            # constraints on starter placement
+            for s, topo, bw in self.topo.get_Starters():
+                model["starters.nodes"].append(("%s_%s" % (s, postfix), topo, bw))
+
+            # the names of the VHG Nodes
+            for vhg in self.topo.get_vhg():
+                model["VHG.nodes"].append("%s_%s" % (vhg, postfix))
+
+            # the names of the VCDN nodes
+            for vcdn in self.topo.get_vcdn():
+                model["VCDN.nodes"].append("%s_%s" % (vcdn, postfix))
+
+            # path to associate e2e delay
+            for apath in self.topo.dump_delay_paths():
+                model["service.path.delay"].append(("%s_%s" % (apath, postfix), self.topo.delay))
+
+            # e2e delay constraint
+            for apath, s1, s2 in self.topo.dump_delay_routes():
+                model["service.path"].append(("%s_%s" % (apath, postfix), "%s_%s" % (s1, postfix),
+                                              "%s_%s" % (s2, postfix)))
+
+        return model
+
+    def write(self, path="."):
+        write_model(self.dump_model(), os.path.join(RESULTS_FOLDER, path))
 
     @classmethod
     def getFromSla(cls, sla):
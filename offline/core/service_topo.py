@@ -1,4 +1,4 @@
-import copy
+import collections
 
 
 class AbstractServiceTopo(object):
@@ -14,12 +14,17 @@ class AbstractServiceTopo(object):
 
 
     def getTopos(self):
-        res = list(self.compute_service_topo(
+        return list(self.iterTopos())
+
+    def iterTopos(self):
+        '''
+        :return: the topologies, computed as they are consumed
+        '''
+        return iter(self.compute_service_topo(
             mapped_start_nodes=self.mapped_start_nodes, mapped_cdn_nodes=self.mapped_cdn_nodes,
             vhg_count=self.vhg_count,
             vcdn_count=self.vcdn_count, delay=self.sla.delay,
             hint_node_mappings=self.hint_node_mappings, substrate=self.sla.substrate, ))
-        return res
 
     def propagate_bandwidth(self, service, mapped_start_nodes):
         # assign bandwidth
@@ -52,45 +57,46 @@ def get_nodes_by_type(type, graph):
 
 
 def get_all_possible_edge_for_2_lists(left, right, all_rights_are_mandatory=True):
-    res = [[]]
-    for l in left:
-        rres = []
+    '''
+    every way of linking each left node to one right node, yielded one at a time
+    :param all_rights_are_mandatory: only yield the ways that use every right node, if there are enough left nodes
+    :return: a generator of lists of (left, right) edges, the last left node changes the slowest
+    '''
+    mandatory = all_rights_are_mandatory and len(left) >= len(right)
+    edges = [None] * len(left)
+    used = collections.Counter()
+
+    def assign(i):
+        # the left nodes are assigned from the last one
+        if i < 0:
+            yield list(edges)
+            return
         for r in right:
-            for elt in res:
-                elt_copy = copy.copy(elt)
-                elt_copy.append((l, r))
-                rres.append(elt_copy)
+            used[r] += 1
+            # the remaining left nodes must be able to use the right nodes that are still unused
+            if not mandatory or len(right) - len(+used) <= i:
+                edges[i] = (left[i], r)
+                for res in assign(i - 1):
+                    yield res
+            used[r] -= 1
 
-        res = rres
-
-    # remove cases where a server is not used, if possible.
-    if all_rights_are_mandatory and (len(left) >= len(right)):
-        res = [o for o in res if len(set([x for t in o for x in t])) == len(left) + len(right)]
-    return res
+    return assign(len(left) - 1)
 
 
 def get_all_possible_edges(thelist, all_rights_are_mandatory=True):
     '''
 
     :param thelist: a list of list of items (layers)
-    :return: a list containing every possible list taling layers into account
+    :return: a generator of every possible list of edges taking layers into account, yielded one at a time
     '''
-    l = thelist.pop(0)
-    r = thelist.pop(0)
-    res = [[]]
-    while True:
-        rres = []
-        new = get_all_possible_edge_for_2_lists(l, r, all_rights_are_mandatory)
-
-        for elt in res:
-            for new_elt in new:
-                elt_copy = copy.copy(elt)
-                elt_copy += (new_elt)
-                rres.append(elt_copy)
-        res = rres
-        if len(thelist) != 0:
-            l = r
-            r = thelist.pop(0)
-        else:
-            break
-    return res
+    pairs = list(zip(thelist[:-1], thelist[1:]))
+
+    def combine(i):
+        if i == len(pairs):
+            yield []
+            return
+        for elt in get_all_possible_edge_for_2_lists(pairs[i][0], pairs[i][1], all_rights_are_mandatory):
+            for new_elt in combine(i + 1):
+                yield elt + new_elt
+
+    return combine(0)
@@ -1,31 +1,36 @@
 import collections
-import copy
-import sys
+import heapq
+import multiprocessing
+import operator
+import zlib
 
 import networkx as nx
 from networkx import shortest_path
 
-from offline.core.service_topo import AbstractServiceTopo, get_all_possible_edges, get_nodes_by_type
+from offline.core.service_topo import AbstractServiceTopo, get_all_possible_edge_for_2_lists, get_nodes_by_type
 from offline.core.topo_instance import TopoInstance
 from offline.pricing.generator import get_vmg_calculator, get_vcdn_calculator
 
 
-class IsomorphicServiceException(BaseException):
-    pass
+# the types of the nodes that are interchangeable in isomorphic candidates, see equal_nodes
+ANONYMOUS_TYPES = ("VHG", "VCDN")
 
 
 class ServiceTopoFullGenerator(AbstractServiceTopo):
-    def __init__(self, sla, vhg_count, vcdn_count, hint_node_mappings=None,disable_isomorph_check=False):
+    def __init__(self, sla, vhg_count, vcdn_count, hint_node_mappings=None,disable_isomorph_check=False, processes=1):
+        '''
+        :param processes: if > 1, the enumeration is split in shards, enumerated in a pool of processes
+        '''
         self.disable_isomorph_check = disable_isomorph_check
+        self.processes = processes
         super(ServiceTopoFullGenerator, self).__init__(sla, vhg_count, vcdn_count, hint_node_mappings)
 
 
     def compute_service_topo(self, substrate, mapped_start_nodes, mapped_cdn_nodes, vhg_count, vcdn_count, delay,
                              hint_node_mappings=None):
-
-
-        res=[]
-
+        '''
+        yield the candidate topologies one at a time, skipping the ones isomorphic to a previous one
+        '''
 
         vhg_count = min(len(mapped_start_nodes), vhg_count)
         vcdn_count = min(vcdn_count, vhg_count)
@@ -48,90 +53,134 @@ class ServiceTopoFullGenerator(AbstractServiceTopo):
             service_graph.add_node("CDN%d" % index, type="CDN", cpu=0, ratio=0.65, name="CDN%d" % index, bandwidth=0,
                                    mapping=cdn.topoNode.name)
 
-        first = get_all_possible_edges([get_nodes_by_type("S", service_graph), get_nodes_by_type("VHG", service_graph),
-                                        get_nodes_by_type("VCDN", service_graph)])
+        layers = [get_nodes_by_type("S", service_graph), get_nodes_by_type("VHG", service_graph),
+                  get_nodes_by_type("VCDN", service_graph), get_nodes_by_type("CDN", service_graph)]
+        types = dict([(node, data["type"]) for node, data in service_graph.nodes(data=True)])
 
-        last = get_all_possible_edges([get_nodes_by_type("VHG", service_graph),
-                                       get_nodes_by_type("CDN", service_graph)], all_rights_are_mandatory=False)
+        if self.processes > 1:
+            candidates = enumerate_sharded(layers, types, self.processes, not self.disable_isomorph_check)
+        else:
+            candidates = enumerate_candidates(layers, types, check=not self.disable_isomorph_check)
 
         vmg_calc = get_vmg_calculator()
         vcdn_calc = get_vcdn_calculator()
-        # add edges
-        edges_sets = []
-        for elt in first:
-            for new_elt in last:
-                elt_copy = copy.copy(elt)
-                elt_copy += (new_elt)
-                edges_sets.append(elt_copy)
-
-        services = []
-
 
+        # the candidates whose canonical form is not exact, see canonical_form
+        inexact = collections.defaultdict(list)
 
-        for t in edges_sets:
-            try:
-                serviceT = copy.deepcopy(service_graph)
-                for edge in t:
-                    serviceT.add_edge(edge[0], edge[1])
+        for position, edges, form in candidates:
 
-                for node, degree in list(serviceT.degree().items()):
-                    if degree == 0:
-                        serviceT.remove_node(node)
+            # nodes without edges are left out
+            serviceT = nx.DiGraph()
+            used = set([node for edge in edges for node in edge])
+            serviceT.add_nodes_from([(node, dict(data)) for node, data in service_graph.nodes(data=True)
+                                     if node in used])
+            serviceT.add_edges_from(edges)
 
-                str_rep = "-".join(
-                    sorted(["%s_%s" % (t[0], t[1].get("mapping", "NA")) for t in serviceT.nodes(data=True)]))
-                # print str_rep
-                #sys.stdout.write("o")
-                #sys.stdout.flush()
-                if not self.disable_isomorph_check:
-                    for s in services:
-                        if "-".join(sorted(
-                                ["%s_%s" % (t[0], t[1].get("mapping", "NA")) for t in s.nodes(data=True)])) == str_rep:
-                            if nx.is_isomorphic(s, serviceT, equal_nodes):
-                                #sys.stdout.write("\b")
-                                #sys.stdout.flush()
-                                raise IsomorphicServiceException()
+            if form is not None and not form[1]:
+                if any([nx.is_isomorphic(s, serviceT, equal_nodes) for s in inexact[form]]):
+                    continue
+                inexact[form].append(serviceT)
 
-                #sys.stdout.write("\bO")
-                #sys.stdout.flush()
+            self.propagate_bandwidth(serviceT, mapped_start_nodes=mapped_start_nodes)
 
-                services.insert(0, serviceT)
+            # assign CPU according to Bandwidth
+            for vhg in get_nodes_by_type("VHG", serviceT):
+                serviceT.node[vhg]["cpu"] = vmg_calc(serviceT.node[vhg]["bandwidth"])
 
-                self.propagate_bandwidth(serviceT, mapped_start_nodes=mapped_start_nodes)
+            for vhg in get_nodes_by_type("VCDN", serviceT):
+                serviceT.node[vhg]["cpu"] = vcdn_calc(serviceT.node[vhg]["bandwidth"])
 
-                # assign CPU according to Bandwidth
-                for vhg in get_nodes_by_type("VHG", serviceT):
-                    serviceT.node[vhg]["cpu"] = vmg_calc(serviceT.node[vhg]["bandwidth"])
+            delay_path = {}
+            delay_route = collections.defaultdict(lambda: [])
+            for vcdn in get_nodes_by_type("VCDN", serviceT):
+                for s in get_nodes_by_type("S", serviceT):
+                    try:
+                        sp = shortest_path(serviceT, s, vcdn)
+                        key = "_".join(sp)
+                        delay_path[key] = delay
+                        for i in range(len(sp) - 1):
+                            delay_route[key].append((sp[i], sp[i + 1]))
 
-                for vhg in get_nodes_by_type("VCDN", serviceT):
-                    serviceT.node[vhg]["cpu"] = vcdn_calc(serviceT.node[vhg]["bandwidth"])
+                    except:
+                        continue
+            # logging.debug("so far, %d services" % len(services))
+            yield TopoInstance(serviceT, delay_path, delay_route, delay)
 
-                delay_path = {}
-                delay_route = collections.defaultdict(lambda: [])
-                for vcdn in get_nodes_by_type("VCDN", serviceT):
-                    for s in get_nodes_by_type("S", serviceT):
-                        try:
-                            sp = shortest_path(serviceT, s, vcdn)
-                            key = "_".join(sp)
-                            delay_path[key] = delay
-                            for i in range(len(sp) - 1):
-                                delay_route[key].append((sp[i], sp[i + 1]))
-
-                        except:
-                            continue
-                # logging.debug("so far, %d services" % len(services))
-                res.append(TopoInstance(serviceT, delay_path, delay_route, delay))
 
+def enumerate_candidates(layers, types, shard=0, shards=1, check=True):
+    '''
+    enumerate the edge sets of the candidate services, without the ones whose exact canonical form was already seen
+    :param layers: the S, VHG, VCDN and CDN nodes
+    :param types: the type of every node
+    :param shard: the shard to enumerate, see shard_of
+    :param shards: the number of shards
+    :param check: skip isomorphic candidates, if False every edge set is yielded
+    :return: a generator of (position, edges, canonical form) in enumeration order, position is the
+    (S->VHG assignment index, index of the rest of the edges) of the edge set, form is None if check is False
+    '''
+    starts, vhgs, vcdns, cdns = layers
+    forms = set()
+    for i, start_edges in enumerate(get_all_possible_edge_for_2_lists(starts, vhgs)):
+        if shards > 1 and shard_of(start_edges, shards) != shard:
+            continue
+        rest = (vcdn_edges + cdn_edges for vcdn_edges in get_all_possible_edge_for_2_lists(vhgs, vcdns)
+                for cdn_edges in get_all_possible_edge_for_2_lists(vhgs, cdns, all_rights_are_mandatory=False))
+        for j, edges in enumerate(rest):
+            edges = start_edges + edges
+            form = None
+            if check:
+                form = canonical_form(edges, types)
+                if form[1]:
+                    if form in forms:
+                        continue
+                    forms.add(form)
+            yield (i, j), edges, form
+
+
+def shard_of(start_edges, shards):
+    '''
+    :param start_edges: the S->VHG edges of a candidate
+    :return: the shard of the candidate, given by how the starters are grouped whatever the names of the VHGs, so that
+    isomorphic candidates are in the same shard
+    '''
+    groups = collections.defaultdict(list)
+    for start, vhg in start_edges:
+        groups[vhg].append(start)
+    key = ";".join(sorted([",".join(sorted(group)) for group in list(groups.values())]))
+    return zlib.crc32(key.encode("utf-8")) % shards
 
-            except IsomorphicServiceException as e:
-                pass
 
-        #sys.stdout.write("\n%d/%d possible services for vhg=%d, vcdn=%d, s=%d, cdn=%d\n" % (            len(res),len(edges_sets),vhg_count, vcdn_count, len(mapped_start_nodes), len(mapped_cdn_nodes)))
-        #for line in sorted([",".join(sorted([n for n in serviceT.servicetopo.nodes()])) + "\t" + ",".join(sorted(["%s-%s" % (e[0], e[1]) for e in serviceT.servicetopo.edges()])) for serviceT in res]):
-        #    print line
-        return res
+def enumerate_shard(job):
+    '''
+    :param job: (layers, types, shard, shards, check), see enumerate_candidates
+    :return: the candidates of the shard, as a list
+    '''
+    layers, types, shard, shards, check = job
+    return list(enumerate_candidates(layers, types, shard, shards, check))
 
 
+def enumerate_sharded(layers, types, processes, check=True):
+    '''
+    enumerate the shards of the candidates in a pool of processes, and merge them back in enumeration order without the
+    duplicates found in different shards (there are none as long as the canonical forms are exact), the result is the
+    same as enumerate_candidates
+    '''
+    jobs = [(layers, types, shard, processes, check) for shard in range(processes)]
+    pool = multiprocessing.Pool(processes)
+    try:
+        shards = pool.map(enumerate_shard, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+    forms = set()
+    for position, edges, form in heapq.merge(*shards, key=operator.itemgetter(0)):
+        if form is not None and form[1]:
+            if form in forms:
+                continue
+            forms.add(form)
+        yield position, edges, form
 
 
 def equal_nodes(node1, node2):
@@ -149,3 +198,31 @@ def equal_nodes(node1, node2):
     else:
         #print("%s is NOT equal to %s" % (node1["name"], node2["name"]))
         return False
+
+
+def canonical_form(edges, types):
+    '''
+    a canonical string of a candidate service, S and CDN nodes keep their names and VHG and VCDN nodes are named after
+    their predecessors, so that isomorphic candidates according to equal_nodes have the same string.
+    :param edges: the (start, end) edges of the candidate, nodes without edges are not part of it
+    :param types: the type of every node
+    :return: (the canonical string, exact) exact is True if no two VHG or VCDN get the same name, candidates with the
+    same string are then isomorphic, otherwise they still have to be compared
+    '''
+    predecessors = collections.defaultdict(list)
+    for start, end in edges:
+        predecessors[end].append(start)
+
+    names = {}
+
+    def name(node):
+        if node not in names:
+            if types[node] in ANONYMOUS_TYPES:
+                names[node] = "%s(%s)" % (types[node], ",".join(sorted([name(p) for p in predecessors[node]])))
+            else:
+                names[node] = node
+        return names[node]
+
+    form = ";".join(sorted(["%s>%s" % (name(start), name(end)) for start, end in edges]))
+    anonymous = [names[node] for node in names if types[node] in ANONYMOUS_TYPES]
+    return form, len(set(anonymous)) == len(anonymous)
@@ -0,0 +1,135 @@
+import collections
+import hashlib
+import logging
+import os
+import pickle
+import re
+import tempfile
+
+# stands for the "_<service id>_<sla id>" postfix of service names, so that identical models of different services
+# share the same key
+POSTFIX_PLACEHOLDER = "_#_#"
+BLANKS_PATTERN = re.compile("[ \t]+")
+
+
+def replace_postfix(data, old, new):
+    if old is None or new is None:
+        return data
+    return re.sub(re.escape(old) + "(?![0-9])", new.replace("\\", "\\\\"), data)
+
+
+class SolveCache:
+    '''
+    persistent content-addressed cache of solver results, bounded in number of entries with LRU eviction.
+    Each entry is stored in its own file, the LRU order is the modification time of the files.
+    '''
+
+    def __init__(self, folder, max_entries=10000):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self.lru = self.__load_entries()
+
+    def __load_entries(self):
+        entries = [f for f in os.listdir(self.folder) if f.endswith(".pickle")]
+        entries = sorted(entries, key=lambda f: os.path.getmtime(os.path.join(self.folder, f)))
+        return collections.OrderedDict([(f[:-len(".pickle")], None) for f in entries])
+
+    def key(self, tables, postfix, *params):
+        '''
+        :param tables: a list of (table name, rendered content)
+        :param postfix: the postfix of the service names (see model.get_model_postfix), it is not part of the key
+        :param params: anything else that changes the result of the solver
+        :return: a hash of the model
+        '''
+        h = hashlib.sha1()
+        for param in params:
+            h.update(("%s\n" % str(param)).encode("utf-8"))
+        for name, content in sorted(tables):
+            if not name.startswith("substrate."):
+                content = replace_postfix(content, postfix, POSTFIX_PLACEHOLDER)
+            # names are padded, the padding depends on the length of the postfix and is not significant
+            content = BLANKS_PATTERN.sub(" ", content)
+            h.update(("%s\n" % name).encode("utf-8"))
+            h.update(content.encode("utf-8"))
+        return h.hexdigest()
+
+    def __entry(self, key):
+        return os.path.join(self.folder, "%s.pickle" % key)
+
+    def get(self, key, postfix):
+        '''
+        :return: (True, value) on a hit, (False, None) on a miss
+        '''
+        try:
+            with open(self.__entry(key), "rb") as f:
+                value = pickle.load(f)
+            os.utime(self.__entry(key), None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            self.lru.pop(key, None)
+            return False, None
+
+        self.hits += 1
+        self.lru[key] = None
+        self.lru.move_to_end(key)
+        return True, self.__restore(value, postfix)
+
+    def put(self, key, postfix, value):
+        value = self.__normalize(value, postfix)
+        fd, tmp = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f)
+        os.rename(tmp, self.__entry(key))
+
+        self.lru[key] = None
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.max_entries:
+            old_key, _ = self.lru.popitem(last=False)
+            try:
+                os.remove(self.__entry(old_key))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def __normalize(self, value, postfix):
+        return self.__map_names(value, lambda s: replace_postfix(s, postfix, POSTFIX_PLACEHOLDER))
+
+    def __restore(self, value, postfix):
+        return self.__map_names(value, lambda s: replace_postfix(s, POSTFIX_PLACEHOLDER, postfix))
+
+    def __map_names(self, value, func):
+        if isinstance(value, str):
+            return func(value)
+        elif isinstance(value, (list, tuple)):
+            return type(value)([self.__map_names(v, func) for v in value])
+        return value
+
+    def counts(self):
+        '''
+        :return: (hits, misses, evictions) of this process
+        '''
+        return self.hits, self.misses, self.evictions
+
+    def merge(self, counts):
+        '''
+        add the counters of the same cache used by other processes, a pool worker only updates its own copy, and
+        reload the entries they stored
+        :param counts: a list of (hits, misses, evictions), see counts
+        '''
+        for hits, misses, evictions in counts:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+        self.lru = self.__load_entries()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.lru)}
+
+    def log_stats(self):
+        logging.info("solve cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, %(entries)d entries" %
+                     self.stats())
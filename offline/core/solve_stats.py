@@ -0,0 +1,188 @@
+import collections
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Integer, Float, ForeignKey, String, Boolean
+
+from ..time.persistence import Base, Session
+
+# the columns of SolveStats filled from the stats collected during a solve
+STATS_COLUMNS = ["backend", "reopt", "cached", "corridor", "status", "gap", "variables", "constraints", "nodes",
+                 "solving_time", "presolving_time", "dump_time", "reduce_time", "write_time", "solver_time",
+                 "parse_time", "flush_time", "total_time"]
+
+# the name of the current experiment, see set_experiment
+experiment = "default"
+
+# see enable_solve_stats
+stats_file = None
+
+
+class SolveStats(Base):
+    '''
+    telemetry of one solve of an embedding model: the size of the model, what the solver reports, and the time spent
+    in each phase on the python side
+    '''
+    __tablename__ = "SolveStats"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    experiment = Column(String)
+    service_id = Column(Integer, ForeignKey("Service.id"))
+    mapping_id = Column(Integer, ForeignKey("Mapping.id", ondelete="SET NULL"))
+    sla_id = Column(Integer)
+    vhg_count = Column(Integer)
+    vcdn_count = Column(Integer)
+
+    backend = Column(String)
+    # solved without the CDN edges (False) or with them, starting from the first solution (True)
+    reopt = Column(Boolean)
+    # the solution came from the solve cache, solver figures are then missing
+    cached = Column(Boolean)
+    # the solution was found on the corridor of the substrate
+    corridor = Column(Boolean)
+    status = Column(String)
+    gap = Column(Float)
+
+    variables = Column(Integer)
+    constraints = Column(Integer)
+    # branch and bound nodes
+    nodes = Column(Integer)
+    # as reported by the solver
+    solving_time = Column(Float)
+    presolving_time = Column(Float)
+
+    # python side phases, in seconds
+    dump_time = Column(Float)
+    reduce_time = Column(Float)
+    write_time = Column(Float)
+    solver_time = Column(Float)
+    parse_time = Column(Float)
+    flush_time = Column(Float)
+    total_time = Column(Float)
+
+
+@contextmanager
+def timed(stats, phase):
+    '''
+    add the time spent in the block to stats[phase], does nothing if stats is None
+    '''
+    start = time.time()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats[phase] = stats.get(phase, 0.0) + time.time() - start
+
+
+def set_experiment(name):
+    '''
+    :param name: the experiment the next solves belong to
+    '''
+    global experiment
+    experiment = name
+
+
+def enable_solve_stats(path):
+    '''
+    also append the solve stats to a file, as json lines, so that they outlive the database of the experiment
+    :param path: the file, see read_solve_stats
+    '''
+    global stats_file
+    stats_file = path
+
+
+def record_solve(stats, service=None, mapping=None):
+    '''
+    store the stats of a solve
+    :param stats: the dict filled during the solve, see STATS_COLUMNS
+    :param service: the service that was solved
+    :param mapping: the mapping that was found, if any
+    :return: the stored row, as a dict
+    '''
+    row = dict([(column, stats.get(column)) for column in STATS_COLUMNS])
+    row["experiment"] = experiment
+    row["service_id"] = service.id if service is not None else None
+    row["mapping_id"] = mapping.id if mapping is not None else None
+    row["sla_id"] = service.slas[0].id if service is not None and len(service.slas) > 0 else None
+    row["vhg_count"] = service.vhg_count if service is not None else None
+    row["vcdn_count"] = service.vcdn_count if service is not None else None
+
+    Session().execute(SolveStats.__table__.insert(), [row])
+    if stats_file is not None:
+        with open(stats_file, "a") as f:
+            f.write(json.dumps(row) + "\n")
+    return row
+
+
+def query_solve_stats():
+    '''
+    :return: the stats stored in the database, as dicts
+    '''
+    columns = SolveStats.__table__.columns.keys()
+    return [dict(zip(columns, row)) for row in Session().execute(SolveStats.__table__.select())]
+
+
+def read_solve_stats(path):
+    '''
+    :return: the stats appended to the file, as dicts
+    '''
+    with open(path) as f:
+        return [json.loads(line) for line in f if len(line.strip()) > 0]
+
+
+def aggregate(rows, by=("experiment", "vhg_count", "vcdn_count")):
+    '''
+    :param rows: solve stats, as dicts
+    :param by: the columns the rows are grouped by
+    :return: a list of dicts, one per group, sorted by decreasing total solver time
+    '''
+    groups = collections.OrderedDict()
+    for row in rows:
+        groups.setdefault(tuple([row.get(column) for column in by]), []).append(row)
+
+    def mean(values):
+        values = [value for value in values if value is not None]
+        return sum(values) / len(values) if len(values) > 0 else None
+
+    res = []
+    for key, group in list(groups.items()):
+        solver_times = [row.get("solver_time") or 0.0 for row in group]
+        line = dict(zip(by, key))
+        line.update({"solves": len(group),
+                     "cached": len([row for row in group if row.get("cached")]),
+                     "unsolved": len([row for row in group if row.get("status") not in ("optimal", "gaplimit")]),
+                     "total_solver_time": sum(solver_times),
+                     "max_solver_time": max(solver_times),
+                     "mean_variables": mean([row.get("variables") for row in group]),
+                     "mean_constraints": mean([row.get("constraints") for row in group]),
+                     "mean_nodes": mean([row.get("nodes") for row in group]),
+                     "mean_gap": mean([row.get("gap") for row in group]),
+                     "total_time": sum([row.get("total_time") or 0.0 for row in group]),
+                     "python_time": sum([sum([row.get(phase) or 0.0 for phase in
+                                              ["dump_time", "reduce_time", "write_time", "parse_time",
+                                               "flush_time"]]) for row in group])})
+        res.append(line)
+    return sorted(res, key=lambda line: -line["total_solver_time"])
+
+
+def format_report(rows, by=("experiment", "vhg_count", "vcdn_count")):
+    '''
+    :return: the aggregated stats as a tab separated table
+    '''
+    columns = list(by) + ["solves", "cached", "unsolved", "total_solver_time", "max_solver_time", "python_time",
+                          "total_time", "mean_variables", "mean_constraints", "mean_nodes", "mean_gap"]
+
+    def cell(value):
+        if isinstance(value, float):
+            return "%.3f" % value
+        return "-" if value is None else str(value)
+
+    lines = ["\t".join(columns)]
+    for line in aggregate(rows, by):
+        lines.append("\t".join([cell(line[column]) for column in columns]))
+    return "\n".join(lines)
+
+
+def log_report(rows, by=("experiment", "vhg_count", "vcdn_count")):
+    logging.info("solve stats:\n%s" % format_report(rows, by))
@@ -1,12 +1,17 @@
+import logging
+import multiprocessing
 import os
 import re
-import subprocess
+import time
 
 from jinja2 import Environment, PackageLoader
-from sqlalchemy import or_, and_
-from sqlalchemy.orm.exc import NoResultFound
 
+from ..core.corridor import reduce_model
 from ..core.mapping import Mapping
+from ..core.model import write_model, read_model, render_model, get_model_postfix
+from ..core.scip_pool import create_pool, run_scip_process
+from ..core.solve_cache import SolveCache
+from ..core.solve_stats import timed, record_solve
 from ..time.persistence import Session, Edge, ServiceEdge, ServiceNode, NodeMapping, EdgeMapping, Node
 
 OPTIM_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../optim')
@@ -19,18 +24,67 @@ template_optim = env.get_template('optim.zpl.tpl')
 template_optim_slow = env.get_template('optim.zpl.tpl')
 template_optim_debug = env.get_template('batch-debug.sh')
 
+# "scip" renders optim.zpl.tpl and runs scip, "highs" builds the same model in memory, "paths" solves its path
+# formulation by column generation in memory
+SOLVER_BACKENDS = ("scip", "highs", "paths")
+IN_MEMORY_BACKENDS = ("highs", "paths")
+solver_backend = "scip"
 
-def solve_inplace(allow_violations=False, path=".", use_heuristic=True, reopt=False):
+# see enable_solve_cache
+solve_cache = None
+
+# see enable_scip_pool
+scip_pool = None
+
+# see set_solve_limits and set_solve_budget
+solve_time_limit = None
+solve_gap_limit = None
+solve_deadline = None
+# the time limit of a solve once the budget is exhausted, so that it can still return a first solution
+MIN_TIME_LIMIT = 1.0
+
+# see set_corridor_pruning
+corridor_paths = None
+
+
+def solve_inplace(allow_violations=False, path=".", use_heuristic=True, reopt=False, service=None, substrate=None,
+                  limits=(None, None), stats=None):
     '''
     __solve without rewriting intermedia files
+    :param service: the service being solved, its mapping rows are bulk inserted if provided
+    :param substrate: the substrate the service is solved on
+    :param limits: (time_limit, gap_limit), see get_solve_limits
+    :param stats: a dict filled with the telemetry of the solve, see solve_stats.STATS_COLUMNS
     :return: a mapping
     '''
+    with timed(stats, "solver_time"):
+        data = run_scip(allow_violations=allow_violations, path=path, use_heuristic=use_heuristic, reopt=reopt,
+                        limits=limits, stats=stats)
+    if data is None:
+        return None
+
+    with timed(stats, "parse_time"):
+        node_solutions, edge_solutions, objective_function, violations = parse_solution(data)
+        status, gap = parse_status(data)
+        if stats is not None:
+            stats.update(parse_scip_stats(data))
+    with timed(stats, "flush_time"):
+        return build_mapping(node_solutions, edge_solutions, objective_function, service=service,
+                             substrate=substrate, status=status, gap=gap)
+
+
+def run_scip(allow_violations=False, path=".", use_heuristic=True, reopt=False, limits=(None, None), stats=None):
+    '''
+    render optim.zpl in the folder of the model and run scip on it
+    :param limits: (time_limit, gap_limit), see get_solve_limits
+    :param stats: if provided, stats["cached"] tells whether the solution came from the solve cache
+    :return: the content of the solution file followed by the status of scip, or None if no solution was found
+    '''
     if use_heuristic:
         optim_template = template_optim
     else:
         optim_template = template_optim_slow
 
-    session = Session()
     if not os.path.exists(os.path.join(RESULTS_FOLDER, path)):
         os.makedirs(os.path.join(RESULTS_FOLDER, path))
 
@@ -43,109 +97,574 @@ def solve_inplace(allow_violations=False, path=".", use_heuristic=True, reopt=Fa
 
     os.chmod(os.path.join(RESULTS_FOLDER, path, "debug.sh"), 0o711)
 
-    violations = []
-    if not allow_violations:
-        if not reopt:  # run the optim without CDNs
-            #print "optimize"
-            subprocess.call(
-                ["scip", "-c", "read %s" % os.path.join(RESULTS_FOLDER, path, "optim.zpl"), "-c", "optimize ", "-c",
-                 "write solution %s" % (os.path.join(RESULTS_FOLDER, path, "solutions.data")), "-c", "q"],
-                stdout=open(os.devnull, 'wb')
-            )
-        else:  # run the optim with CDN using reoptim
-            #print "re-optimize"
-            subprocess.call(["scip", "-c", "read %s" % os.path.join(RESULTS_FOLDER, path, "optim.zpl"), "-c",
-                             "read %s" % os.path.join(RESULTS_FOLDER, path, "solutions.data sol"), "-c",
-                             "set reoptimization enable true", "-c", "optimize ", "-c",
-                             "write solution %s" % (os.path.join(RESULTS_FOLDER, path, "solutions.data")), "-c", "q"],
-                            stdout=open(os.devnull, 'wb')
-                            )
+    if solve_cache is None:
+        data = call_scip(allow_violations=allow_violations, path=path, reopt=reopt, limits=limits)
+    else:
+        tables = read_model(os.path.join(RESULTS_FOLDER, path)) + read_pricing_tables()
+        postfix = get_model_postfix(tables)
+        # a reoptimization depends on the solution it starts from
+        warm_start = save_warm_start(path) if reopt and not allow_violations else None
+        # the time limit is not part of the key since solutions stopped by it are not cached
+        key = solve_cache.key(tables, postfix, "scip", optim_template.filename, reopt, allow_violations, limits[1],
+                              warm_start)
+        hit, data = solve_cache.get(key, postfix)
+        if stats is not None:
+            stats["cached"] = hit
+        if hit:
+            # keep the solution file, it is the starting point of a later reoptimization
+            with open(os.path.join(RESULTS_FOLDER, path, "solutions.data"), "w") as sol:
+                sol.write(data)
+        else:
+            data = call_scip(allow_violations=allow_violations, path=path, reopt=reopt, limits=limits)
+            if parse_status(data)[0] != "timelimit":
+                solve_cache.put(key, postfix, data)
+
+    if "infeasible" in data or "no solution" in data:
+        return None
+    return data
+
+
+def call_scip(allow_violations=False, path=".", reopt=False, limits=(None, None)):
+    '''
+    run scip on the optim.zpl of the folder, on a worker of the scip pool if it is enabled
+    :param limits: (time_limit, gap_limit), see get_solve_limits
+    :return: the content of the solution file, followed by the lines of the output of scip about its status, gap and
+    statistics
+    '''
+    time_limit, gap_limit = limits
+    solution_file = os.path.join(RESULTS_FOLDER, path, "solutions.data")
+    commands = ["read %s" % os.path.join(RESULTS_FOLDER, path, "optim.zpl")]
+    if not allow_violations and reopt:  # run the optim with CDN using reoptim
+        commands += ["read %s sol" % solution_file, "set reoptimization enable true"]
+    if time_limit is not None:
+        commands += ["set limits time %f" % time_limit]
+    if gap_limit is not None:
+        commands += ["set limits gap %f" % gap_limit]
+    commands += ["optimize "]
 
+    if scip_pool is not None:
+        output = scip_pool.run(commands, solution_file)
     else:
-        subprocess.call(
-            ["scip", "-c", "read %s" % os.path.join(RESULTS_FOLDER, path, "optim.zpl"), "-c", "optimize ", "-c",
-             "write solution %s" % (os.path.join(RESULTS_FOLDER, path, "solutions.data")), "-c", "q"],
-            stdout=open(os.devnull, 'wb')
-        )
+        output = run_scip_process(commands, solution_file)
+
     # plotting.plotsol()
     # os.subprocess.call(["cat", "./substrate.dot", "|", "dot", "-Tpdf", "-osol.pdf"])
-    with open(os.path.join(RESULTS_FOLDER, path, "solutions.data"), "r") as sol:
+    with open(solution_file, "r") as sol:
         data = sol.read()
-        if "infeasible" in data or "no solution" in data:
-            return None
-
-        data = data.split("\n")
-        nodesSols = []
-        edgesSol = []
-        objective_function = None
-        for line in data:
-
-            # search node
-            matches = re.findall("^x\$(.*)\$([^ \t]+) +([^ \t]+)", line)
-            if (len(matches) > 0):
-                try:
-                    node = session.query(Node).filter(Node.name == matches[0][0]).one()
-                    snode_id, service_id, sla_id = matches[0][1].split("_")
-                    value = matches[0][2]
-                    service_node_id = session.query("ServiceNode.id").filter(
-                        and_(ServiceNode.sla_id == sla_id, ServiceNode.service_id == service_id,
-                             ServiceNode.name == snode_id)).one()[0]
-                    nodeMapping = NodeMapping(node_id=node.id, service_node_id=service_node_id, service_id=service_id,
-                                              sla_id=sla_id)
-                    nodesSols.append(nodeMapping)
-
-                    continue
-                except NoResultFound as e:
-                    print(e)
-
-            # search edge
-            matches = re.findall("^y\$(.*)\$(.*)\$(.*)\$([^ \t]+) +([^ \t]+)", line)
-            if (len(matches) > 0):
-                node_1, node_2, snode_1, snode_2, value = matches[0]
-                snode_1, service_id, sla_id = snode_1.split("_")
-                snode_2, service_id, sla_id = snode_2.split("_")
-
-                node_1 = session.query(Node).filter(Node.name == node_1).one()
-                node_2 = session.query(Node).filter(Node.name == node_2).one()
-
-                edge = session.query(Edge).filter(or_(and_(Edge.node_1 == node_1, Edge.node_2 == node_2),
-                                                      and_(Edge.node_1 == node_2, Edge.node_2 == node_1))).one()
-                snode_1 = session.query(ServiceNode).filter(
-                    and_(ServiceNode.sla_id == sla_id, ServiceNode.service_id == service_id,
-                         ServiceNode.name == snode_1)).one()
-                snode_2 = session.query(ServiceNode).filter(
-                    and_(ServiceNode.sla_id == sla_id, ServiceNode.service_id == service_id,
-                         ServiceNode.name == snode_2)).one()
-                sedge_id = session.query(ServiceEdge.id).filter(
-                    and_(ServiceEdge.node_1_id == snode_1.id, ServiceEdge.node_2_id == snode_2.id,
-                         ServiceEdge.service_id == service_id, ServiceEdge.sla_id == sla_id)).one()[0]
-
-                edgeMapping = EdgeMapping(edge_id=edge.id, serviceEdge_id=sedge_id)
-                edgesSol.append(edgeMapping)
-
-            matches = re.findall("^objective value: *([0-9\.]*)$", line)
-            if (len(matches) > 0):
-                objective_function = float(matches[0])
+    return data + "".join(["%s\n" % line.strip() for line in output.split("\n") if
+                           any([pattern.search(line) is not None for pattern in OUTPUT_PATTERNS])])
+
+
+NODE_PATTERN = re.compile(r"^x\$(.*)\$([^ \t]+) +([^ \t]+)")
+EDGE_PATTERN = re.compile(r"^y\$(.*)\$(.*)\$(.*)\$([^ \t]+) +([^ \t]+)")
+OBJECTIVE_PATTERN = re.compile(r"^objective value: *([0-9\.]*)$")
+VIOLATION_PATTERN = re.compile("^(.*)_master")
+STATUS_PATTERN = re.compile(r"SCIP Status *: .*\[(.*)\]")
+GAP_PATTERN = re.compile(r"^Gap *: *([0-9\.]+|infinite) %")
+SCIP_STATS_PATTERNS = {
+    "variables": re.compile("original problem has ([0-9]+) variables"),
+    "constraints": re.compile("original problem has .* and ([0-9]+) constraints"),
+    "presolving_time": re.compile(r"^Presolving Time *: *([0-9\.]+)"),
+    "solving_time": re.compile(r"^Solving Time \(sec\) *: *([0-9\.]+)"),
+    "nodes": re.compile("^Solving Nodes *: *([0-9]+)"),
+}
+# the lines of the output of scip kept with the solution
+OUTPUT_PATTERNS = [STATUS_PATTERN, GAP_PATTERN] + list(SCIP_STATS_PATTERNS.values())
+
+# the reasons scip stops, as reported in the SCIP Status line
+SCIP_STATUSES = {"optimal solution found": "optimal", "gap limit reached": "gaplimit",
+                 "time limit reached": "timelimit", "infeasible": "infeasible"}
+
+
+def parse_solution(data):
+    '''
+    parse a scip solution file
+    :param data: the content of solutions.data
+    :return: node_solutions, edge_solutions, objective_function, violations
+    '''
+    node_solutions = []
+    edge_solutions = []
+    objective_function = None
+    violations = []
+    for line in data.split("\n"):
+        if line.startswith("x$"):
+            match = NODE_PATTERN.match(line)
+            if match is not None:
+                node_solutions.append((match.group(1), match.group(2)))
+                continue
+
+        elif line.startswith("y$"):
+            match = EDGE_PATTERN.match(line)
+            if match is not None:
+                edge_solutions.append(match.groups()[:4])
                 continue
 
-            matches = re.findall("^(.*)_master", line)
-            if (len(matches) > 0):
-                violations.append(matches[0])
+        elif line.startswith("objective value:"):
+            match = OBJECTIVE_PATTERN.match(line)
+            if match is not None:
+                objective_function = float(match.group(1))
                 continue
 
-        mapping = Mapping(node_mappings=nodesSols, edge_mappings=edgesSol, objective_function=objective_function)
-        return mapping
+        match = VIOLATION_PATTERN.match(line)
+        if match is not None:
+            violations.append(match.group(1))
+
+    return node_solutions, edge_solutions, objective_function, violations
+
+
+def parse_status(data):
+    '''
+    :param data: the solution returned by call_scip
+    :return: status, gap. status is one of optimal, gaplimit, timelimit, infeasible or the raw scip status, gap is
+    relative. Both are None if scip did not report them.
+    '''
+    status = None
+    gap = None
+    for line in data.split("\n"):
+        match = STATUS_PATTERN.search(line)
+        if match is not None:
+            status = SCIP_STATUSES.get(match.group(1), match.group(1))
+            continue
+        match = GAP_PATTERN.search(line)
+        if match is not None and match.group(1) != "infinite":
+            gap = float(match.group(1)) / 100
+    return status, gap
+
+
+def parse_scip_stats(data):
+    '''
+    :param data: the solution returned by call_scip
+    :return: a dict of the statistics reported by scip (see SCIP_STATS_PATTERNS), the missing ones are left out
+    '''
+    stats = {}
+    for line in data.split("\n"):
+        for name, pattern in list(SCIP_STATS_PATTERNS.items()):
+            match = pattern.search(line)
+            if match is not None:
+                stats[name] = float(match.group(1)) if "time" in name else int(match.group(1))
+    return stats
+
+
+class SolutionIndex:
+    '''
+    name to id lookup tables needed to turn solver variables into mappings, loaded once per solve
+    '''
+
+    def __init__(self, service_ids, substrate=None):
+        session = Session()
+        if substrate is not None:
+            self.nodes = {node.name: node.id for node in substrate.nodes}
+            edges = [(edge.id, edge.node_1_id, edge.node_2_id) for edge in substrate.edges]
+        else:
+            self.nodes = {name: id for name, id in session.query(Node.name, Node.id)}
+            edges = session.query(Edge.id, Edge.node_1_id, Edge.node_2_id).all()
 
+        # both orientations
+        self.edges = {}
+        for id, node_1_id, node_2_id in edges:
+            self.edges[(node_1_id, node_2_id)] = id
+            self.edges[(node_2_id, node_1_id)] = id
 
-def solve(service, substrate, path, use_heuristic=True, reopt=False):
+        self.service_nodes = {}
+        self.service_edges = {}
+        if len(service_ids) > 0:
+            self.service_nodes = {(sla_id, service_id, name): id for id, name, service_id, sla_id in
+                                  session.query(ServiceNode.id, ServiceNode.name, ServiceNode.service_id,
+                                                ServiceNode.sla_id).filter(ServiceNode.service_id.in_(service_ids))}
+            self.service_edges = {(node_1_id, node_2_id): id for id, node_1_id, node_2_id in
+                                  session.query(ServiceEdge.id, ServiceEdge.node_1_id, ServiceEdge.node_2_id).filter(
+                                      ServiceEdge.service_id.in_(service_ids))}
+
+    def get_service_node_id(self, service_node_name):
+        '''
+        :param service_node_name: "VHG1_12_3"
+        :return: the id of the service node, or None
+        '''
+        name, service_id, sla_id = service_node_name.split("_")
+        return self.service_nodes.get((int(sla_id), int(service_id), name))
+
+
+def build_mapping(node_solutions, edge_solutions, objective_function, service=None, substrate=None, status=None,
+                  gap=None):
+    '''
+    create the mapping from the names of the variables selected by the solver
+    :param node_solutions: [("0101","VHG1_12_3")]
+    :param edge_solutions: [("0101","0102","S1_12_3","VHG1_12_3")]
+    :param objective_function: the value of the objective function
+    :param service: if provided, the mapping is flushed for this service and its rows are bulk inserted
+    :param substrate: the substrate the mapping is computed on
+    :param status: how the solver stopped, see parse_status
+    :param gap: the relative gap of the solution
+    :return: a mapping
+    '''
     session = Session()
-    service.write(path)
-    substrate.write(path)
+    service_ids = set([int(service_node_name.split("_")[1]) for node_name, service_node_name in node_solutions])
+    index = SolutionIndex(service_ids, substrate)
+
+    node_rows = []
+    for node_name, service_node_name in node_solutions:
+        node_id = index.nodes.get(node_name)
+        service_node_id = index.get_service_node_id(service_node_name)
+        if node_id is None or service_node_id is None:
+            logging.warning("no node mapping for %s on %s" % (service_node_name, node_name))
+            continue
+        snode_id, service_id, sla_id = service_node_name.split("_")
+        node_rows.append({"node_id": node_id, "service_node_id": service_node_id, "service_id": int(service_id),
+                          "sla_id": int(sla_id)})
+
+    edge_rows = []
+    for node_1, node_2, snode_1, snode_2 in edge_solutions:
+        edge_id = index.edges[(index.nodes[node_1], index.nodes[node_2])]
+        sedge_id = index.service_edges[(index.get_service_node_id(snode_1), index.get_service_node_id(snode_2))]
+        edge_rows.append({"edge_id": edge_id, "serviceEdge_id": sedge_id})
+
+    if service is None:
+        return Mapping(node_mappings=[NodeMapping(**row) for row in node_rows],
+                       edge_mappings=[EdgeMapping(**row) for row in edge_rows], objective_function=objective_function,
+                       status=status, gap=gap)
+
+    mapping = Mapping(node_mappings=[], edge_mappings=[], objective_function=objective_function, status=status,
+                      gap=gap)
+    mapping.service_id = service.id
+    if substrate is not None:
+        mapping.substrate_id = substrate.id
+    session.add(mapping)
     session.flush()
-    mapping = solve_inplace(path=path, use_heuristic=use_heuristic, reopt=reopt)
+
+    for row in node_rows + edge_rows:
+        row["mapping_id"] = mapping.id
+    if len(node_rows) > 0:
+        session.execute(NodeMapping.__table__.insert(), node_rows)
+    if len(edge_rows) > 0:
+        session.execute(EdgeMapping.__table__.insert(), edge_rows)
+
+    # node_mappings and edge_mappings will be loaded from the rows we just inserted
+    session.expire(mapping, ["node_mappings", "edge_mappings"])
+    return mapping
+
+
+def enable_solve_cache(folder=os.path.join(RESULTS_FOLDER, "solve_cache"), max_entries=10000):
+    '''
+    reuse the solutions of models that have already been solved, stored in folder
+    :param folder: the folder of the persistent cache, shared between runs
+    :param max_entries: the maximum number of solutions kept in the cache
+    :return: the cache
+    '''
+    global solve_cache
+    solve_cache = SolveCache(folder, max_entries=max_entries)
+    return solve_cache
+
+
+def enable_scip_pool(size):
+    '''
+    run scip in long-lived sessions instead of starting a process for every model
+    :param size: the maximum number of scip sessions running at the same time in a process
+    :return: the pool
+    '''
+    global scip_pool
+    scip_pool = create_pool(size)
+    return scip_pool
+
+
+def read_pricing_tables(pricing_dir=PRICING_FOLDER):
+    '''
+    :return: the content of the pricing files read by the model, as a list of (file name, content)
+    '''
+    res = []
+    for file in [os.path.join("vmg", "pricing_for_one_instance.properties"),
+                 os.path.join("cdn", "pricing_for_one_instance.properties"),
+                 "net.cost.data"]:
+        with open(os.path.join(pricing_dir, file)) as f:
+            res.append(("pricing/%s" % file, f.read()))
+    return res
+
+
+def set_solver_backend(backend):
+    '''
+    select the solver used by solve()
+    :param backend: one of SOLVER_BACKENDS
+    '''
+    global solver_backend
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError("not a valid solver backend %s, use one of %s" % (backend, ", ".join(SOLVER_BACKENDS)))
+    solver_backend = backend
+
+
+def set_corridor_pruning(k_paths):
+    '''
+    solve the models on the corridor of the substrate first (see corridor.get_corridor), and on the full substrate
+    only if no solution is found in the corridor
+    :param k_paths: the number of shortest paths kept between a starter and a CDN candidate, None to disable pruning
+    '''
+    global corridor_paths
+    corridor_paths = k_paths
+
+
+def save_warm_start(path):
+    '''
+    :return: the solution file of the folder, the starting point of a reoptimization, None if there is none
+    '''
+    solution_file = os.path.join(RESULTS_FOLDER, path, "solutions.data")
+    if not os.path.exists(solution_file):
+        return None
+    with open(solution_file) as f:
+        return f.read()
+
+
+def restore_warm_start(path, data):
+    '''
+    put back the solution file saved by save_warm_start, a failed corridor solve overwrites it with no solution
+    '''
+    solution_file = os.path.join(RESULTS_FOLDER, path, "solutions.data")
+    if data is None:
+        if os.path.exists(solution_file):
+            os.remove(solution_file)
+    else:
+        with open(solution_file, "w") as f:
+            f.write(data)
+
+
+def reduce_job_model(model):
+    '''
+    :return: the model restricted to its corridor, or None if corridor pruning is disabled or useless
+    '''
+    if corridor_paths is None:
+        return None
+    reduced = reduce_model(model, corridor_paths)
+    if reduced is model:
+        return None
+    return reduced
+
+
+def set_solve_limits(time_limit=None, gap_limit=None):
+    '''
+    set the limits of every solve, the best solution found when a limit is reached is used
+    :param time_limit: the maximum duration of a solve in seconds, None for no limit
+    :param gap_limit: the relative gap at which a solve stops, None to solve to optimality
+    '''
+    global solve_time_limit, solve_gap_limit
+    solve_time_limit = time_limit
+    solve_gap_limit = gap_limit
+
+
+def set_solve_budget(seconds):
+    '''
+    bound the total solving time from now on, every solve is given at most the remaining time
+    :param seconds: the budget, None to remove it
+    '''
+    global solve_deadline
+    solve_deadline = None if seconds is None else time.time() + seconds
+
+
+def get_solve_limits(time_limit=None, gap_limit=None):
+    '''
+    :param time_limit: the time limit of this solve, the global one is used if None
+    :param gap_limit: the gap limit of this solve, the global one is used if None
+    :return: (time_limit, gap_limit) of a solve starting now
+    '''
+    if time_limit is None:
+        time_limit = solve_time_limit
+    if gap_limit is None:
+        gap_limit = solve_gap_limit
+    if solve_deadline is not None:
+        remaining = max(solve_deadline - time.time(), MIN_TIME_LIMIT)
+        time_limit = remaining if time_limit is None else min(time_limit, remaining)
+    return time_limit, gap_limit
+
+
+def dump_model(service, substrate):
+    '''
+    :return: the whole embedding model of the service on the substrate, as plain data
+    '''
+    model = dict(service.dump_model())
+    model.update(substrate.dump_model())
+    return model
+
+
+def solve_model(job, stats=None):
+    '''
+    solve a model given as plain data, without any access to the database, so that it can run in another process.
+    If corridor pruning is enabled, the model is solved on its corridor first.
+    :param job: (model, path, use_heuristic, reopt, backend, limits), path being the working directory of this model
+    and limits its (time_limit, gap_limit)
+    :param stats: a dict filled with the telemetry of the solve, see solve_stats.STATS_COLUMNS
+    :return: (objective_function, node_solutions, edge_solutions, status, gap) or None if no solution was found
+    '''
+    if stats is not None:
+        stats.update({"backend": job[4], "reopt": job[3], "corridor": False})
+    with timed(stats, "reduce_time"):
+        reduced = reduce_job_model(job[0])
+    if reduced is not None:
+        # scip reoptimizes from the solution file of the folder
+        warm = job[3] and job[4] not in IN_MEMORY_BACKENDS
+        warm_start = save_warm_start(job[1]) if warm else None
+        solution = solve_job((reduced,) + tuple(job[1:]), stats)
+        if solution is not None:
+            if stats is not None:
+                stats["corridor"] = True
+            return solution
+        logging.debug("no solution in the corridor, solving the full model")
+        if warm:
+            restore_warm_start(job[1], warm_start)
+    return solve_job(job, stats)
+
+
+def solve_model_stats(job):
+    '''
+    :return: the solution of the job, see solve_model, and the telemetry of the solve
+    '''
+    stats = {}
+    start = None if solve_cache is None else solve_cache.counts()
+    with timed(stats, "total_time"):
+        solution = solve_model(job, stats)
+    if start is not None:
+        # the counters of a pool worker are lost with it, see solve_many
+        stats["cache_counts"] = tuple([count - previous for count, previous in zip(solve_cache.counts(), start)])
+    return solution, stats
+
+
+def solve_job(job, stats=None):
+    '''
+    solve the model of the job as is, see solve_model
+    '''
+    model, path, use_heuristic, reopt, backend, limits = job
+    time_limit, gap_limit = limits
+    if backend in IN_MEMORY_BACKENDS:
+        # scipy>=1.9 is only needed by these backends
+        if backend == "paths":
+            from ..core.colgen import solve_paths as solve_in_process
+        else:
+            from ..core.milp import solve_milp as solve_in_process
+        if solve_cache is None:
+            with timed(stats, "solver_time"):
+                solution = solve_in_process(model, pricing_dir=PRICING_FOLDER, time_limit=time_limit,
+                                            gap_limit=gap_limit, stats=stats)
+        else:
+            tables = render_model(model) + read_pricing_tables()
+            postfix = get_model_postfix(tables)
+            key = solve_cache.key(tables, postfix, backend, gap_limit)
+            hit, solution = solve_cache.get(key, postfix)
+            if stats is not None:
+                stats["cached"] = hit
+            if not hit:
+                with timed(stats, "solver_time"):
+                    solution = solve_in_process(model, pricing_dir=PRICING_FOLDER, time_limit=time_limit,
+                                                gap_limit=gap_limit, stats=stats)
+                if solution is None or solution[3] != "timelimit":
+                    solve_cache.put(key, postfix, solution)
+        if stats is not None and solution is not None:
+            stats.update({"status": solution[3], "gap": solution[4]})
+        return solution
+
+    with timed(stats, "write_time"):
+        write_model(model, os.path.join(RESULTS_FOLDER, path))
+    with timed(stats, "solver_time"):
+        data = run_scip(path=path, use_heuristic=use_heuristic, reopt=reopt, limits=limits, stats=stats)
+    if data is None:
+        return None
+    with timed(stats, "parse_time"):
+        node_solutions, edge_solutions, objective_function, violations = parse_solution(data)
+        status, gap = parse_status(data)
+        if stats is not None:
+            stats.update(parse_scip_stats(data))
+            stats.update({"status": status, "gap": gap})
+    return objective_function, node_solutions, edge_solutions, status, gap
+
+
+def solve_many(jobs, processes=1, stats=None):
+    '''
+    solve independent models, in a process pool if processes > 1
+    :param jobs: a list of jobs, see solve_model
+    :param stats: if provided, the telemetry of each solve is appended to this list, in the order of the jobs
+    :return: the list of solutions, in the order of the jobs
+    '''
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(processes, len(jobs)))
+        try:
+            results = pool.map(solve_model_stats, jobs)
+        finally:
+            pool.close()
+            pool.join()
+        if solve_cache is not None:
+            solve_cache.merge([job_stats["cache_counts"] for solution, job_stats in results])
+    else:
+        results = [solve_model_stats(job) for job in jobs]
+    if stats is not None:
+        stats.extend([job_stats for solution, job_stats in results])
+    return [solution for solution, job_stats in results]
+
+
+def solve_in_memory(service, substrate, limits=(None, None), backend="highs", stats=None):
+    '''
+    solve the embedding model without writing intermediate files, using HiGHS
+    :param limits: (time_limit, gap_limit), see get_solve_limits
+    :param backend: one of IN_MEMORY_BACKENDS
+    :param stats: a dict filled with the telemetry of the solve, see solve_stats.STATS_COLUMNS
+    :return: a mapping, or None if no solution was found
+    '''
+    with timed(stats, "dump_time"):
+        model = dump_model(service, substrate)
+    solution = solve_model((model, None, True, False, backend, limits), stats)
+    if solution is None:
+        return None
+    objective_function, node_solutions, edge_solutions, status, gap = solution
+    with timed(stats, "flush_time"):
+        return build_mapping(node_solutions, edge_solutions, objective_function, service=service,
+                             substrate=substrate, status=status, gap=gap)
+
+
+def solve(service, substrate, path, use_heuristic=True, reopt=False, backend=None, time_limit=None, gap_limit=None):
+    '''
+    solve the embedding of the service on the substrate, service.mapping is set to the best mapping found. The
+    telemetry of the solve is recorded, see solve_stats.SolveStats
+    :param time_limit: the time limit of this solve, see set_solve_limits
+    :param gap_limit: the gap limit of this solve, see set_solve_limits
+    '''
+    session = Session()
+    if backend is None:
+        backend = solver_backend
+    limits = get_solve_limits(time_limit, gap_limit)
+    stats = {"backend": backend, "reopt": reopt, "corridor": False}
+    start = time.time()
+
+    if backend in IN_MEMORY_BACKENDS:
+        session.flush()
+        mapping = solve_in_memory(service, substrate, limits, backend, stats)
+    else:
+        session.flush()
+        with timed(stats, "dump_time"):
+            model = dump_model(service, substrate)
+        mapping = None
+        with timed(stats, "reduce_time"):
+            reduced = reduce_job_model(model)
+        if reduced is not None:
+            warm_start = save_warm_start(path) if reopt else None
+            with timed(stats, "write_time"):
+                write_model(reduced, os.path.join(RESULTS_FOLDER, path))
+            mapping = solve_inplace(path=path, use_heuristic=use_heuristic, reopt=reopt, service=service,
+                                    substrate=substrate, limits=limits, stats=stats)
+            if mapping is None:
+                logging.debug("no solution in the corridor, solving the full model")
+                if reopt:
+                    restore_warm_start(path, warm_start)
+            else:
+                stats["corridor"] = True
+
+        if mapping is None:
+            with timed(stats, "write_time"):
+                write_model(model, os.path.join(RESULTS_FOLDER, path))
+            mapping = solve_inplace(path=path, use_heuristic=use_heuristic, reopt=reopt, service=service,
+                                    substrate=substrate, limits=limits, stats=stats)
 
     service.mapping = mapping
+    with timed(stats, "flush_time"):
+        if mapping is not None:
+            if mapping.status not in (None, "optimal"):
+                logging.info("mapping of service %d stopped on %s, gap %s" % (service.id, mapping.status, mapping.gap))
+            mapping.substrate = substrate
+            session.add(mapping)
+        session.flush()
     if mapping is not None:
-        mapping.substrate = substrate
-        session.add(mapping)
-    session.flush()
+        stats.update({"status": mapping.status, "gap": mapping.gap})
+    stats["total_time"] = time.time() - start
+    record_solve(stats, service=service, mapping=mapping)
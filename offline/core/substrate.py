@@ -1,6 +1,5 @@
 #!/usr/bin/env python
 
-import operator
 from itertools import tee
 
 import networkx as nx
@@ -8,7 +7,14 @@ import numpy.random
 from haversine import haversine
 from networkx.readwrite import json_graph
 from pygraphml import GraphMLParser
-
+from sqlalchemy import func
+
+from ..core import topology_prep
+from ..core.model import write_model
+from ..core.residual import ResidualState
+from ..core.synthetic import degree_replay, hierarchical_isp, random_geometric
+from ..core.topology_cache import load_topology
+from ..core.topology_prep import giant_component
 from ..time.persistence import *
 
 RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../results')
@@ -39,6 +45,60 @@ def isOK(node1, node2):
     return True
 
 
+def read_links(path):
+    '''
+    :param path: an operator .links file, each line links its first node to the other ones
+    :return: the (node_1, node_2) links of the file
+    '''
+    links = []
+    with open(path) as f:
+        for line in f.read().split("\n"):
+            nodes = line.strip().split(" ")
+            while len(nodes) >= 2:
+                root = nodes.pop(0)
+                for node in nodes:
+                    links.append((root, node))
+    return links
+
+
+def parse_links(path, prune=False):
+    '''
+    :param path: an operator .links file
+    :param prune: remove the degree 1 chains of the topology, see prune_chains
+    :return: the node names and the (node_1, node_2, bandwidth, delay) edges of its biggest connected subgraph, the
+    bandwidth growing with the degree of the nodes of the edge
+    '''
+    names, edges = giant_component(read_links(path), 10000000000, prune=prune)
+    return names, [(node_1, node_2, bandwidth, 2) for node_1, node_2, bandwidth in edges]
+
+
+def parse_pruned_links(path):
+    return parse_links(path, prune=True)
+
+
+def parse_graphml(path):
+    '''
+    :param path: a GraphML file with node coordinates and edge bandwidths
+    :return: the node names and the (node_1, node_2, bandwidth, delay) edges, the delay being the propagation delay
+    between the coordinates, the nodes without edges are left out
+    '''
+    parser = GraphMLParser()
+
+    g = parser.parse(path)
+    nodes_from_g = {str(n.id): n for n in g.nodes()}
+
+    edges = [(str(e.node1.id), str(e.node2.id), float(e.attributes()["d42"].value),
+              get_delay(nodes_from_g[str(e.node1.id)], nodes_from_g[str(e.node2.id)]))
+             for e in g.edges() if
+             "d42" in e.attributes()
+             and isOK(nodes_from_g[str(e.node1.id)], nodes_from_g[str(e.node2.id)])
+             ]
+
+    # filter out nodes for which we have edges
+    valid_nodes = set([e[0] for e in edges] + [e[1] for e in edges])
+    return [str(n.id) for n in g.nodes() if str(n.id) in valid_nodes], edges
+
+
 def pairwise(iterable):
     "s -> (s0,s1), (s1,s2), (s2, s3), ..."
     a, b = tee(iterable)
@@ -52,10 +112,38 @@ class Substrate(Base):
     nodes = relationship("Node", secondary=substrate_to_node, cascade="all")
     edges = relationship("Edge", secondary=substrate_to_edge, cascade="all")
 
+    def get_residual(self):
+        '''
+        :return: the residual capacities of the substrate, see ResidualState
+        '''
+        if getattr(self, "residual", None) is None:
+            self.residual = ResidualState(self.nodes, self.edges)
+        return self.residual
+
+    @property
+    def version(self):
+        '''
+        bumped each time a capacity or a delay of the substrate changes, caches built from it are valid as long as it
+        does not change
+        '''
+        return self.get_residual().version
+
+    def flush(self):
+        '''
+        write the residual capacities to the nodes and edges of the substrate, which is otherwise done when the session
+        flushes other changes
+        '''
+        self.get_residual().write_back()
+
+    def set_delay(self, edge, delay):
+        self.get_residual().set_delay(edge, delay)
+
     def get_nxgraph(self):
+        residual = self.get_residual()
         g = nx.Graph()
-        for edge in self.edges:
-            g.add_edge(edge.node_1.name, edge.node_2.name, attr_dict={"bandwidth": edge.bandwidth, "delay": edge.delay})
+        for (node_1, node_2), bandwidth, delay in zip(residual.ends, residual.bandwidth.tolist(),
+                                                      residual.delay.tolist()):
+            g.add_edge(node_1, node_2, attr_dict={"bandwidth": bandwidth, "delay": delay})
         return g
 
     def __str__(self):
@@ -63,10 +151,10 @@ class Substrate(Base):
         return "%e\t%e" % (self.get_edges_sum(), self.get_edges_sum())
 
     def get_edges_sum(self):
-        return sum([x.bandwidth for x in self.edges])
+        return float(self.get_residual().bandwidth.sum())
 
     def get_nodes_sum(self):
-        return sum([x.cpu for x in list(self.nodes.items())])
+        return float(self.get_residual().cpu.sum())
 
     def get_nodes_by_bw(self):
         return self.__get_graph().degree(weight="bandwidth")
@@ -81,16 +169,19 @@ class Substrate(Base):
         return sum([self.__get_graph().get_edge_data(node1, node2)["delay"] for node1, node2 in pairwise(alist)])
 
     def __get_graph(self):
-        if not hasattr(self, 'g'):
-            self.g = nx.Graph()
-            # it's silly to do that, as most of the underlying graph are nx.Graph objects...
-            for node in self.nodes:
-                self.g.add_node(node.name)
-
-            for edge in self.edges:
-                self.g.add_edge(edge.node_1.name, edge.node_2.name, bandwidth=edge.bandwidth, delay=edge.delay)
-
-        return self.g
+        '''
+        :return: the substrate as a nx.Graph with the residual bandwidth of its edges, built again once it changes
+        '''
+        residual = self.get_residual()
+        version, g = getattr(self, "g", (None, None))
+        if g is None or version != residual.version:
+            g = nx.Graph()
+            g.add_nodes_from(residual.names)
+            g.add_edges_from([(node_1, node_2, {"bandwidth": bandwidth, "delay": delay}) for
+                              (node_1, node_2), bandwidth, delay in
+                              zip(residual.ends, residual.bandwidth.tolist(), residual.delay.tolist())])
+            self.g = (residual.version, g)
+        return g
 
     def get_json(self):
         g = self.__get_graph()
@@ -109,24 +200,58 @@ class Substrate(Base):
         self.nodes = nodes
         self.edges_init = sorted(edges, key=lambda x: "%s%s" % (str(x.node_1), str(x.node_2)))
 
+    def dump_model(self):
+        '''
+        :return: the substrate part of the embedding model, as a dict of tables indexed by data file name, dumped again
+        only once the residual capacities change
+        '''
+        residual = self.get_residual()
+        version, model = getattr(self, "model_cache", (None, None))
+        if model is None or version != residual.version:
+            bandwidth = residual.bandwidth.tolist()
+            delay = residual.delay.tolist()
+            cpu = residual.cpu.tolist()
+            model = {
+                "substrate.edges": [residual.ends[j] + (bandwidth[j], delay[j]) for j in residual.edge_order],
+                "substrate.nodes": [(residual.names[i], cpu[i]) for i in residual.node_order]}
+            self.model_cache = (residual.version, model)
+        return dict(model)
+
     def write(self, path="."):
 
         assert path != "."
 
-        if not os.path.exists(os.path.join(RESULTS_FOLDER, path)):
-            os.makedirs(os.path.join(RESULTS_FOLDER, path))
-
-        edges_file = os.path.join(RESULTS_FOLDER, path, "substrate.edges.data")
-        nodes_file = os.path.join(RESULTS_FOLDER, path, "substrate.nodes.data")
-        edges = self.edges
-        nodesdict = self.nodes
-        with open(edges_file, 'w') as f:
-            for edge in sorted(self.edges, key=lambda x: x.node_1.name):
-                f.write("%s\n" % edge)
+        write_model(self.dump_model(), os.path.join(RESULTS_FOLDER, path))
 
-        with open(nodes_file, 'w') as f:
-            for node in sorted(self.nodes, key=lambda x: x.name):
-                f.write("%s\n" % node)
+    @classmethod
+    def bulk_create(cls, nodes, edges):
+        '''
+        create the nodes and the edges of a substrate with one insert statement each, in a single transaction, and
+        load them back in the session
+        :param nodes: a list of (name, cpu)
+        :param edges: a list of (node_1 name, node_2 name, bandwidth, delay)
+        :return: the substrate
+        '''
+        session = Session()
+        with session.begin(subtransactions=True):
+            first_node = (session.query(func.max(Node.id)).scalar() or 0) + 1
+            first_edge = (session.query(func.max(Edge.id)).scalar() or 0) + 1
+
+            if len(nodes) > 0:
+                session.execute(Node.__table__.insert(),
+                                [{"name": str(name), "cpu_capacity": cpu} for name, cpu in nodes])
+            ids = dict(session.query(Node.name, Node.id).filter(Node.id >= first_node))
+
+            if len(edges) > 0:
+                session.execute(Edge.__table__.insert(),
+                                [{"node_1_id": ids[str(node_1)], "node_2_id": ids[str(node_2)], "bandwidth": bandwidth,
+                                  "delay": delay} for node_1, node_2, bandwidth, delay in edges])
+
+        # loaded once the transaction is committed, since committing expires the objects of the session. The session
+        # may still hold objects of a dropped database with the same ids, they are overwritten
+        nodes = session.query(Node).populate_existing().filter(Node.id >= first_node).order_by(Node.id).all()
+        edges = session.query(Edge).populate_existing().filter(Edge.id >= first_edge).order_by(Edge.id).all()
+        return cls(edges, nodes)
 
     @classmethod
     def __fromSpec(cls, args):
@@ -147,6 +272,12 @@ class Substrate(Base):
             return cls.fromPowerLaw(list(specs[1]))
         elif specs[0] == "erdos_renyi":
             return cls.FromErdosRenyi(list(specs[1]))
+        elif specs[0] == "isp":
+            return cls.fromIsp(list(specs[1]))
+        elif specs[0] == "geometric":
+            return cls.fromGeometric(list(specs[1]))
+        elif specs[0] == "replay":
+            return cls.fromDegreeReplay(list(specs[1]))
         else:
             raise ValueError("not a valid topology spec %s" % str(specs))
 
@@ -158,45 +289,13 @@ class Substrate(Base):
 
     @classmethod
     def fromLinks(cls, specs):
+        '''
+        :param specs: the name of the operator, then optionally "prune" to remove its degree 1 chains
+        '''
         name = specs[0]
-        g = nx.Graph()
-        # load all the links
-        with open(os.path.join(DATA_FOLDER, "links", "operator-%s.links" % name)) as f:
-            for line in f.read().split("\n"):
-                nodes = line.strip().split(" ")
-                while len(nodes) >= 2:
-                    root = nodes.pop(0)
-                    for node in nodes:
-                        g.add_edge(root, node)
-
-        # take the biggest connected subgraph
-        g = max(list({sg: len(sg.nodes()) for sg in nx.connected_component_subgraphs(g)}.items()),
-                key=operator.itemgetter(1))[0]
-
-        session = Session()
-        nodes = [Node(name=str(n), cpu_capacity=100) for n in g.nodes()]
-        nodesDict = {node.name: node for node in nodes}
-
-        session.add_all(nodes)
-        session.flush()
-
-        Session.begin()
-        edges = [Edge
-                 (node_1=nodesDict[e[0]],
-                  node_2=nodesDict[e[1]],
-                  bandwidth=g.degree(e[0]) * g.degree(e[1]) * 10000000000,
-                  delay=2
-                  )
-                 for e in g.edges()
-
-                 ]
-
-        session.add_all(edges)
-
-        Session.commit()
-        session.flush()
-
-        return cls(edges, nodes)
+        parse = parse_pruned_links if "prune" in specs[1:] else parse_links
+        topology = load_topology(os.path.join(DATA_FOLDER, "links", "operator-%s.links" % name), parse)
+        return cls.bulk_create([(n, 100) for n in topology.node_names()], topology.edges())
 
     @classmethod
     def fromPowerLaw(cls, specs):
@@ -210,26 +309,7 @@ class Substrate(Base):
         p = float(p)
         seed = int(seed)
         g = nx.powerlaw_cluster_graph(n, m, p, seed)
-        session = Session()
-        nodes = [Node(name=str(n), cpu_capacity=cpu) for n in g.nodes()]
-
-        session.add_all(nodes)
-        session.flush()
-
-        edges = [Edge
-                 (node_1=session.query(Node).filter(Node.name == str(e[0])).one(),
-                  node_2=session.query(Node).filter(Node.name == str(e[1])).one(),
-                  bandwidth=bw,
-                  delay=delay
-                  )
-                 for e in g.edges()
-
-                 ]
-        session.add_all(edges)
-        session.flush()
-
-        return cls(edges, nodes
-                   )
+        return cls.bulk_create([(n, cpu) for n in g.nodes()], [(e[0], e[1], bw, delay) for e in g.edges()])
 
     @classmethod
     def FromErdosRenyi(cls, specs):
@@ -242,103 +322,80 @@ class Substrate(Base):
         p = float(p)
         seed = int(seed)
         g = nx.erdos_renyi_graph(n, p, seed)
-        session = Session()
-        nodes = [Node(name=str(n), cpu_capacity=cpu) for n in g.nodes()]
+        return cls.bulk_create([(n, cpu) for n in g.nodes()], [(e[0], e[1], bw, delay) for e in g.edges()])
 
-        session.add_all(nodes)
-        session.flush()
+    @classmethod
+    def fromSynthetic(cls, topology, cpu):
+        '''
+        :param topology: a SyntheticTopology
+        :param cpu: the cpu of every node
+        :return: the substrate
+        '''
+        return cls.bulk_create([(name, cpu) for name in topology.names], topology.edges())
 
-        edges = [Edge
-                 (node_1=session.query(Node).filter(Node.name == str(e[0])).one(),
-                  node_2=session.query(Node).filter(Node.name == str(e[1])).one(),
-                  bandwidth=bw,
-                  delay=delay
-                  )
-                 for e in g.edges()
+    @classmethod
+    def fromIsp(cls, specs):
+        '''
+        :param specs: a tuple containing core_count, aggregation_count, access_count, seed, bw, delay, cpu, see
+        synthetic.hierarchical_isp
+        :return: the substrate
+        '''
+        core_count, aggregation_count, access_count, seed, bw, delay, cpu = specs
+        rs = numpy.random.RandomState(int(seed))
+        return cls.fromSynthetic(
+            hierarchical_isp(rs, int(core_count), int(aggregation_count), int(access_count), float(bw), float(delay)),
+            cpu)
 
-                 ]
-        session.add_all(edges)
-        session.flush()
+    @classmethod
+    def fromGeometric(cls, specs):
+        '''
+        :param specs: a tuple containing n, radius, seed, bw, cpu, see synthetic.random_geometric
+        :return: the substrate
+        '''
+        n, radius, seed, bw, cpu = specs
+        rs = numpy.random.RandomState(int(seed))
+        return cls.fromSynthetic(random_geometric(rs, int(n), float(radius), float(bw)), cpu)
 
-        return cls(edges, nodes)
+    @classmethod
+    def fromDegreeReplay(cls, specs):
+        '''
+        :param specs: a tuple containing the name of the operator whose degrees are replayed, n, seed, cpu. The
+        bandwidths and delays are those of fromLinks, see synthetic.degree_replay
+        :return: the substrate
+        '''
+        name, n, seed, cpu = specs
+        topology = load_topology(os.path.join(DATA_FOLDER, "links", "operator-%s.links" % name), parse_links)
+        degrees = topology_prep.degrees(len(topology.names), topology.sources(), topology.indices)
+        rs = numpy.random.RandomState(int(seed))
+        return cls.fromSynthetic(degree_replay(rs, degrees, int(n), 10000000000, 2), cpu)
 
     @classmethod
     def fromGrid(cls, width=5, height=5, bw=10 ** 10, delay=10, cpu=10):
         width = int(width)
         height = int(height)
-        session = Session()
         edges = []
         nodes = []
 
         for i in range(1, width + 1):
             for j in range(1, height + 1):
-                node = Node(name=str("%02d%02d" % (i, j)), cpu_capacity=cpu)
-                nodes.append(node)
-                session.add(node)
-                session.flush()
+                nodes.append(("%02d%02d" % (i, j), cpu))
 
         for i in range(1, width + 1):
             for j in range(1, height + 1):
-
                 if j + 1 <= height:
-                    edge = Edge(node_1=session.query(Node).filter(Node.name == "%02d%02d" % (i, j)).one(),
-                                node_2=session.query(Node).filter(Node.name == "%02d%02d" % (i, j + 1)).one(),
-                                bandwidth=bw, delay=delay)
-                    edges.append(edge)
+                    edges.append(("%02d%02d" % (i, j), "%02d%02d" % (i, j + 1), bw, delay))
                 if i + 1 <= width:
-                    edge = Edge(node_1=session.query(Node).filter(Node.name == "%02d%02d" % (i, j)).one(),
-                                node_2=session.query(Node).filter(Node.name == "%02d%02d" % (i + 1, j)).one(),
-                                bandwidth=bw, delay=delay)
-                    edges.append(edge)
+                    edges.append(("%02d%02d" % (i, j), "%02d%02d" % (i + 1, j), bw, delay))
                 if j + 1 <= height and i + 1 <= width:
-                    edge = Edge(node_1=session.query(Node).filter(Node.name == "%02d%02d" % (i, j)).one(),
-                                node_2=session.query(Node).filter(Node.name == "%02d%02d" % (i + 1, j + 1)).one(),
-                                bandwidth=bw,
-                                delay=delay)
-                    edges.append(edge)
-
-            for edge in edges:
-                session.add(edge)
-                session.flush()
+                    edges.append(("%02d%02d" % (i, j), "%02d%02d" % (i + 1, j + 1), bw, delay))
 
-        return cls(edges, nodes, )
+        return cls.bulk_create(nodes, edges)
 
     @classmethod
     def fromGraph(cls, rs, args):
-        session = Session()
         file, cpu = args
-        parser = GraphMLParser()
-
-        g = parser.parse(os.path.join(DATA_FOLDER, file))
-        nodes = [Node(name=str(n.id), cpu_capacity=cpu) for n in g.nodes()]
-        nodes_from_g = {str(n.id): n for n in g.nodes()}
-        session.add_all(nodes)
-        session.flush()
-
-        edges = [Edge
-                 (node_1=session.query(Node).filter(Node.name == str(e.node1.id)).one(),
-                  node_2=session.query(Node).filter(Node.name == str(e.node2.id)).one(),
-                  bandwidth=float(e.attributes()["d42"].value),
-                  delay=get_delay(nodes_from_g[str(e.node1.id)], nodes_from_g[str(e.node2.id)])
-                  )
-
-                 for e in g.edges() if
-                 "d42" in e.attributes()
-                 and isOK(nodes_from_g[str(e.node1.id)], nodes_from_g[str(e.node2.id)])
-                 ]
-        session.add_all(edges)
-        session.flush()
-
-        # filter out nodes for which we have edges
-        valid_nodes = list(set([e.node_1.name for e in edges] + [e.node_2.name for e in edges]))
-        nodes = list(set([n for n in nodes if str(n.name) in valid_nodes]))
-
-        session.add_all(nodes)
-        session.flush()
-        session.add_all(edges)
-        session.flush()
-
-        return cls(edges, nodes)
+        topology = load_topology(os.path.join(DATA_FOLDER, file), parse_graphml)
+        return cls.bulk_create([(n, cpu) for n in topology.node_names()], topology.edges())
 
     def release_service(self, service):
         self.__handle_service(service, +1)
@@ -347,18 +404,8 @@ class Substrate(Base):
         self.__handle_service(service, -1)
 
     def __handle_service(self, service, factor):
-        session = Session()
-        # print "consuming..."
-        for ns in service.mapping.node_mappings:
-            # get topo node
-            ns.node.cpu_capacity = ns.node.cpu_capacity + factor * ns.service_node.cpu
-
-
-            # print "\teater %lf flurom %s, remaining %s" % (service.nodes[ns[1]].cpu, ns[1], self)
-        for es in service.mapping.edge_mappings:
-            es.edge.bandwidth = es.edge.bandwidth + factor * es.serviceEdge.bandwidth
-
-        session.flush()
+        # the nodes and edges are updated when the session flushes, see ResidualState
+        self.get_residual().consume(service.mapping, factor)
 
     def deduce_bw(es, edges, service):
         candidate_edges = [x for x in edges if x[0] == es.start_topo_node_id and x[1] == es.end_topo_node_id]
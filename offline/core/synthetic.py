@@ -0,0 +1,144 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ..core.topology_prep import degree_bandwidth, largest_component, restrict
+
+# the mean radius of the earth in km, as used by haversine
+EARTH_RADIUS = 6371.0088
+
+# the propagation speed in km per ms, as used by substrate.get_delay
+LIGHT_SPEED = 299.300 * 0.6
+
+# where the nodes of the random geometric topologies are drawn, (min latitude, max latitude, min longitude, max
+# longitude) in degrees, about the size of Europe
+GEOMETRIC_AREA = (35.0, 60.0, -10.0, 30.0)
+
+
+class SyntheticTopology:
+    '''
+    an undirected topology generated as arrays: the node names and, for each edge, the index of its nodes, its
+    bandwidth and its delay
+    '''
+
+    def __init__(self, names, sources, targets, bandwidth, delay):
+        self.names = names
+        self.sources = sources
+        self.targets = targets
+        self.bandwidth = bandwidth
+        self.delay = delay
+
+    def edges(self):
+        '''
+        :return: a list of (node_1 name, node_2 name, bandwidth, delay)
+        '''
+        return [(self.names[i], self.names[j], bandwidth, delay) for i, j, bandwidth, delay in
+                zip(self.sources.tolist(), self.targets.tolist(), self.bandwidth.tolist(), self.delay.tolist())]
+
+    def largest_component(self):
+        '''
+        :return: the topology restricted to its biggest connected component
+        '''
+        mask = largest_component(len(self.names), self.sources, self.targets)
+        nodes, sources, targets = restrict(mask, self.sources, self.targets)
+        kept = mask[self.sources] & mask[self.targets]
+        return SyntheticTopology([self.names[i] for i in nodes.tolist()], sources, targets, self.bandwidth[kept],
+                                 self.delay[kept])
+
+
+def hierarchical_isp(rs, core_count, aggregation_count, access_count, bw, delay):
+    '''
+    a three tier isp: a full mesh of core nodes, aggregation nodes homed on two core nodes and access nodes on one
+    aggregation node. The bandwidth of a link is bw times the number of access nodes behind it, its delay shrinks
+    toward the access.
+    :param rs: the RandomState choosing the second core node of each aggregation node
+    :param core_count: the number of core nodes
+    :param aggregation_count: the number of aggregation nodes of each core node
+    :param access_count: the number of access nodes of each aggregation node
+    :return: a SyntheticTopology, with nodes named core<i>, agg<i> and acc<i>
+    '''
+    aggregations = core_count * aggregation_count
+    accesses = aggregations * access_count
+    names = ["core%d" % i for i in range(core_count)] + ["agg%d" % i for i in range(aggregations)] + \
+            ["acc%d" % i for i in range(accesses)]
+
+    core_1, core_2 = np.triu_indices(core_count, 1)
+
+    aggregation = np.arange(aggregations)
+    home = aggregation // aggregation_count
+    # a second core node, always different from the first one
+    second = (home + 1 + rs.randint(0, max(core_count - 1, 1), size=aggregations)) % core_count
+    homed = np.concatenate([aggregation, aggregation[second != home]])
+    cores = np.concatenate([home, second[second != home]])
+
+    access = np.arange(accesses)
+
+    sources = np.concatenate([core_1, cores, core_count + access // access_count]).astype(np.int64)
+    targets = np.concatenate([core_2, core_count + homed, core_count + aggregations + access]).astype(np.int64)
+    bandwidth = np.concatenate([np.full(len(core_1), float(bw) * accesses),
+                                np.full(len(cores), float(bw) * aggregation_count * access_count),
+                                np.full(accesses, float(bw))])
+    delay = np.concatenate([np.full(len(core_1), float(delay)), np.full(len(cores), float(delay) / 4),
+                            np.full(accesses, float(delay) / 10)])
+    return SyntheticTopology(names, sources, targets, bandwidth, delay)
+
+
+def haversine_delay(latitude_1, longitude_1, latitude_2, longitude_2):
+    '''
+    :return: the propagation delay in ms along the great circle between the points, whose coordinates are in degrees
+    '''
+    latitude_1, longitude_1, latitude_2, longitude_2 = [np.radians(a) for a in
+                                                        (latitude_1, longitude_1, latitude_2, longitude_2)]
+    h = np.sin((latitude_2 - latitude_1) / 2) ** 2 + \
+        np.cos(latitude_1) * np.cos(latitude_2) * np.sin((longitude_2 - longitude_1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(h)) / LIGHT_SPEED
+
+
+def random_geometric(rs, count, radius, bw, area=GEOMETRIC_AREA):
+    '''
+    nodes drawn uniformly on a part of the earth, linked when they are less than radius km apart, only the biggest
+    connected component is kept
+    :param rs: the RandomState drawing the nodes
+    :param radius: the length of the longest link in km
+    :return: a SyntheticTopology, the delay of a link being its propagation delay
+    '''
+    min_latitude, max_latitude, min_longitude, max_longitude = area
+    # uniform on the sphere, not in degrees
+    latitude = np.degrees(np.arcsin(rs.uniform(np.sin(np.radians(min_latitude)), np.sin(np.radians(max_latitude)),
+                                               size=count)))
+    longitude = rs.uniform(min_longitude, max_longitude, size=count)
+
+    # neighbours within the chord of radius, on the unit sphere
+    points = np.column_stack([np.cos(np.radians(latitude)) * np.cos(np.radians(longitude)),
+                              np.cos(np.radians(latitude)) * np.sin(np.radians(longitude)),
+                              np.sin(np.radians(latitude))])
+    chord = 2 * np.sin(float(radius) / EARTH_RADIUS / 2)
+    pairs = cKDTree(points).query_pairs(chord, output_type="ndarray")
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))].astype(np.int64)
+
+    sources, targets = pairs[:, 0], pairs[:, 1]
+    delay = haversine_delay(latitude[sources], longitude[sources], latitude[targets], longitude[targets])
+    return SyntheticTopology([str(i) for i in range(count)], sources, targets, np.full(len(sources), float(bw)),
+                             delay).largest_component()
+
+
+def degree_replay(rs, degrees, count, scale, delay):
+    '''
+    a configuration model whose degrees are drawn from those of an existing topology, self loops and parallel edges
+    are dropped and only the biggest connected component is kept
+    :param rs: the RandomState drawing the degrees and pairing the edge ends
+    :param degrees: the degrees to draw from
+    :param count: the number of nodes
+    :param scale: the bandwidth of an edge is the product of the degrees of its nodes times scale, see degree_bandwidth
+    :return: a SyntheticTopology
+    '''
+    ends = np.repeat(np.arange(count), rs.choice(degrees, size=count))
+    rs.shuffle(ends)
+    ends = ends[:len(ends) // 2 * 2].reshape(-1, 2)
+    low = ends.min(axis=1)
+    high = ends.max(axis=1)
+    keys = np.unique((low * count + high)[low != high])
+
+    topology = SyntheticTopology([str(i) for i in range(count)], keys // count, keys % count, np.zeros(len(keys)),
+                                 np.full(len(keys), float(delay))).largest_component()
+    topology.bandwidth = degree_bandwidth(len(topology.names), topology.sources, topology.targets, scale)
+    return topology
@@ -1,75 +1,129 @@
-from offline.core.service_topo import get_nodes_by_type
+from array import array
+from bisect import bisect_left, bisect_right
+
+import networkx as nx
+
+# the types of the service nodes, in the order of their codes, nodes of any other type come last
+NODE_TYPES = ("S", "VHG", "VCDN", "CDN")
+
+
+def type_code(type):
+    return NODE_TYPES.index(type) if type in NODE_TYPES else len(NODE_TYPES)
 
 
 class TopoInstance:
+    '''
+    a candidate service topology, converted once from the graph it is built from. Nodes are numbered by type then by
+    name, so that the nodes of a type are a slice of the node arrays, and edges are parallel arrays of node numbers.
+    '''
+    __slots__ = ("names", "types", "cpus", "bandwidths", "mappings", "order", "slices", "edge_starts", "edge_ends",
+                 "edge_bandwidths", "delay_paths", "delay_routes", "delay")
+
     def __init__(self, service, delay_path, delay_routes, delay):
-        self.servicetopo = service
+        '''
+        :param service: the service topology, a nx.DiGraph whose nodes have a type
+        '''
+        nodes = list(service.nodes(data=True))
+        ranked = sorted(range(len(nodes)), key=lambda i: (type_code(nodes[i][1].get("type")), nodes[i][0]))
+        number = dict([(nodes[i][0], n) for n, i in enumerate(ranked)])
+
+        self.names = tuple([nodes[i][0] for i in ranked])
+        self.types = array("b", [type_code(nodes[i][1].get("type")) for i in ranked])
+        self.cpus = array("d", [nodes[i][1].get("cpu", 0) for i in ranked])
+        self.bandwidths = array("d", [nodes[i][1].get("bandwidth", 0) for i in ranked])
+        self.mappings = tuple([nodes[i][1].get("mapping") for i in ranked])
+        # the node numbers in the order of the graph
+        self.order = array("i", [number[name] for name, data in nodes])
+        self.slices = tuple([slice(bisect_left(self.types, code), bisect_right(self.types, code))
+                             for code in range(len(NODE_TYPES) + 1)])
+
+        edges = list(service.edges(data=True))
+        self.edge_starts = array("i", [number[start] for start, end, data in edges])
+        self.edge_ends = array("i", [number[end] for start, end, data in edges])
+        self.edge_bandwidths = array("d", [data.get("bandwidth", 0) for start, end, data in edges])
+
         self.delay_paths = delay_path
         self.delay_routes = delay_routes
         self.delay = delay
 
+    @property
+    def servicetopo(self):
+        '''
+        :return: the service topology as a new nx.DiGraph
+        '''
+        graph = nx.DiGraph()
+        for i in self.order:
+            attributes = {"cpu": self.cpus[i], "bandwidth": self.bandwidths[i]}
+            if self.types[i] < len(NODE_TYPES):
+                attributes["type"] = NODE_TYPES[self.types[i]]
+            if self.mappings[i] is not None:
+                attributes["mapping"] = self.mappings[i]
+            graph.add_node(self.names[i], **attributes)
+        for start, end, bandwidth in zip(self.edge_starts, self.edge_ends, self.edge_bandwidths):
+            graph.add_edge(self.names[start], self.names[end], bandwidth=bandwidth)
+        return graph
+
     def compute_service_topo(self, substrate, mapped_start_nodes, mapped_cdn_nodes, vhg_count, vcdn_count, delay,
                              hint_node_mappings=None):
         raise NotImplementedError("Must override methodB")
 
+    def get_nodes(self, type):
+        '''
+        :param type: "VHG"
+        :return: ["VHG1","VHG2"]
+        '''
+        return list(self.names[self.slices[type_code(type)]])
+
     def get_vhg(self):
-        return get_nodes_by_type("VHG", self.servicetopo)
+        return self.get_nodes("VHG")
 
     def get_vcdn(self):
-        return get_nodes_by_type("VCDN", self.servicetopo)
+        return self.get_nodes("VCDN")
 
     def get_cdn(self):
-        return get_nodes_by_type("CDN", self.servicetopo)
+        return self.get_nodes("CDN")
 
     def get_Starters(self):
-        return [(s, self.servicetopo.node[s]["mapping"], self.servicetopo.node[s]["bandwidth"]) for s in
-                get_nodes_by_type("S", self.servicetopo)]
+        return [(self.names[i], self.mappings[i], self.bandwidths[i]) for i in
+                range(*self.slices[type_code("S")].indices(len(self.names)))]
 
     def get_CDN(self):
-        return [(s, self.servicetopo.node[s]["mapping"], self.servicetopo.node[s]["bandwidth"]) for s in
-                get_nodes_by_type("CDN", self.servicetopo)]
+        return [(self.names[i], self.mappings[i], self.bandwidths[i]) for i in
+                range(*self.slices[type_code("CDN")].indices(len(self.names)))]
 
     def getServiceNodes(self):
-        for node in self.servicetopo.nodes(data=True):
-            yield node[0], node[1].get("cpu", 0), node[1].get("bandwidth", 0)
+        for i in self.order:
+            yield self.names[i], self.cpus[i], self.bandwidths[i]
 
     def getServiceCDNNodes(self):
-        cdns = self.get_cdn()
-        for node in self.servicetopo.nodes(data=True):
-            if node[0] in cdns:
-                yield node[0], node[1].get("cpu", 0)
+        cdn = type_code("CDN")
+        for i in self.order:
+            if self.types[i] == cdn:
+                yield self.names[i], self.cpus[i]
 
     def dump_edges(self):
         '''
         :return: [(start , end , bandwidth)]
         '''
-        res = []
-        for start, ends in list(self.servicetopo.edge.items()):
-            for end in ends:
-                edge = self.servicetopo[start][end]
-                res.append((start, end, edge.get("bandwidth", 0)))
-        return res
+        return list(self.getServiceEdges())
 
     def getServiceCDNEdges(self):
         '''
 
         :return: start, end, edge["bandwidth"]
         '''
-        for start, ends in list(self.servicetopo.edge.items()):
-            cdns = self.get_cdn()
-            for end in [end for end in ends if end in cdns]:
-                edge = self.servicetopo[start][end]
-                yield start, end, edge.get("bandwidth", 0)
+        cdn = type_code("CDN")
+        for start, end, bandwidth in zip(self.edge_starts, self.edge_ends, self.edge_bandwidths):
+            if self.types[end] == cdn:
+                yield self.names[start], self.names[end], bandwidth
 
     def getServiceEdges(self):
         '''
 
         :return: start, end, edge["bandwidth"]
         '''
-        for start, ends in list(self.servicetopo.edge.items()):
-            for end in ends:
-                edge = self.servicetopo[start][end]
-                yield start, end, edge.get("bandwidth", 0)
+        for start, end, bandwidth in zip(self.edge_starts, self.edge_ends, self.edge_bandwidths):
+            yield self.names[start], self.names[end], bandwidth
 
     def dump_delay_paths(self):
         '''
@@ -93,4 +147,4 @@ class TopoInstance:
             for segment in segments:
                 res.append((path, segment[0], segment[1]))
 
-        return res
\ No newline at end of file
+        return res
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import networkx as nx
+import numpy as np
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../results')
+
+# bumped when the files of a compiled topology change, older ones are then compiled again
+FORMAT_VERSION = 1
+
+# see set_topology_cache
+cache_folder = os.path.join(RESULTS_FOLDER, "topology_cache")
+
+
+def set_topology_cache(folder):
+    '''
+    :param folder: where the compiled topologies are kept, None to parse the topology files on every load
+    '''
+    global cache_folder
+    cache_folder = folder
+
+
+class CompiledTopology:
+    '''
+    an undirected topology as arrays: the node names, and the CSR adjacency of the edges, each edge being stored once
+    in the row of its first node along with its bandwidth and its delay
+    '''
+    FILES = ("names", "indptr", "indices", "bandwidth", "delay")
+
+    def __init__(self, names, indptr, indices, bandwidth, delay):
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.bandwidth = bandwidth
+        self.delay = delay
+
+    @classmethod
+    def from_edges(cls, names, edges):
+        '''
+        :param names: the node names
+        :param edges: a list of (node_1 name, node_2 name, bandwidth, delay)
+        '''
+        index = dict([(name, i) for i, name in enumerate(names)])
+        sources = np.array([index[node_1] for node_1, node_2, bandwidth, delay in edges], dtype=np.int32)
+        # a stable sort keeps the order of the edges of a node
+        order = np.argsort(sources, kind="stable")
+        return cls(np.array([str(name) for name in names]),
+                   np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(names)))]).astype(np.int64),
+                   np.array([index[edges[i][1]] for i in order], dtype=np.int32),
+                   np.array([edges[i][2] for i in order], dtype=float),
+                   np.array([edges[i][3] for i in order], dtype=float))
+
+    @classmethod
+    def load(cls, folder):
+        '''
+        :return: the topology saved in folder, its arrays are memory mapped
+        '''
+        return cls(*[np.load(os.path.join(folder, "%s.npy" % name), mmap_mode="r") for name in cls.FILES])
+
+    def save(self, folder):
+        '''
+        save the arrays in folder, which only appears once complete so that concurrent loads never see a partial one
+        '''
+        parent = os.path.dirname(os.path.abspath(folder))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        tmp = tempfile.mkdtemp(dir=parent)
+        for name in self.FILES:
+            np.save(os.path.join(tmp, "%s.npy" % name), getattr(self, name))
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            # another process saved it first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def node_names(self):
+        return self.names.tolist()
+
+    def sources(self):
+        '''
+        :return: the index of the first node of each edge
+        '''
+        return np.repeat(np.arange(len(self.names)), np.diff(self.indptr))
+
+    def edges(self):
+        '''
+        :return: a list of (node_1 name, node_2 name, bandwidth, delay)
+        '''
+        names = self.node_names()
+        return [(names[i], names[j], bandwidth, delay) for i, j, bandwidth, delay in
+                zip(self.sources().tolist(), self.indices.tolist(), self.bandwidth.tolist(), self.delay.tolist())]
+
+    def nxgraph(self):
+        '''
+        :return: a nx.Graph of the topology, with the bandwidth and the delay of its edges
+        '''
+        g = nx.Graph()
+        g.add_nodes_from(self.node_names())
+        g.add_edges_from([(node_1, node_2, {"bandwidth": bandwidth, "delay": delay}) for node_1, node_2, bandwidth, delay
+                          in self.edges()])
+        return g
+
+
+def file_key(path, parse):
+    '''
+    :return: a hash of the content of the file and of the parser that reads it
+    '''
+    h = hashlib.sha1(("%s %d\n" % (parse.__name__, FORMAT_VERSION)).encode("utf-8"))
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_topology(path, parse):
+    '''
+    :param path: a topology file
+    :param parse: reads the file, returns the node names and the (node_1 name, node_2 name, bandwidth, delay) edges
+    :return: the CompiledTopology of the file, only parsed if it has not been compiled in the cache yet
+    '''
+    if cache_folder is None:
+        return CompiledTopology.from_edges(*parse(path))
+
+    folder = os.path.join(cache_folder, file_key(path, parse))
+    if not os.path.exists(folder):
+        logging.debug("compiling %s in %s" % (path, folder))
+        CompiledTopology.from_edges(*parse(path)).save(folder)
+    return CompiledTopology.load(folder)
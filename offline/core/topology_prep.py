@@ -0,0 +1,98 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+def index_edges(edges):
+    '''
+    number the nodes of undirected edges, in the order of the nodes and edges of a nx.Graph built from them
+    :param edges: a list of (node_1, node_2), parallel edges are kept once
+    :return: the node names, and the index arrays of the first and second node of each edge
+    '''
+    index = {}
+    numbers = [(index.setdefault(node_1, len(index)), index.setdefault(node_2, len(index))) for node_1, node_2 in edges]
+    sources = np.array([i for i, j in numbers], dtype=np.int64)
+    targets = np.array([j for i, j in numbers], dtype=np.int64)
+    names = list(index.keys())
+    if len(edges) == 0:
+        return names, sources, targets
+
+    # an edge is stored once, from its first node, at the position it was first added
+    low = np.minimum(sources, targets)
+    high = np.maximum(sources, targets)
+    keys, first = np.unique(low * len(names) + high, return_index=True)
+    order = np.lexsort((first, low[first]))
+    return names, low[first][order], high[first][order]
+
+
+def degrees(count, sources, targets):
+    '''
+    :return: the degree of each of the count nodes, self loops counting twice
+    '''
+    return np.bincount(sources, minlength=count) + np.bincount(targets, minlength=count)
+
+
+def largest_component(count, sources, targets):
+    '''
+    :return: a boolean mask of the nodes of the biggest connected component, the first one found for a tie
+    '''
+    if count == 0:
+        return np.zeros(0, dtype=bool)
+    graph = csr_matrix((np.ones(len(sources)), (sources, targets)), shape=(count, count))
+    labels = connected_components(graph, directed=False)[1]
+    return labels == np.argmax(np.bincount(labels))
+
+
+def prune_chains(count, sources, targets, mask=None):
+    '''
+    remove the nodes of degree 1 until none is left, the chains hanging from the rest of the topology can never host
+    a service whose paths go through them. A topology that would be removed entirely, like a tree, is left as is.
+    :param mask: the nodes to consider, all of them if not given
+    :return: a boolean mask of the remaining nodes
+    '''
+    mask = np.ones(count, dtype=bool) if mask is None else mask
+    res = mask.copy()
+    while True:
+        kept = res[sources] & res[targets]
+        leaves = res & (degrees(count, sources[kept], targets[kept]) == 1)
+        if not leaves.any():
+            # a tree is left with a single node, or none
+            return res if kept.any() else mask.copy()
+        res &= ~leaves
+
+
+def restrict(mask, sources, targets):
+    '''
+    :return: the indices of the nodes of the mask, and the edges between them numbered among them
+    '''
+    nodes = np.flatnonzero(mask)
+    number = np.full(len(mask), -1, dtype=np.int64)
+    number[nodes] = np.arange(len(nodes))
+    kept = mask[sources] & mask[targets]
+    return nodes, number[sources[kept]], number[targets[kept]]
+
+
+def degree_bandwidth(count, sources, targets, scale):
+    '''
+    :return: the bandwidth of each edge, the product of the degrees of its nodes times scale
+    '''
+    degree = degrees(count, sources, targets).astype(float)
+    return degree[sources] * degree[targets] * scale
+
+
+def giant_component(edges, scale, prune=False):
+    '''
+    :param edges: a list of (node_1, node_2)
+    :param scale: see degree_bandwidth
+    :param prune: also remove the degree 1 chains of the component, see prune_chains
+    :return: the node names of the biggest connected component, and its (node_1, node_2, bandwidth) edges
+    '''
+    names, sources, targets = index_edges(edges)
+    mask = largest_component(len(names), sources, targets)
+    if prune:
+        mask = prune_chains(len(names), sources, targets, mask)
+    nodes, sources, targets = restrict(mask, sources, targets)
+
+    names = [names[i] for i in nodes.tolist()]
+    bandwidth = degree_bandwidth(len(names), sources, targets, scale)
+    return names, [(names[i], names[j], b) for i, j, b in zip(sources.tolist(), targets.tolist(), bandwidth.tolist())]
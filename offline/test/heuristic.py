@@ -0,0 +1,172 @@
+import unittest
+from itertools import combinations, product
+
+import networkx as nx
+import numpy as np
+
+from offline.core.clustering import cluster_nodes, partition_score
+from offline.core.combinatorial import get_node_clusters, get_vhg_cdn_mapping, shortest_path
+from offline.core import delay_oracle
+from offline.core.delay_oracle import DelayOracle, get_delay_oracle
+from offline.core.distance_cache import LRUCache
+from offline.core.grid_search import GridSearch, cpu_cost, estimate_costs, grid_points, hop_oracle, network_cost
+from offline.core.sla import Sla, SlaNodeSpec
+from offline.core.substrate import Substrate
+from offline.time.persistence import Session, drop_all
+from offline.test.substrate import grid_substrate
+
+
+class HeuristicTestCase(unittest.TestCase):
+    def test_delay_oracle(self):
+        g = nx.gnm_random_graph(30, 60, seed=3)
+        edges = [(str(u), str(v), float((u * v) % 7)) for u, v in g.edges()]
+        oracle = DelayOracle([str(n) for n in g.nodes()], edges + [("30", "31", 1.0)])
+        for u, v, delay in edges:
+            g[int(u)][int(v)]["delay"] = delay
+        lengths = dict(nx.all_pairs_dijkstra_path_length(g, weight="delay"))
+        for u in g.nodes():
+            for v in g.nodes():
+                self.assertEqual(oracle.delay(str(u), str(v)), lengths[u].get(v))
+        self.assertIsNone(oracle.delay("0", "31"))
+        self.assertEqual(oracle.delay("31", "30"), 1.0)
+
+    def test_oracle_invalidation(self):
+        substrate = grid_substrate()
+        oracle = get_delay_oracle(substrate)
+        self.assertEqual(shortest_path("0101", "0303", substrate), 20)
+        self.assertIs(get_delay_oracle(substrate), oracle)
+
+        # the same topology created again shares the oracle
+        self.assertIs(get_delay_oracle(grid_substrate()), oracle)
+
+        substrate.set_delay(substrate.edges[0], 100)
+        self.assertIsNot(get_delay_oracle(substrate), oracle)
+
+    def test_lru_cache(self):
+        cache = LRUCache("test", 2, shards=1, register=False)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get_or_compute("c", lambda: 4), 3)
+        self.assertEqual(cache.get_or_compute("d", lambda: 4), 4)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["entries"]), (2, 2, 2, 2))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_clusters(self):
+        substrate = grid_substrate()
+        score, clusters = get_node_clusters(["0101", "0102", "0303"], 2, substrate)
+        self.assertEqual(score, 10)
+        self.assertEqual(clusters["0101"], clusters["0102"])
+        self.assertNotEqual(clusters["0101"], clusters["0303"])
+
+        mapping = get_vhg_cdn_mapping([("0101", "VHG1"), ("0303", "VHG2")], [("0103", "CDN1"), ("0302", "CDN2")],
+                                      substrate)
+        self.assertEqual(mapping, {"VHG1": "CDN1", "VHG2": "CDN2"})
+
+    def test_clustering_modes(self):
+        rs = np.random.RandomState(2)
+        points = rs.rand(7, 2)
+        distances = np.sqrt(((points[:, None] - points[None, :]) ** 2).sum(axis=2))
+        nodes = ["n%d" % i for i in range(7)]
+        for class_count in range(1, 8):
+            best = min([partition_score(distances, labels) for labels in product(range(class_count), repeat=7)
+                        if len(set(labels)) == class_count])
+            score, clusters = cluster_nodes(nodes, class_count, distances, mode="exact")
+            self.assertAlmostEqual(score, best)
+            self.assertEqual(sorted(set(clusters.values())), list(range(1, class_count + 1)))
+
+            score, clusters = cluster_nodes(nodes, class_count, distances, mode="kmedoids")
+            self.assertGreaterEqual(score, best - 1e-9)
+            self.assertEqual(sorted(set(clusters.values())), list(range(1, class_count + 1)))
+
+        # far too many starters for an exhaustive search
+        points = rs.rand(40, 2)
+        distances = np.sqrt(((points[:, None] - points[None, :]) ** 2).sum(axis=2))
+        score, clusters = cluster_nodes(["n%d" % i for i in range(40)], 4, distances)
+        self.assertEqual(len(clusters), 40)
+        self.assertEqual(sorted(set(clusters.values())), [1, 2, 3, 4])
+
+    def test_vhg_cdn_mapping(self):
+        drop_all()
+        substrate = Substrate.FromErdosRenyi([150, 0.03, 1, 1000, 10, 10])
+        names = sorted([node.name for node in substrate.nodes])
+        vhgs = [(name, "VHG%d" % i) for i, name in enumerate(names[:20], start=1)]
+        cdns = [(name, "CDN%d" % i) for i, name in enumerate(names[10:], start=1)]
+
+        def reference(cdns):
+            oracle = get_delay_oracle(substrate)
+            res = {}
+            for vhg in vhgs:
+                best = None
+                for cdn in cdns:
+                    value = oracle.delay(vhg[0], cdn[0])
+                    if value is not None and (best is None or value < best):
+                        best = value
+                        res[vhg[1]] = cdn[1]
+            return res
+
+        # more cdns than vhgs, then fewer
+        expected = [reference(cdns), reference(cdns[:5])]
+        self.assertEqual([get_vhg_cdn_mapping(vhgs, cdns, substrate),
+                          get_vhg_cdn_mapping(vhgs, cdns[:5], substrate)], expected)
+
+        # same results when the delays are only computed for the sources
+        dense_limit = delay_oracle.DENSE_LIMIT
+        delay_oracle.DENSE_LIMIT = 0
+        try:
+            oracle = get_delay_oracle(substrate)
+            substrate.delay_oracle = (substrate.get_residual().delay_version, DelayOracle(oracle.names, [
+                (edge.node_1.name, edge.node_2.name, edge.delay) for edge in substrate.edges]))
+            self.assertIsNone(get_delay_oracle(substrate).matrix)
+            self.assertEqual([get_vhg_cdn_mapping(vhgs, cdns, substrate),
+                              get_vhg_cdn_mapping(vhgs, cdns[:5], substrate)], expected)
+        finally:
+            delay_oracle.DENSE_LIMIT = dense_limit
+
+    def test_grid_search(self):
+        self.assertAlmostEqual(cpu_cost(3, 10.0, lambda x: 1 + 2 * x), 23)
+
+        substrate = grid_substrate()
+        oracle = hop_oracle(substrate)
+        names = ["0101", "0103", "0301", "0303", "0202"]
+        bandwidths = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+        hops = oracle.block(names, names)
+        to_locations = oracle.block(names, [node.name for node in substrate.nodes])
+        for vhg_count in range(1, 6):
+            # the cheapest vhg locations, each starter using the nearest one
+            best = min([(bandwidths * to_locations[:, list(chosen)].min(axis=1)).sum() for chosen in
+                        combinations(range(len(substrate.nodes)), vhg_count)])
+            self.assertLessEqual(network_cost(hops, bandwidths, vhg_count), best + 1e-9)
+        self.assertEqual(network_cost(hops, bandwidths, 1), 10.0)
+
+        session = Session()
+        session.add(substrate)
+        sla = Sla(substrate=substrate, delay=200, max_cdn_to_use=1, sla_node_specs=[
+            SlaNodeSpec(topoNode=node, type="start", attributes={"bandwidth": 1e8}) for node in substrate.nodes[:4]])
+        session.add(sla)
+        session.flush()
+
+        points = grid_points(4)
+        self.assertEqual(len(points), 10)
+        estimates = dict(zip(points, estimate_costs(sla, points)))
+        search = GridSearch()
+        evaluated = []
+
+        def evaluate(point):
+            evaluated.append(point)
+            return estimates[point] * 1.5
+
+        res = search.search(sla, points, evaluate)
+        self.assertEqual(evaluated, sorted(evaluated, key=lambda point: estimates[point]))
+        self.assertEqual(res, [(point, estimates[point] * 1.5) for point in evaluated])
+        best = min([objective_function for point, objective_function in res])
+        self.assertTrue(all([estimates[point] >= best for point in points if point not in evaluated]))
+        self.assertEqual(search.stats()["skipped"], len(points) - len(evaluated))
+        self.assertGreater(search.stats()["saved"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
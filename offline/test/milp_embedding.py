@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from offline.core.colgen import solve_paths
+from offline.core.corridor import reduce_model
+from offline.core.milp import solve_milp
+from offline.core.relax import lower_bound, BoundPruning
+from offline.core.solve_stats import aggregate
+from offline.core.solver import restore_warm_start, save_warm_start
+
+
+def line_model(cpu=10, delay=200):
+    '''
+    a---b---c substrate, S1 is on a, the CDN is on c
+    '''
+    return {
+        "substrate.nodes": [("a", cpu), ("b", cpu), ("c", cpu)],
+        "substrate.edges": [("a", "b", 1000.0, 10.0), ("b", "c", 1000.0, 10.0)],
+        "service.nodes": [("S1_1_1", 0, 100), ("VHG1_1_1", 1, 100), ("VCDN1_1_1", 5, 35), ("CDN1_1_1", 0, 65)],
+        "service.edges": [("S1_1_1", "VHG1_1_1", 100), ("VHG1_1_1", "VCDN1_1_1", 35),
+                          ("VHG1_1_1", "CDN1_1_1", 65)],
+        "CDN.nodes": [("CDN1_1_1", "c")],
+        "starters.nodes": [("S1_1_1", "a", 100)],
+        "VHG.nodes": ["VHG1_1_1"],
+        "VCDN.nodes": ["VCDN1_1_1"],
+        "service.path.delay": [("S1_VHG1_VCDN1_1_1", delay)],
+        "service.path": [("S1_VHG1_VCDN1_1_1", "S1_1_1", "VHG1_1_1"),
+                         ("S1_VHG1_VCDN1_1_1", "VHG1_1_1", "VCDN1_1_1")],
+    }
+
+
+class MilpTestCase(unittest.TestCase):
+    def test_embedding(self):
+        objective_function, node_solutions, edge_solutions, status, gap = solve_milp(line_model())
+        mapping = {snode: node for node, snode in node_solutions}
+        self.assertEqual(mapping["S1_1_1"], "a")
+        self.assertEqual(mapping["CDN1_1_1"], "c")
+
+        # every service edge is routed on a path between its mapped ends
+        for i, j in [("S1_1_1", "VHG1_1_1"), ("VHG1_1_1", "VCDN1_1_1"), ("VHG1_1_1", "CDN1_1_1")]:
+            arcs = [(u, v) for u, v, si, sj in edge_solutions if (si, sj) == (i, j)]
+            position = mapping[i]
+            while position != mapping[j]:
+                position = [v for u, v in arcs if u == position][0]
+
+        self.assertGreater(objective_function, 0)
+        self.assertEqual(status, "optimal")
+
+    def test_cpu_constraint(self):
+        # the VCDN does not fit anywhere
+        self.assertIsNone(solve_milp(line_model(cpu=4)))
+
+    def test_delay_constraint(self):
+        # the VHG cannot be more than 5ms away from the starter, and VHG-VCDN must be colocated
+        objective_function, node_solutions, edge_solutions, status, gap = solve_milp(line_model(delay=5))
+        mapping = {snode: node for node, snode in node_solutions}
+        self.assertEqual(mapping["VHG1_1_1"], "a")
+        self.assertEqual(mapping["VCDN1_1_1"], "a")
+
+    def test_corridor(self):
+        # d hangs off a, too far from the starter to host anything and on no path toward the CDN
+        model = line_model(delay=15)
+        model["substrate.nodes"].append(("d", 10))
+        model["substrate.edges"].append(("a", "d", 1000.0, 20.0))
+        reduced = reduce_model(model, k_paths=1)
+        self.assertEqual(sorted([name for name, cpu in reduced["substrate.nodes"]]), ["a", "b", "c"])
+        self.assertEqual(len(reduced["substrate.edges"]), 2)
+        self.assertEqual(solve_milp(reduced)[0], solve_milp(model)[0])
+
+    def test_warm_start(self):
+        # a corridor solve without solution overwrites the solution file the full model is reoptimized from
+        folder = tempfile.mkdtemp()
+        try:
+            self.assertIsNone(save_warm_start(folder))
+            with open(os.path.join(folder, "solutions.data"), "w") as f:
+                f.write("objective value: 42\n")
+            warm_start = save_warm_start(folder)
+            with open(os.path.join(folder, "solutions.data"), "w") as f:
+                f.write("no solution available\n")
+            restore_warm_start(folder, warm_start)
+            self.assertEqual(save_warm_start(folder), "objective value: 42\n")
+            restore_warm_start(folder, None)
+            self.assertFalse(os.path.exists(os.path.join(folder, "solutions.data")))
+        finally:
+            shutil.rmtree(folder)
+
+    def test_paths(self):
+        # the path formulation finds the same optimum as the arc model, without falling back on it
+        for model in [line_model(), line_model(delay=5)]:
+            objective_function, node_solutions, edge_solutions, status, gap = solve_paths(model, fallback=False)
+            self.assertAlmostEqual(objective_function, solve_milp(model)[0])
+            mapping = {snode: node for node, snode in node_solutions}
+            arcs = [(u, v) for u, v, si, sj in edge_solutions if (si, sj) == ("VHG1_1_1", "CDN1_1_1")]
+            self.assertEqual(arcs[-1][1], mapping["CDN1_1_1"])
+        self.assertIsNone(solve_paths(line_model(cpu=4)))
+
+    def test_lower_bound(self):
+        objective_function = solve_milp(line_model())[0]
+        self.assertLessEqual(lower_bound(line_model(), bound="fixed"), lower_bound(line_model()))
+        self.assertLessEqual(lower_bound(line_model()), objective_function + 1e-6)
+        # not enough cpu in the whole substrate, even for a fractional embedding
+        self.assertEqual(lower_bound(line_model(cpu=1)), float("inf"))
+
+    def test_bound_pruning(self):
+        pruning = BoundPruning()
+        objective_functions = {"a": 10, "b": 12, "c": None, "d": 30}
+        solved = []
+
+        def solve_batch(batch):
+            solved.extend(batch)
+            return [objective_functions[candidate] for candidate in batch]
+
+        res = pruning.evaluate(["d", "c", "b", "a"], [25, 5, 11, 8], solve_batch)
+        self.assertEqual(solved, ["c", "a"])
+        self.assertEqual(res, [("a", 10)])
+        self.assertEqual(pruning.stats()["pruned"], 2)
+
+    def test_solve_stats(self):
+        stats = {}
+        solve_milp(line_model(), stats=stats)
+        self.assertGreater(stats["variables"], 0)
+        self.assertGreater(stats["constraints"], 0)
+        self.assertGreaterEqual(stats["solving_time"], 0)
+
+        rows = [dict(stats, experiment="e", vhg_count=1, vcdn_count=1, status="optimal", solver_time=1.0),
+                dict(stats, experiment="e", vhg_count=1, vcdn_count=1, status="timelimit", solver_time=3.0),
+                dict(stats, experiment="e", vhg_count=2, vcdn_count=1, status="optimal", solver_time=2.0)]
+        report = aggregate(rows)
+        self.assertEqual([(line["vhg_count"], line["solves"]) for line in report], [(1, 2), (2, 1)])
+        self.assertEqual(report[0]["unsolved"], 1)
+        self.assertEqual(report[0]["max_solver_time"], 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
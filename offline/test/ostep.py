@@ -0,0 +1,32 @@
+import unittest
+
+from offline.core import relax, solver
+from offline.core.relax import enable_bound_pruning
+from offline.tools import ostep
+from offline.tools.ostep import embed_candidates_param
+from offline.test.service import grid_sla, line_topology
+
+
+class OstepTestCase(unittest.TestCase):
+    def test_pruned_count(self):
+        solver.set_solver_backend("highs")
+        pruning = enable_bound_pruning("fixed")
+        ostep.candidate_count = 0
+        ostep.pruned_count = 0
+        try:
+            substrate, sla = grid_sla()
+            # the bigger vcdns cost more cpu than the whole cheapest candidate
+            candidates_param = [(line_topology(vcdn_cpu), [sla.id], 1, 1, False) for vcdn_cpu in (50, 5, 60)]
+            services = embed_candidates_param(candidates_param, use_heuristic=False)
+            self.assertEqual([service.mapping is not None for service in services], [False, True, False])
+
+            # only the solved candidate is an embedding, the pruned ones are counted apart
+            self.assertEqual(pruning.stats()["pruned"], 2)
+            self.assertEqual((ostep.candidate_count, ostep.pruned_count), (1, 2))
+        finally:
+            relax.candidate_pruning = None
+            solver.set_solver_backend("scip")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import pickle
+import unittest
+from types import SimpleNamespace
+
+from offline.core.delay_oracle import get_delay_oracle
+from offline.core.residual import SnapshotLog
+from offline.core.mapping import Mapping
+from offline.time.persistence import EdgeMapping, NodeMapping, ServiceEdge, ServiceNode, Session
+from offline.test.substrate import grid_substrate
+
+
+class ResidualTestCase(unittest.TestCase):
+    def test_residual_state(self):
+        substrate = grid_substrate()
+        residual = substrate.get_residual()
+        oracle = get_delay_oracle(substrate)
+        model = substrate.dump_model()
+        self.assertEqual(model["substrate.nodes"][0], ("0101", 10.0))
+        self.assertIs(substrate.dump_model()["substrate.edges"], model["substrate.edges"])
+        bandwidths = dict(substrate.get_nodes_by_bw())
+
+        # the first edge is mapped twice, by both directions of a service edge
+        service_node = ServiceNode(name="VHG1", cpu=4)
+        service_edge = ServiceEdge(bandwidth=100)
+        mapping = Mapping(node_mappings=[NodeMapping(node=substrate.nodes[0], service_node=service_node)],
+                          edge_mappings=[EdgeMapping(edge=substrate.edges[0], serviceEdge=service_edge),
+                                         EdgeMapping(edge=substrate.edges[0], serviceEdge=service_edge)])
+        service = SimpleNamespace(mapping=mapping)
+        version = substrate.version
+        substrate.consume_service(service)
+        self.assertGreater(substrate.version, version)
+        self.assertEqual((residual.cpu[0], residual.bandwidth[0]), (6.0, 800.0))
+        self.assertEqual(substrate.dump_model()["substrate.nodes"][0], ("0101", 6.0))
+        self.assertEqual(dict(substrate.get_nodes_by_bw())["0101"], bandwidths["0101"] - 200)
+        # the delays did not change
+        self.assertIs(get_delay_oracle(substrate), oracle)
+
+        # written to the nodes and edges on demand, or when the session flushes
+        self.assertEqual(substrate.nodes[0].cpu_capacity, 10.0)
+        substrate.flush()
+        self.assertEqual((substrate.nodes[0].cpu_capacity, substrate.edges[0].bandwidth), (6.0, 800.0))
+
+        substrate.release_service(service)
+        session = Session()
+        session.add(service_node)
+        session.flush()
+        self.assertEqual((substrate.nodes[0].cpu_capacity, substrate.edges[0].bandwidth), (10.0, 1000.0))
+        self.assertEqual(substrate.dump_model(), model)
+
+    def test_snapshots(self):
+        substrate = grid_substrate()
+        residual = substrate.get_residual()
+        log = SnapshotLog(residual)
+        first = log.snapshot()
+
+        service_node = ServiceNode(name="VHG1", cpu=4)
+        service_edge = ServiceEdge(bandwidth=100)
+        service = SimpleNamespace(mapping=Mapping(
+            node_mappings=[NodeMapping(node=substrate.nodes[4], service_node=service_node)],
+            edge_mappings=[EdgeMapping(edge=substrate.edges[2], serviceEdge=service_edge)]))
+        substrate.consume_service(service)
+        second = log.snapshot()
+        substrate.consume_service(service)
+        third = log.snapshot()
+        substrate.release_service(service)
+        substrate.release_service(service)
+        fourth = log.snapshot()
+
+        # only the changed node and edge are kept by each step
+        self.assertEqual([(len(nodes), len(edges)) for nodes, cpus, edges, bandwidths in log.steps],
+                         [(0, 0), (1, 1), (1, 1), (1, 1)])
+        cpu, bandwidth = third.get_state()
+        self.assertEqual((cpu[4], bandwidth[2]), (2.0, 800.0))
+        self.assertEqual(cpu.sum(), 9 * 10 - 8)
+        self.assertEqual((second.get_nodes_sum(), second.get_edges_sum()), (86.0, 16 * 1000 - 100.0))
+        for snapshot in (first, fourth):
+            cpu, bandwidth = snapshot.get_state()
+            self.assertEqual((cpu.tolist(), bandwidth.tolist()), ([10.0] * 9, [1000.0] * 16))
+        self.assertIsNone(pickle.loads(pickle.dumps(log)).residual)
+
+
+if __name__ == '__main__':
+    unittest.main()
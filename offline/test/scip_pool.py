@@ -0,0 +1,148 @@
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from offline.core.scip_pool import ScipError, ScipPool, run_scip_process
+
+# a scip shell reading its commands from -c arguments or from stdin. It logs "<pid> <command>" in $FAKE_SCIP_LOG,
+# writes a solution whose objective value is the number of commands it has run, and exits while optimizing as long as
+# $FAKE_SCIP_CRASH holds a number of crashes left.
+FAKE_SCIP = '''#!%s
+import os
+import sys
+
+def commands():
+    args = sys.argv[1:]
+    if len(args) > 0:
+        return [args[i + 1] for i in range(0, len(args), 2)]
+    return (line.strip() for line in sys.stdin)
+
+count = 0
+for command in commands():
+    count += 1
+    with open(os.environ["FAKE_SCIP_LOG"], "a") as log:
+        log.write("%%d %%s\\n" %% (os.getpid(), command))
+    if command.startswith("optimize") and os.path.exists(os.environ["FAKE_SCIP_CRASH"]):
+        with open(os.environ["FAKE_SCIP_CRASH"]) as f:
+            crashes = int(f.read())
+        if crashes > 0:
+            with open(os.environ["FAKE_SCIP_CRASH"], "w") as f:
+                f.write("%%d" %% (crashes - 1))
+            sys.exit(1)
+    if command.startswith("write solution "):
+        path = command[len("write solution "):]
+        with open(path, "w") as f:
+            f.write("objective value: %%d\\n" %% count)
+        print("written solution information to file <%%s>" %% path)
+        sys.stdout.flush()
+    if command in ("q", "quit"):
+        break
+''' % sys.executable
+
+
+class ScipPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        bin_folder = os.path.join(self.folder, "bin")
+        os.makedirs(bin_folder)
+        with open(os.path.join(bin_folder, "scip"), "w") as f:
+            f.write(FAKE_SCIP)
+        os.chmod(os.path.join(bin_folder, "scip"), stat.S_IRWXU)
+
+        self.environ = dict(os.environ)
+        os.environ["PATH"] = bin_folder + os.pathsep + os.environ["PATH"]
+        os.environ["FAKE_SCIP_LOG"] = os.path.join(self.folder, "scip.log")
+        os.environ["FAKE_SCIP_CRASH"] = os.path.join(self.folder, "crash")
+        self.pool = ScipPool(1, os.path.join(self.folder, "workers"))
+
+    def tearDown(self):
+        self.pool.close()
+        os.environ.clear()
+        os.environ.update(self.environ)
+        shutil.rmtree(self.folder)
+
+    def log(self):
+        '''
+        :return: the list of (pid, command) run by the fake scip
+        '''
+        with open(os.environ["FAKE_SCIP_LOG"]) as f:
+            return [tuple(line.rstrip("\n").split(" ", 1)) for line in f]
+
+    def solve(self, model):
+        solution_file = os.path.join(self.folder, "%s.sol" % model)
+        output = self.pool.run(["read %s.zpl" % model, "optimize"], solution_file)
+        self.assertIn("written solution information to file <%s>" % solution_file, output)
+        with open(solution_file) as f:
+            return f.read()
+
+    def test_process(self):
+        solution_file = os.path.join(self.folder, "a.sol")
+        output = run_scip_process(["read a.zpl", "optimize"], solution_file)
+        self.assertIn("written solution information to file <%s>" % solution_file, output)
+        self.assertEqual([command for pid, command in self.log()],
+                         ["read a.zpl", "optimize", "write solution %s" % solution_file, "q"])
+
+    def test_session(self):
+        self.solve("a")
+        # the parameters of the previous model are reset before the next one is read
+        self.assertEqual(self.solve("b"), "objective value: 8\n")
+        log = self.log()
+        self.assertEqual(len(set([pid for pid, command in log])), 1)
+        self.assertEqual([command for pid, command in log],
+                         ["set default", "read a.zpl", "optimize", "write solution %s/a.sol" % self.folder,
+                          "set default", "read b.zpl", "optimize", "write solution %s/b.sol" % self.folder])
+        self.assertEqual(sum([worker.solve_count for worker in self.pool.workers]), 2)
+
+    def crash(self, count):
+        with open(os.environ["FAKE_SCIP_CRASH"], "w") as f:
+            f.write("%d" % count)
+
+    def test_restart(self):
+        self.solve("a")
+        self.crash(1)
+        # the session dies while optimizing b, b is solved again in a new session
+        self.assertEqual(self.solve("b"), "objective value: 4\n")
+        log = self.log()
+        self.assertEqual(len(set([pid for pid, command in log])), 2)
+        self.assertEqual([command for pid, command in log if pid == log[-1][0]],
+                         ["set default", "read b.zpl", "optimize", "write solution %s/b.sol" % self.folder])
+        self.assertEqual(len(self.pool.workers), 1)
+
+        # scip is only restarted once
+        self.crash(2)
+        with self.assertRaises(ScipError):
+            self.solve("c")
+
+    def test_fork(self):
+        self.solve("a")
+        parent = self.pool.workers[0]
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # the child starts its own worker, and leaves the one of the parent alone when it closes the pool
+            try:
+                self.solve("b")
+                child = self.pool.workers[0]
+                self.pool.close()
+                code = 0 if child is not parent and os.path.basename(child.scratch).startswith(
+                    "%d-" % os.getpid()) else 1
+            except Exception:
+                code = 2
+            os.write(write, str(code).encode())
+            os._exit(0)
+        os.close(write)
+        os.waitpid(pid, 0)
+        self.assertEqual(os.read(read, 1), b"0")
+        os.close(read)
+
+        self.assertEqual(self.pool.workers, [parent])
+        self.assertIsNone(parent.process.poll())
+        self.assertEqual(len(set([pid for pid, command in self.log()])), 2)
+        self.assertTrue(os.path.basename(parent.scratch).startswith("%d-" % os.getpid()))
+
+
+if __name__ == '__main__':
+    unittest.main()
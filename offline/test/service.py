@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from offline.core import solver
+from offline.core.model import TABLE_FORMATS, read_model
+from offline.core.service import Service
+from offline.core.sla import Sla, SlaNodeSpec
+from offline.core.solve_stats import query_solve_stats
+from offline.core.topo_instance import TopoInstance
+from offline.time.persistence import Session
+from offline.test.substrate import grid_substrate
+
+
+def grid_sla():
+    '''
+    :return: the grid substrate and a sla with a starter on 0101 and a CDN on 0303
+    '''
+    substrate = grid_substrate()
+    session = Session()
+    session.add(substrate)
+    sla = Sla(substrate=substrate, delay=200, max_cdn_to_use=1, sla_node_specs=[
+        SlaNodeSpec(topoNode=substrate.nodes[0], type="start", attributes={"bandwidth": 100}),
+        SlaNodeSpec(topoNode=substrate.nodes[8], type="cdn", attributes={"bandwidth": 100})])
+    session.add(sla)
+    session.flush()
+    return substrate, sla
+
+
+def line_topology(vcdn_cpu=5):
+    '''
+    :return: a service topology S0-VHG1-VCDN1 and VHG1-CDN0, with its starter on 0101 and its CDN on 0303
+    '''
+    g = nx.DiGraph()
+    g.add_node("S0", type="S", cpu=0, bandwidth=100, mapping="0101")
+    g.add_node("VHG1", type="VHG", cpu=1, bandwidth=100)
+    g.add_node("VCDN1", type="VCDN", cpu=vcdn_cpu, bandwidth=100)
+    g.add_node("CDN0", type="CDN", cpu=0, bandwidth=100, mapping="0303")
+    g.add_edges_from([("S0", "VHG1"), ("VHG1", "VCDN1"), ("VHG1", "CDN0")], bandwidth=100)
+    return TopoInstance(g, [], {}, 200)
+
+
+def line_service():
+    '''
+    :return: the grid substrate and the service of line_topology on it, whose model is not solved
+    '''
+    substrate, sla = grid_sla()
+    service = Service(line_topology(), [sla.id], vhg_count=1, vcdn_count=1, embed=False)
+    return substrate, service
+
+
+class ServiceTestCase(unittest.TestCase):
+    def test_service_write(self):
+        substrate, service = line_service()
+        folder = tempfile.mkdtemp()
+        try:
+            service.write(folder)
+            postfix = "%d_%d" % (service.id, service.merged_sla.id)
+            model = dict(read_model(folder))
+            # the tables without rows are written too
+            self.assertEqual(sorted(model), ["CDN.nodes", "VCDN.nodes", "VHG.nodes", "service.edges", "service.nodes",
+                                             "service.path", "service.path.delay", "starters.nodes"])
+            self.assertEqual(model["service.path"], "")
+            self.assertEqual(sorted(solver.dump_model(service, substrate)), sorted(TABLE_FORMATS))
+            self.assertEqual(model["VHG.nodes"], "VHG1_%s\n" % postfix)
+            self.assertEqual(model["CDN.nodes"], "CDN0_%s 0303\n" % postfix)
+            self.assertEqual(model["starters.nodes"], "S0_%s 0101 100.000000\n" % postfix)
+            self.assertEqual(len(model["service.edges"].splitlines()), 3)
+        finally:
+            shutil.rmtree(folder)
+
+
+    def test_embed_candidates(self):
+        solver.set_solver_backend("highs")
+        try:
+            objective_functions = []
+            for processes in (1, 2):
+                substrate, sla = grid_sla()
+                # the same service with a bigger vcdn is more expensive
+                candidates = [(line_topology(vcdn_cpu), [sla.id], 1, 1) for vcdn_cpu in (8, 5, 9)]
+                services = Service.embed_candidates(candidates, processes, use_heuristic=False)
+                self.assertEqual(len(services), 3)
+
+                # only the cheapest candidate gets a mapping, every solve is recorded
+                self.assertEqual([service.mapping is not None for service in services], [False, True, False])
+                mapping = services[1].mapping
+                self.assertEqual(sorted([(ns.service_node.name, ns.node.name) for ns in mapping.node_mappings
+                                         if ns.service_node.name in ("S0", "CDN0")]), [("CDN0", "0303"), ("S0", "0101")])
+                self.assertEqual(len(query_solve_stats()), 3)
+                objective_functions.append(mapping.objective_function)
+            self.assertAlmostEqual(objective_functions[0], objective_functions[1])
+        finally:
+            solver.set_solver_backend("scip")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import random
+import unittest
+from itertools import count, islice
+
+import networkx as nx
+
+from offline.core.service_topo import get_all_possible_edges, get_all_possible_edge_for_2_lists
+from offline.core.service_topo_generator import canonical_form, equal_nodes, enumerate_candidates, enumerate_shard, \
+    enumerate_sharded
+from offline.core.topo_instance import TopoInstance
+from offline.tools.ostep import take_topologies, random_topology
+
+
+def layers(start_count, vhg_count, vcdn_count, cdn_count):
+    '''
+    :return: the S, VHG, VCDN and CDN node names of a candidate service, and the type of each node
+    '''
+    res = [["%s%d" % (node_type, i) for i in range(1, count + 1)] for node_type, count in
+           [("S", start_count), ("VHG", vhg_count), ("VCDN", vcdn_count), ("CDN", cdn_count)]]
+    types = dict([(node, node_type) for node_type, nodes in zip(["S", "VHG", "VCDN", "CDN"], res) for node in nodes])
+    return res, types
+
+
+def candidates(start_count, vhg_count, vcdn_count, cdn_count):
+    (starts, vhgs, vcdns, cdns), types = layers(start_count, vhg_count, vcdn_count, cdn_count)
+    for first in get_all_possible_edges([starts, vhgs, vcdns]):
+        for last in get_all_possible_edges([vhgs, cdns], all_rights_are_mandatory=False):
+            yield first + last
+
+
+class ServiceTopoTestCase(unittest.TestCase):
+    def test_canonical_form(self):
+        for counts in [(3, 2, 1, 2), (3, 2, 2, 2), (4, 2, 1, 2)]:
+            types = layers(*counts)[1]
+            kept = []
+            forms = set()
+            for edges in candidates(*counts):
+                graph = nx.DiGraph()
+                graph.add_nodes_from([(node, {"name": node, "type": types[node]}) for edge in edges for node in edge])
+                graph.add_edges_from(edges)
+
+                form = canonical_form(edges, types)
+                self.assertTrue(form[1])
+                isomorphic = any([nx.is_isomorphic(other, graph, equal_nodes) for other in kept])
+                self.assertEqual(isomorphic, form in forms)
+                if not isomorphic:
+                    kept.append(graph)
+                    forms.add(form)
+
+    def test_sharding(self):
+        candidate_layers, types = layers(5, 3, 2, 2)
+        candidates = list(enumerate_candidates(candidate_layers, types))
+        self.assertEqual(list(enumerate_sharded(candidate_layers, types, 2)), candidates)
+
+        # isomorphic candidates are in the same shard, the shards have no duplicates between them
+        shards = [enumerate_shard((candidate_layers, types, shard, 3, True)) for shard in range(3)]
+        self.assertEqual(sum([len(shard) for shard in shards]), len(candidates))
+
+    def test_streaming(self):
+        # 3^5 ways of linking 5 starters to 3 vhgs, 150 of which use every vhg
+        self.assertEqual(len(list(get_all_possible_edge_for_2_lists(range(5), range(3), False))), 243)
+        assignments = list(get_all_possible_edge_for_2_lists(range(5), range(3)))
+        self.assertEqual(len(assignments), 150)
+        self.assertTrue(all([len(set([r for l, r in edges])) == 3 for edges in assignments]))
+
+        # far too many to be listed, the first ones still come at once
+        (starts, vhgs, vcdns, cdns), types = layers(40, 10, 5, 20)
+        first = list(islice(get_all_possible_edges([starts, vhgs, vcdns]), 3))
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(first[0]), 50)
+
+    def test_take_topologies(self):
+        self.assertEqual(list(take_topologies(count(), max_topologies=3)), [0, 1, 2])
+        sampled = list(take_topologies(range(1000), sample_rate=0.1, rs=random.Random(1)))
+        self.assertTrue(50 < len(sampled) < 150)
+        self.assertEqual(list(take_topologies(range(1000), max_topologies=5, sample_rate=0.1, rs=random.Random(1))),
+                         sampled[:5])
+        self.assertIn(random_topology(iter(range(10)), random.Random(1)), range(10))
+
+    def test_topo_instance(self):
+        graph = nx.DiGraph()
+        graph.add_node("VHG2", type="VHG", cpu=2, bandwidth=3)
+        graph.add_node("S1", type="S", cpu=0, bandwidth=1.5, mapping="0101")
+        graph.add_node("CDN1", type="CDN", cpu=0, bandwidth=0, mapping="0303")
+        graph.add_node("VHG1", type="VHG", cpu=1, bandwidth=2)
+        graph.add_node("VCDN1", type="VCDN", cpu=4, bandwidth=5)
+        graph.add_edges_from([("S1", "VHG1", {"bandwidth": 1.5}), ("VHG1", "VCDN1", {"bandwidth": 1.5}),
+                              ("VHG2", "CDN1", {"bandwidth": 1})])
+        topo = TopoInstance(graph, ["S1"], {"S1": [("S1", "VHG1")]}, 30)
+
+        self.assertEqual(topo.get_vhg(), ["VHG1", "VHG2"])
+        self.assertEqual(topo.get_vcdn(), ["VCDN1"])
+        self.assertEqual(topo.get_cdn(), ["CDN1"])
+        self.assertEqual(topo.get_Starters(), [("S1", "0101", 1.5)])
+        self.assertEqual(topo.get_CDN(), [("CDN1", "0303", 0)])
+        # nodes and edges come in the order of the graph
+        self.assertEqual(list(topo.getServiceNodes()), [("VHG2", 2, 3), ("S1", 0, 1.5), ("CDN1", 0, 0),
+                                                        ("VHG1", 1, 2), ("VCDN1", 4, 5)])
+        self.assertEqual(list(topo.getServiceCDNNodes()), [("CDN1", 0)])
+        self.assertEqual(topo.dump_edges(), list(graph.edges(data="bandwidth")))
+        self.assertEqual(list(topo.getServiceCDNEdges()), [("VHG2", "CDN1", 1)])
+        self.assertEqual(topo.dump_delay_routes(), [("S1", "S1", "VHG1")])
+
+        rebuilt = topo.servicetopo
+        self.assertEqual(list(rebuilt.nodes(data=True)), list(graph.nodes(data=True)))
+        self.assertEqual(list(rebuilt.edges(data=True)), list(graph.edges(data=True)))
+
+
+if __name__ == '__main__':
+    unittest.main()
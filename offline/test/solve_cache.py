@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from offline.core import solver
+from offline.core.solve_cache import SolveCache
+from offline.core.solver import enable_solve_cache, solve_many
+from offline.test.milp_embedding import line_model
+
+
+def model_tables(postfix, padding=20):
+    return [("service.nodes", "%s\t\t1.000000\t\t100.000000\n" % ("VHG1%s" % postfix).ljust(padding)),
+            ("VHG.nodes", "VHG1%s\n" % postfix),
+            ("substrate.nodes", "a\t1.000000e+01\n")]
+
+
+class SolveCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_hit_and_miss(self):
+        cache = SolveCache(self.folder)
+        key = cache.key(model_tables("_1_2"), "_1_2", "scip")
+        self.assertEqual(cache.get(key, "_1_2"), (False, None))
+        cache.put(key, "_1_2", (42.0, [("a", "VHG1_1_2")]))
+        self.assertEqual(cache.get(key, "_1_2"), (True, (42.0, [("a", "VHG1_1_2")])))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "entries": 1})
+
+        # the entries are persistent
+        self.assertEqual(SolveCache(self.folder).get(key, "_1_2"), (True, (42.0, [("a", "VHG1_1_2")])))
+
+    def test_postfix(self):
+        cache = SolveCache(self.folder)
+        key = cache.key(model_tables("_1_2"), "_1_2", "scip")
+        # the same model for another service and sla, whose longer names are padded differently
+        self.assertEqual(cache.key(model_tables("_13_24", padding=24), "_13_24", "scip"), key)
+        self.assertNotEqual(cache.key(model_tables("_1_2"), "_1_2", "highs"), key)
+
+        cache.put(key, "_1_2", (42.0, [("a", "VHG1_1_2"), ("b", "VHG1_1_23")]))
+        self.assertEqual(cache.get(key, "_13_24"), (True, (42.0, [("a", "VHG1_13_24"), ("b", "VHG1_1_23")])))
+
+    def test_eviction(self):
+        cache = SolveCache(self.folder, max_entries=2)
+        for key in ["a", "b"]:
+            cache.put(key, None, key)
+        # a is now the most recently used
+        cache.get("a", None)
+        cache.put("c", None, "c")
+        self.assertEqual(cache.get("b", None), (False, None))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(sorted(f for f in os.listdir(self.folder)), ["a.pickle", "c.pickle"])
+
+        # a new cache takes the LRU order from the modification times
+        past = time.time() - 60
+        os.utime(os.path.join(self.folder, "c.pickle"), (past, past))
+        cache = SolveCache(self.folder, max_entries=2)
+        cache.put("d", None, "d")
+        self.assertEqual(sorted(f for f in os.listdir(self.folder)), ["a.pickle", "d.pickle"])
+
+    def test_corrupted_entry(self):
+        cache = SolveCache(self.folder)
+        cache.put("a", None, "a")
+        with open(os.path.join(self.folder, "a.pickle"), "wb") as f:
+            f.write(b"not a pickle")
+        self.assertEqual(cache.get("a", None), (False, None))
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "evictions": 0, "entries": 0})
+
+        # a truncated entry is a miss too
+        cache.put("b", None, "b" * 100)
+        with open(os.path.join(self.folder, "b.pickle"), "r+b") as f:
+            f.truncate(10)
+        self.assertEqual(cache.get("b", None), (False, None))
+
+    def test_merge(self):
+        cache = SolveCache(self.folder)
+        # the copy of the cache of another process
+        worker = SolveCache(self.folder)
+        worker.get("a", None)
+        worker.put("a", None, "a")
+        worker.get("a", None)
+        cache.merge([worker.counts()])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "entries": 1})
+
+    def test_pool_counts(self):
+        cache = enable_solve_cache(self.folder)
+        try:
+            jobs = [(line_model(cpu=cpu), None, True, False, "highs", (None, None)) for cpu in (10, 20)]
+            first = solve_many(jobs, processes=2)
+            self.assertEqual(cache.stats(), {"hits": 0, "misses": 2, "evictions": 0, "entries": 2})
+            self.assertEqual(solve_many(jobs, processes=2), first)
+            self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "evictions": 0, "entries": 2})
+        finally:
+            solver.solve_cache = None
+
+
+if __name__ == '__main__':
+    unittest.main()
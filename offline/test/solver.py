@@ -0,0 +1,53 @@
+import unittest
+
+from offline.core.solver import build_mapping, parse_scip_stats, parse_solution, parse_status
+from offline.test.service import line_service
+
+# the solutions.data written by scip followed by the status lines of its output kept by call_scip, the service names
+# are postfixed with the ids of the service and of its sla
+SCIP_SOLUTION = """solution status: optimal solution found
+objective value:                               123.45
+x$0101$S0_%(postfix)s                                   1 \t(obj:0)
+x$0102$VHG1_%(postfix)s                                 1 \t(obj:1)
+x$0102$VCDN1_%(postfix)s                                1 \t(obj:5)
+x$0303$CDN0_%(postfix)s                                 1 \t(obj:0)
+y$0101$0102$S0_%(postfix)s$VHG1_%(postfix)s              1 \t(obj:0.1)
+y$0102$0203$VHG1_%(postfix)s$CDN0_%(postfix)s            1 \t(obj:0.1)
+y$0203$0303$VHG1_%(postfix)s$CDN0_%(postfix)s            1 \t(obj:0.1)
+original problem has 1234 variables (1200 bin, 0 int, 0 impl, 34 cont) and 567 constraints
+Presolving Time    :       0.25
+SCIP Status        : problem is solved [optimal solution found]
+Solving Time (sec) :       1.50
+Solving Nodes      :       3
+Gap                :       0.00 %%
+"""
+
+
+class SolverTestCase(unittest.TestCase):
+    def test_parse_solution(self):
+        substrate, service = line_service()
+        data = SCIP_SOLUTION % {"postfix": "%d_%d" % (service.id, service.merged_sla.id)}
+
+        node_solutions, edge_solutions, objective_function, violations = parse_solution(data)
+        self.assertEqual(objective_function, 123.45)
+        self.assertEqual(len(node_solutions), 4)
+        self.assertEqual(len(edge_solutions), 3)
+        self.assertEqual(violations, [])
+        self.assertEqual(parse_status(data), ("optimal", 0.0))
+        self.assertEqual(parse_scip_stats(data), {"variables": 1234, "constraints": 567, "presolving_time": 0.25,
+                                                  "solving_time": 1.5, "nodes": 3})
+
+        mapping = build_mapping(node_solutions, edge_solutions, objective_function, service=service,
+                                substrate=substrate, status="optimal", gap=0.0)
+        self.assertEqual((mapping.service_id, mapping.substrate_id), (service.id, substrate.id))
+        self.assertEqual(sorted([(ns.service_node.name, ns.node.name) for ns in mapping.node_mappings]),
+                         [("CDN0", "0303"), ("S0", "0101"), ("VCDN1", "0102"), ("VHG1", "0102")])
+        self.assertTrue(all([ns.service_id == service.id for ns in mapping.node_mappings]))
+        self.assertEqual(sorted([(es.edge.node_1.name, es.edge.node_2.name, es.serviceEdge.node_1.name,
+                                  es.serviceEdge.node_2.name) for es in mapping.edge_mappings]),
+                         [("0101", "0102", "S0", "VHG1"), ("0102", "0203", "VHG1", "CDN0"),
+                          ("0203", "0303", "VHG1", "CDN0")])
+
+
+if __name__ == '__main__':
+    unittest.main()
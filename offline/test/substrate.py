@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+import numpy as np
+from haversine import haversine
+
+from offline.core.service import Service  # registers the tables of drop_all
+from offline.core import topology_cache
+from offline.core.substrate import DATA_FOLDER, Substrate, parse_graphml, parse_links, read_links
+from offline.core.synthetic import degree_replay, haversine_delay, random_geometric
+from offline.core.topology_cache import CompiledTopology, load_topology
+from offline.core.topology_prep import giant_component, index_edges, largest_component, prune_chains
+from offline.time.persistence import Session, drop_all
+
+
+def grid_substrate():
+    '''
+    a 3x3 grid with diagonals, nodes are named "0101" to "0303", in a new database
+    '''
+    # objects left modified by the previous tests are not flushed into the new database
+    Session().expunge_all()
+    drop_all()
+    return Substrate.fromGrid(width=3, height=3, bw=1000, delay=10, cpu=10)
+
+
+class SubstrateTestCase(unittest.TestCase):
+    def test_substrate_factories(self):
+        substrate = grid_substrate()
+        self.assertEqual(len(substrate.nodes), 9)
+        self.assertEqual(len(substrate.edges), 16)
+        self.assertEqual([(edge.node_1.name, edge.node_2.name) for edge in substrate.edges[:3]],
+                         [("0101", "0102"), ("0101", "0201"), ("0101", "0202")])
+
+        # the nodes of another substrate with the same names are not mixed up
+        other = Substrate.fromPowerLaw(["50", "2", "0.3", "1", "1000", "20", "200"])
+        g = nx.powerlaw_cluster_graph(50, 2, 0.3, 1)
+        self.assertEqual(sorted([(edge.node_1.name, edge.node_2.name) for edge in other.edges]),
+                         sorted([(str(u), str(v)) for u, v in g.edges()]))
+        self.assertTrue(all([edge.node_1 in other.nodes and edge.node_2 in other.nodes for edge in other.edges]))
+        self.assertEqual(set([node.cpu_capacity for node in other.nodes]), set([200.0]))
+        self.assertEqual(len(grid_substrate().nodes), 9)
+
+    def test_topology_cache(self):
+        edges = [("b", "a", 10.0, 1.0), ("a", "c", 20.0, 2.0), ("b", "c", 30.0, 3.0)]
+        topology = CompiledTopology.from_edges(["a", "b", "c"], edges)
+        self.assertEqual(topology.edges(), [edges[1], edges[0], edges[2]])
+        self.assertEqual(topology.nxgraph()["c"]["b"], {"bandwidth": 30.0, "delay": 3.0})
+
+        folder = tempfile.mkdtemp()
+        topology_cache.set_topology_cache(os.path.join(folder, "cache"))
+        try:
+            path = os.path.join(DATA_FOLDER, "Geant2012.graphml")
+            names, edges = parse_graphml(path)
+            compiled = load_topology(path, parse_graphml)
+            self.assertEqual(len(os.listdir(os.path.join(folder, "cache"))), 1)
+            cached = load_topology(path, parse_graphml)
+            self.assertIsInstance(cached.indices, np.memmap)
+            self.assertEqual((cached.node_names(), cached.edges()), (names, edges))
+            self.assertEqual(compiled.edges(), edges)
+
+            path = os.path.join(DATA_FOLDER, "links", "operator-5511.links")
+            links = parse_links(path)
+            load_topology(path, parse_links)
+            self.assertEqual(len(os.listdir(os.path.join(folder, "cache"))), 2)
+            cached = load_topology(path, parse_links)
+            self.assertIsInstance(cached.bandwidth, np.memmap)
+            self.assertEqual((cached.node_names(), cached.edges()), links)
+
+            Session().expunge_all()
+            drop_all()
+            substrate = Substrate.fromGraph(None, ["Geant2012.graphml", 100])
+            self.assertEqual([(edge.node_1.name, edge.node_2.name, edge.delay) for edge in substrate.edges],
+                             [(node_1, node_2, delay) for node_1, node_2, bandwidth, delay in edges])
+        finally:
+            topology_cache.set_topology_cache(os.path.join(topology_cache.RESULTS_FOLDER, "topology_cache"))
+            shutil.rmtree(folder)
+
+    def test_topology_prep(self):
+        # parallel and reversed edges are kept once, in the order of a nx.Graph
+        edges = [("a", "b"), ("c", "a"), ("b", "a"), ("b", "c"), ("d", "e")]
+        names, sources, targets = index_edges(edges)
+        g = nx.Graph(edges)
+        self.assertEqual(names, list(g.nodes()))
+        self.assertEqual([(names[i], names[j]) for i, j in zip(sources, targets)], list(g.edges()))
+
+        self.assertEqual(largest_component(len(names), sources, targets).tolist(), [True, True, True, False, False])
+        # the first of two components of the same size
+        names, sources, targets = index_edges([("a", "b"), ("c", "d")])
+        self.assertEqual(largest_component(len(names), sources, targets).tolist(), [True, True, False, False])
+
+        # a triangle with a chain a-d-e and a leaf f, the chain is removed one node at a time
+        names, sources, targets = index_edges([("a", "b"), ("b", "c"), ("c", "a"), ("a", "d"), ("d", "e"), ("c", "f")])
+        self.assertEqual([names[i] for i in np.flatnonzero(prune_chains(len(names), sources, targets))],
+                         ["a", "b", "c"])
+        # a tree would be removed entirely, it is kept
+        names, sources, targets = index_edges([("a", "b"), ("b", "c"), ("b", "d")])
+        self.assertEqual(prune_chains(len(names), sources, targets).tolist(), [True] * 4)
+
+        names, edges = giant_component([("a", "b"), ("b", "c"), ("c", "a"), ("a", "d"), ("e", "f")], 10)
+        self.assertEqual(names, ["a", "b", "c", "d"])
+        self.assertEqual(edges, [("a", "b", 60), ("a", "c", 60), ("a", "d", 30), ("b", "c", 40)])
+        names, edges = giant_component([("a", "b"), ("b", "c"), ("c", "a"), ("a", "d"), ("e", "f")], 10, prune=True)
+        self.assertEqual(edges, [("a", "b", 40), ("a", "c", 40), ("b", "c", 40)])
+
+    def test_links_substrate(self):
+        links = read_links(os.path.join(DATA_FOLDER, "links", "operator-5511.links"))
+        g = nx.Graph(links)
+        g = g.subgraph(max(nx.connected_components(g), key=len))
+
+        Session().expunge_all()
+        drop_all()
+        substrate = Substrate.fromLinks(["5511"])
+        self.assertEqual(sorted([node.name for node in substrate.nodes]), sorted(g.nodes()))
+        self.assertEqual(sorted([tuple(sorted((edge.node_1.name, edge.node_2.name))) + (edge.bandwidth, edge.delay)
+                                 for edge in substrate.edges]),
+                         sorted([tuple(sorted((node_1, node_2))) + (g.degree(node_1) * g.degree(node_2) * 1e10, 2.0)
+                                 for node_1, node_2 in g.edges()]))
+
+        pruned = Substrate.fromLinks(["5511", "prune"])
+        core = nx.k_core(nx.Graph(g), 2)
+        self.assertEqual(sorted([node.name for node in pruned.nodes]), sorted(core.nodes()))
+        self.assertTrue(all([edge.bandwidth == core.degree(edge.node_1.name) * core.degree(edge.node_2.name) * 1e10
+                             for edge in pruned.edges]))
+
+    def test_synthetic_substrates(self):
+        Session().expunge_all()
+        drop_all()
+        # 2 core nodes, 2x2 aggregation nodes homed on both, 2x2x3 access nodes
+        substrate = Substrate.fromSpec(("isp", ("2", "2", "3", "1", "1000", "10", "200")))
+        self.assertEqual(len(substrate.nodes), 18)
+        self.assertEqual(len(substrate.edges), 1 + 8 + 12)
+        g = substrate.get_nxgraph()
+        self.assertTrue(nx.is_connected(g))
+        self.assertEqual(sorted([edge.bandwidth for edge in substrate.edges if edge.node_1.name == "core0"]),
+                         [6000.0] * 4 + [12000.0])
+
+        topology = random_geometric(np.random.RandomState(3), 500, 150, 1000)
+        self.assertEqual(topology.edges(), random_geometric(np.random.RandomState(3), 500, 150, 1000).edges())
+        self.assertTrue(nx.is_connected(nx.Graph([edge[:2] for edge in topology.edges()])))
+        substrate = Substrate.fromSpec(("geometric", ("500", "150", "3", "1000", "200")))
+        self.assertEqual((len(substrate.nodes), len(substrate.edges)), (len(topology.names), len(topology.sources)))
+        self.assertEqual(sorted([node.name for node in substrate.nodes]), sorted(topology.names))
+
+        topology = degree_replay(np.random.RandomState(3), [1, 2, 2, 3, 8], 300, 10, 2)
+        g = nx.Graph([edge[:2] for edge in topology.edges()])
+        self.assertTrue(nx.is_connected(g))
+        self.assertEqual(g.number_of_nodes(), len(topology.names))
+        self.assertEqual(g.number_of_edges(), len(topology.sources))
+        self.assertTrue(all([bandwidth == g.degree(node_1) * g.degree(node_2) * 10 and delay == 2 for
+                             node_1, node_2, bandwidth, delay in topology.edges()]))
+        substrate = Substrate.fromSpec(("replay", ("5511", "300", "3", "200")))
+        self.assertTrue(nx.is_connected(substrate.get_nxgraph()))
+        self.assertEqual(set([node.cpu_capacity for node in substrate.nodes]), set([200.0]))
+
+    def test_haversine_delay(self):
+        for point_1, point_2 in [((48.85, 2.35), (52.52, 13.40)), ((35.0, -10.0), (60.0, 30.0))]:
+            self.assertAlmostEqual(haversine_delay(*(point_1 + point_2)), haversine(point_1, point_2) / (299.300 * 0.6))
+
+
+if __name__ == '__main__':
+    unittest.main()
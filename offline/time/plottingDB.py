@@ -167,6 +167,8 @@ def plotsol_from_db(**kwargs):
         nodesSol = mapping.dump_node_mapping()
         edgesSol = mapping.dump_edge_mapping()
 
+    # the residual capacities of the substrate
+    su.flush()
     edges = [(edge.node_1.name, edge.node_2.name, edge.bandwidth, edge.delay) for edge in su.edges]
 
     nodesdict = {node.name: node.cpu_capacity for node in su.nodes}
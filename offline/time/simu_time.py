@@ -10,6 +10,7 @@ import pandas as pd
 from offline.core.utils import yellow, red, green
 from ..core.mapping import Mapping
 from ..core.service import Service
+from ..core.solver import set_solve_budget
 from ..core.sla import findSLAByDate
 from ..core.substrate import Substrate
 from ..pricing.generator import migration_calculator
@@ -78,7 +79,11 @@ def merge_services(s1, s2, migration_costs_func):
 
 
 def do_simu(migration_costs_func=migration_calculator, sla_pricer=price_slas, loglevel=logging.INFO,
-            threads=multiprocessing.cpu_count() - 1):
+            threads=1, hour_budget=None):
+    '''
+    :param hour_budget: if set, the solving time of each simulated hour is bounded by this many seconds, the best
+    mappings found in time are used
+    '''
     logging.basicConfig(filename='simu.log', level=loglevel, )
 
     Base.metadata.create_all(engine)
@@ -134,6 +139,7 @@ def do_simu(migration_costs_func=migration_calculator, sla_pricer=price_slas, lo
                       prefix='Progress:', suffix='Complete', barLength=50)
         for adate in pd.date_range(date_start_forecast, date_end_forecast, freq="H"):
             date_counter += 1
+            set_solve_budget(hour_budget)
             printProgress(date_counter, len(pd.date_range(date_start_forecast, date_end_forecast, freq="H")),
                           prefix='Progress:', suffix='Complete', barLength=50)
             active_service = []
@@ -245,6 +251,7 @@ def do_simu(migration_costs_func=migration_calculator, sla_pricer=price_slas, lo
             total_bandwidth = max(1, sum(
                 [sum([sla.get_total_bandwidth() for sla in service.slas]) for service in session.query(Service).all()]))
 
+        set_solve_budget(None)
         y, y1, sla_hi, sla_low, total_bandwidth = list(zip(*data))
         # print("[")
         # for i in range(0, len(y)):
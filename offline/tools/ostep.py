@@ -1,15 +1,15 @@
 #!/usr/bin/env python
 
 import logging
-import multiprocessing
 import os
 import random
 import sys
-from multiprocessing.pool import ThreadPool
 
 from numpy.random import RandomState
 
+from ..core import grid_search, relax
 from ..core.service import Service
+from ..core.solve_stats import set_experiment
 from ..core.service_topo_generator import ServiceTopoFullGenerator
 from ..core.service_topo_heuristic import ServiceTopoHeuristic
 from ..core.sla import Sla, SlaNodeSpec
@@ -21,6 +21,12 @@ RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../r
 
 candidate_count = 0
 
+# the embeddings the grid search did not need, see search_candidates_param
+saved_count = 0
+
+# the candidates the bound pruning did not solve, see embed_candidates_param
+pruned_count = 0
+
 
 def clean_and_create_experiment(topo, seed):
     '''
@@ -34,6 +40,7 @@ def clean_and_create_experiment(topo, seed):
     Base.metadata.create_all(engine)
     drop_all()
 
+    set_experiment("%s(%s)-%s" % (topo[0], ",".join([str(spec) for spec in topo[1]]), seed))
     rs = RandomState(seed)
     su = Substrate.fromSpec(topo, rs)
     return rs, su
@@ -108,17 +115,52 @@ def create_sla(starts, cdns, sourcebw, topo=None, su=None, rs=None, seed=0):
     return sla
 
 
+def take_topologies(topos, max_topologies=None, sample_rate=None, rs=random):
+    '''
+    :param topos: the topologies of a topology container, consumed lazily
+    :param max_topologies: stop after that many topologies, no limit if None
+    :param sample_rate: keep each topology with this probability, keep them all if None
+    :param rs: the random state used for sampling
+    '''
+    count = 0
+    for topo in topos:
+        if max_topologies is not None and count >= max_topologies:
+            return
+        if sample_rate is not None and rs.random() >= sample_rate:
+            continue
+        count += 1
+        yield topo
+
+
+def random_topology(topos, rs=random):
+    '''
+    :return: one of the topologies taken uniformly at random, without keeping the others in memory
+    '''
+    res = None
+    for index, topo in enumerate(topos, start=1):
+        if rs.random() * index < 1:
+            res = topo
+    return res
+
+
 def generate_candidates_param(sla, vhg_count=None, vcdn_count=None,
                               automatic=True, use_heuristic=True, disable_isomorph_check=False,
-                              max_vhg_count=10, max_vcdn_count=10):
+                              max_vhg_count=10, max_vcdn_count=10, max_topologies=None, sample_rate=None,
+                              processes=1):
+    '''
+    yield the candidates to embed as the topologies are generated
+    :param max_topologies: the maximum number of topologies for each vhg and vcdn count, no limit if None
+    :param sample_rate: the probability of keeping each topology, see take_topologies
+    :param processes: the number of processes enumerating the topologies without the heuristic
+    '''
     if not automatic:
         if use_heuristic:
             topoContainer = ServiceTopoHeuristic(sla=sla, vhg_count=vhg_count, vcdn_count=vcdn_count)
         else:
             topoContainer = ServiceTopoFullGenerator(sla=sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
-                                                     disable_isomorph_check=disable_isomorph_check)
+                                                     disable_isomorph_check=disable_isomorph_check, processes=processes)
 
-        for topo in topoContainer.getTopos():
+        for topo in take_topologies(topoContainer.iterTopos(), max_topologies, sample_rate):
             yield (topo, [sla.id], vhg_count, vcdn_count, use_heuristic)
     else:
         merged_sla = Service.get_merged_sla([sla])
@@ -127,8 +169,9 @@ def generate_candidates_param(sla, vhg_count=None, vcdn_count=None,
             for vhg_count in range(1, len(merged_sla.get_start_nodes()) + 1):
                 for vcdn_count in range(1, vhg_count + 1):
                     topoContainer = ServiceTopoFullGenerator(sla=merged_sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
-                                                             disable_isomorph_check=disable_isomorph_check)
-                    yield (random.choice(list(topoContainer.getTopos())), [merged_sla.id], vhg_count, vcdn_count,
+                                                             disable_isomorph_check=disable_isomorph_check,
+                                                             processes=processes)
+                    yield (random_topology(topoContainer.iterTopos()), [merged_sla.id], vhg_count, vcdn_count,
                            use_heuristic)
 
         else:
@@ -139,34 +182,103 @@ def generate_candidates_param(sla, vhg_count=None, vcdn_count=None,
                     else:
                         topoContainer = ServiceTopoFullGenerator(sla=merged_sla, vhg_count=vhg_count,
                                                                  vcdn_count=vcdn_count,
-                                                                 disable_isomorph_check=disable_isomorph_check)
+                                                                 disable_isomorph_check=disable_isomorph_check,
+                                                                 processes=processes)
 
-                    for topo in topoContainer.getTopos():
+                    for topo in take_topologies(topoContainer.iterTopos(), max_topologies, sample_rate):
                         yield (topo, [merged_sla.id], vhg_count, vcdn_count, use_heuristic)
 
 
+def embed_candidates_param(candidates_param, processes=1, use_heuristic=True):
+    '''
+    :param candidates_param: the candidates, see generate_candidates_param
+    :param processes: if > 1, the candidates are solved in a pool of processes. They are also solved with
+    Service.embed_candidates if bound pruning is enabled
+    :return: the embedded services
+    '''
+    if processes > 1 or relax.candidate_pruning is not None:
+        candidates_param = list(candidates_param)
+        logging.debug("%d candidate " % len(candidates_param))
+        global candidate_count, pruned_count
+        pruning = relax.candidate_pruning
+        evaluated = None if pruning is None else pruning.evaluated
+        services = Service.embed_candidates([param[:4] for param in candidates_param], max(processes, 1),
+                                            use_heuristic=use_heuristic)
+        if pruning is None:
+            candidate_count += len(candidates_param)
+        else:
+            # only the candidates that were solved are embeddings
+            candidate_count += pruning.evaluated - evaluated
+            pruned_count += len(candidates_param) - (pruning.evaluated - evaluated)
+        return services
+
+    # each candidate is embedded as soon as its topology is generated
+    services = [embbed_service(param) for param in candidates_param]
+    logging.debug("%d candidate " % len(services))
+    return services
+
+
+def search_candidates_param(sla, use_heuristic=True, max_vhg_count=10, max_vcdn_count=10, processes=1,
+                            max_topologies=None, sample_rate=None):
+    '''
+    embed the candidates of each vhg and vcdn count best-first, and stop once the remaining counts cannot beat the best
+    candidate so far, see grid_search.GridSearch. A skipped count saves one embedding with the heuristic, at least one
+    without
+    :return: the embedded services
+    '''
+    merged_sla = Service.get_merged_sla([sla])
+    points = grid_search.grid_points(len(merged_sla.get_start_nodes()), max_vhg_count, max_vcdn_count)
+    services = []
+
+    def evaluate(point):
+        vhg_count, vcdn_count = point
+        candidates_param = generate_candidates_param(merged_sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
+                                                     automatic=False, use_heuristic=use_heuristic,
+                                                     max_topologies=max_topologies, sample_rate=sample_rate,
+                                                     processes=processes)
+        embedded = embed_candidates_param(candidates_param, processes, use_heuristic=use_heuristic)
+        services.extend(embedded)
+        objective_functions = [service.mapping.objective_function for service in embedded if
+                               service.mapping is not None]
+        return min(objective_functions) if len(objective_functions) > 0 else None
+
+    global saved_count
+    saved = grid_search.grid_search.saved
+    grid_search.grid_search.search(merged_sla, points, evaluate)
+    saved_count += grid_search.grid_search.saved - saved
+    return services
+
+
 def optimize_sla(sla, vhg_count=None, vcdn_count=None,
                  automatic=True, use_heuristic=True, random_edges=False, rs=None, isomorph_check=True,
-                 max_vhg_count=None, max_vcdn_count=None):
+                 max_vhg_count=10, max_vcdn_count=10, processes=1, max_topologies=None, sample_rate=None):
+    '''
+    :param processes: if > 1, the candidates are enumerated and solved in a pool of processes. They are also solved
+    with Service.embed_candidates if bound pruning is enabled
+    :param max_topologies: see generate_candidates_param
+    :param sample_rate: see generate_candidates_param
+    :return: the winner and the number of candidates embedded so far, in automatic mode the vhg and vcdn counts are
+    explored best-first if the grid search is enabled, see search_candidates_param
+    '''
     if not random_edges:
         candidates_param = generate_candidates_param(sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
-                                                     automatic=automatic, use_heuristic=use_heuristic,max_vhg_count=max_vhg_count, max_vcdn_count=max_vcdn_count)
+                                                     automatic=automatic, use_heuristic=use_heuristic,max_vhg_count=max_vhg_count, max_vcdn_count=max_vcdn_count,
+                                                     max_topologies=max_topologies, sample_rate=sample_rate,
+                                                     processes=processes)
     else:
         candidates_param = generate_candidates_param(sla, vhg_count=vhg_count, vcdn_count=vcdn_count,
                                                      automatic=automatic, use_heuristic=False,
                                                      disable_isomorph_check=True,max_vhg_count=max_vhg_count, max_vcdn_count=max_vcdn_count)
 
-    candidates_param = list(candidates_param)
-    logging.debug("%d candidate " %len(candidates_param))
-
     # sys.stdout.write("\n\t Service to embed :%d\n" % len(candidates_param))
 
     # print("%d param to optimize" % len(candidates_param))
-    pool = ThreadPool(multiprocessing.cpu_count() - 1)
-    # sys.stdout.write("\n\t Embedding services:%d\n" % len(candidates_param))
-    #services = pool.map(embbed_service, candidates_param)
-
-    services = [embbed_service(param) for param in candidates_param]
+    if automatic and not random_edges and grid_search.grid_search is not None:
+        services = search_candidates_param(sla, use_heuristic=use_heuristic, max_vhg_count=max_vhg_count,
+                                           max_vcdn_count=max_vcdn_count, processes=processes,
+                                           max_topologies=max_topologies, sample_rate=sample_rate)
+    else:
+        services = embed_candidates_param(candidates_param, processes, use_heuristic=use_heuristic and not random_edges)
     #sys.stdout.write(" done!\n")
 
     services = [x for x in services if x.mapping is not None]
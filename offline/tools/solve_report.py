@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+import argparse
+
+from ..core.solve_stats import read_solve_stats, format_report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='aggregate the solve stats written with --solve-stats')
+    parser.add_argument('stats', help="the file of the solve stats")
+    parser.add_argument('--by', nargs='+', default=["experiment", "vhg_count", "vcdn_count"],
+                        help="the columns the solves are grouped by (eg. experiment sla_id)")
+    args = parser.parse_args()
+
+    print(format_report(read_solve_stats(args.stats), by=args.by))
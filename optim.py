@@ -12,7 +12,13 @@ import sys
 from argparse import RawTextHelpFormatter
 
 import offline.core.sla
+from offline.core.clustering import CLUSTERING_MODES, set_clustering_mode
+from offline.core.grid_search import enable_grid_search
+from offline.core.relax import BOUNDS, enable_bound_pruning
+from offline.core.solve_stats import enable_solve_stats
+from offline.core.solver import SOLVER_BACKENDS, set_solver_backend, set_solve_limits, set_corridor_pruning, enable_scip_pool
 from offline.time.plottingDB import plotsol_from_db
+import offline.tools.ostep
 from offline.tools.ostep import clean_and_create_experiment, optimize_sla, create_sla
 
 root = logging.getLogger()
@@ -48,7 +54,13 @@ parser = argparse.ArgumentParser(description='1 iteration for solver', epilog=
     \t sudo docker run nherbaut/simuservice --start 0101 0202 0303 --cdn 0505 --vhg 1 --vcdn 1  --topo=grid,width, height, bw, delay, cpu\n
     \t sudo docker run nherbaut/simuservice --start 0101 0202 0303 --cdn 0505 --vhg 1 --vcdn 1 --topo=grid,5,5,1000000000,10,1000\n\n\n
     \t sudo docker run nherbaut/simuservice --start 22  --cdn 38 --vhg 1 --vcdn 1 --topo=file,file,cpu\n
-    \t sudo docker run nherbaut/simuservice --start 22  --cdn 38 --vhg 1 --vcdn 1 --topo=file,Geant2012.graphml,10000
+    \t sudo docker run nherbaut/simuservice --start 22  --cdn 38 --vhg 1 --vcdn 1 --topo=file,Geant2012.graphml,10000\n\n\n
+    \t sudo docker run nherbaut/simuservice --start acc0 acc1 --cdn core0 --vhg 1 --vcdn 1 --topo=isp,core, aggregation, access, seed, bw, delay, cpu\n
+    \t sudo docker run nherbaut/simuservice --start acc0 acc1 --cdn core0 --vhg 1 --vcdn 1 --topo=isp,10,10,1000,1,1000000000,10,200\n\n\n
+    \t sudo docker run nherbaut/simuservice --start 1 2 --cdn 3 --vhg 1 --vcdn 1 --topo=geometric,n, radius, seed, bw, cpu\n
+    \t sudo docker run nherbaut/simuservice --start 1 2 --cdn 3 --vhg 1 --vcdn 1 --topo=geometric,100000,12,1,1000000000,200\n\n\n
+    \t sudo docker run nherbaut/simuservice --start 1 2 --cdn 3 --vhg 1 --vcdn 1 --topo=replay,operator, n, seed, cpu\n
+    \t sudo docker run nherbaut/simuservice --start 1 2 --cdn 3 --vhg 1 --vcdn 1 --topo=replay,5511,10000,1,200
 
 
     """, formatter_class=RawTextHelpFormatter)
@@ -73,11 +85,50 @@ parser.add_argument('--topo', help="specify topo to use", default=('grid', ["5",
 
 parser.add_argument('--plot', dest="plot", action="store_true")
 parser.add_argument('--disable-heuristic', dest="disable_heuristic", action="store_true")
+parser.add_argument('--processes', help="number of processes used to solve the candidates in --auto mode",
+                    default=1, type=int)
+parser.add_argument('--solver', help="solver backend used for embedding", choices=SOLVER_BACKENDS, default="scip")
+parser.add_argument('--time-limit', dest="time_limit", type=float, default=None,
+                    help="time limit of each solve in seconds, the best solution found so far is used")
+parser.add_argument('--gap-limit', dest="gap_limit", type=float, default=None,
+                    help="relative gap at which each solve stops (eg. 0.01)")
+parser.add_argument('--corridor', dest="corridor", type=int, default=None,
+                    help="solve on the substrate nodes near the starters and on the CORRIDOR shortest paths toward "
+                         "the CDNs first, the full substrate is used if no solution is found")
+parser.add_argument('--bound-pruning', dest="bound_pruning", choices=BOUNDS, default=None,
+                    help="solve the candidates by increasing lower bound and skip the ones that cannot beat the best "
+                         "one so far, the bound is the cpu cost (fixed) or the LP relaxation (lp)")
+parser.add_argument('--grid-search', dest="grid_search", action="store_true",
+                    help="explore the vhg and vcdn counts by increasing estimated cost, and stop once the remaining "
+                         "ones cannot beat the best candidate so far")
+parser.add_argument('--clustering', dest="clustering", choices=CLUSTERING_MODES, default="auto",
+                    help="how the heuristic groups the starters behind vhgs and vcdns, exact is exponential in the "
+                         "number of starters, auto uses it for small slas and k-medoids for the others")
+parser.add_argument('--max-topologies', dest="max_topologies", type=int, default=None,
+                    help="maximum number of candidate topologies for each vhg and vcdn count, no limit if not set")
+parser.add_argument('--sample-rate', dest="sample_rate", type=float, default=None,
+                    help="probability of keeping each candidate topology, all of them are kept if not set")
+parser.add_argument('--solve-stats', dest="solve_stats", default=None,
+                    help="file where the telemetry of every solve is appended, see offline.tools.solve_report")
+parser.add_argument('--scip-workers', dest="scip_workers", type=int, default=None,
+                    help="number of long-lived scip sessions, one scip process per model if not set")
 parser.add_argument('--dest_folder', help="destination folder for restults", default=RESULTS_FOLDER)
 parser.add_argument('--json', help='display json results in stdout', dest="json", action="store_true")
 parser.add_argument('--base64', help='display json results in base64', dest="b64", action="store_true")
 
 args = parser.parse_args()
+set_solver_backend(args.solver)
+set_solve_limits(args.time_limit, args.gap_limit)
+set_corridor_pruning(args.corridor)
+set_clustering_mode(args.clustering)
+if args.bound_pruning is not None:
+    enable_bound_pruning(args.bound_pruning)
+if args.grid_search:
+    enable_grid_search()
+if args.solve_stats is not None:
+    enable_solve_stats(args.solve_stats)
+if args.scip_workers is not None:
+    enable_scip_pool(args.scip_workers)
 
 if args.disable_embedding:
     rs, su = clean_and_create_experiment(args.topo, 0)
@@ -141,11 +192,17 @@ else:
     sla = create_sla(start_nodes, cdn_nodes, args.sourcebw, su=su, rs=rs)
     service, count_embedding = optimize_sla(sla, vhg_count=args.vhg,
                                             vcdn_count=args.vcdn,
-                                            automatic=args.auto, use_heuristic=not args.disable_heuristic)
+                                            automatic=args.auto, use_heuristic=not args.disable_heuristic,
+                                            processes=args.processes, max_topologies=args.max_topologies,
+                                            sample_rate=args.sample_rate)
 
     if os.path.exists("winner"):
         shutil.rmtree("winner")
-    shutil.copytree(os.path.join(RESULTS_FOLDER, str(service.id)), "winner")
+    if os.path.exists(os.path.join(RESULTS_FOLDER, str(service.id))):
+        shutil.copytree(os.path.join(RESULTS_FOLDER, str(service.id)), "winner")
+    else:
+        # the in-memory backends do not write the model of the services
+        logging.debug("no results folder for service %d, winner not copied" % service.id)
 
     if service.mapping is not None:
 
@@ -168,6 +225,10 @@ else:
 
             print(("Successfull mapping w price: \t %lf in \t %d embedding \t winner is %d (%d,%d)" % (
                 service.mapping.objective_function, count_embedding, service.id, service.vhg_count, service.vcdn_count)))
+            if args.grid_search:
+                print(("%d embedding saved by the grid search" % offline.tools.ostep.saved_count))
+            if args.bound_pruning is not None:
+                print(("%d embedding saved by the bound pruning" % offline.tools.ostep.pruned_count))
 
         if args.plot:
             dest_folder = os.path.join(RESULTS_FOLDER, str(service.id))
@@ -11,6 +11,7 @@ from multiprocessing.pool import ThreadPool
 import numpy as np
 
 import offline.core.sla
+from offline.core.solver import enable_solve_cache, enable_scip_pool
 from offline.tools.ostep import clean_and_create_experiment, create_sla, generate_candidates_param, embbed_service
 
 root = logging.getLogger()
@@ -72,9 +73,24 @@ parser.add_argument('--topo', help="specify topo to use", default=('grid', ["5",
 parser.add_argument('--plot', dest="plot", action="store_true")
 parser.add_argument('--disable-heuristic', dest="disable_heuristic", action="store_true")
 parser.add_argument('--disable-isomorph-check', dest="disable_isomorph_check", action="store_true")
+parser.add_argument('--processes', type=int, default=1,
+                    help="number of processes enumerating the candidate topologies without the heuristic")
+parser.add_argument('--max-topologies', dest="max_topologies", type=int, default=None,
+                    help="maximum number of candidate topologies for each vhg and vcdn count, no limit if not set")
+parser.add_argument('--sample-rate', dest="sample_rate", type=float, default=None,
+                    help="probability of keeping each candidate topology, all of them are kept if not set")
 parser.add_argument('--dest_folder', help="destination folder for restults", default=RESULTS_FOLDER)
+parser.add_argument('--scip-workers', dest="scip_workers", type=int, default=None,
+                    help="number of long-lived scip sessions, one scip process per model if not set")
+parser.add_argument('--solve-cache', dest="solve_cache", default=None,
+                    help="folder of a persistent cache of solved models, disabled if not set")
 
 args = parser.parse_args()
+solve_cache = None
+if args.solve_cache is not None:
+    solve_cache = enable_solve_cache(args.solve_cache)
+if args.scip_workers is not None:
+    enable_scip_pool(args.scip_workers)
 pool = ThreadPool(multiprocessing.cpu_count() - 1)
 if args.auto is False and (args.vhg is None or args.vcdn is None):
     parser.error('please specify --vhg and --vcdn args if not automatic calculation')
@@ -99,16 +115,18 @@ for start in range(1, args.max_start + 1):
 
         candidates = generate_candidates_param(sla,
                                                automatic=True, use_heuristic=not args.disable_heuristic,
-                                               disable_isomorph_check=args.disable_isomorph_check)
-
-        candidate_count = 0
-
+                                               disable_isomorph_check=args.disable_isomorph_check,
+                                               max_topologies=args.max_topologies, sample_rate=args.sample_rate,
+                                               processes=args.processes)
 
         # sys.stdout.write("\n\t Embedding services:%d\n" % len(candidates_param))
-        services = pool.map(embbed_service, candidates)
+        # the candidates are embedded as they are generated
+        services = pool.imap(embbed_service, candidates)
 
-        res[start - 1, cdn - 1] += len(services)
+        res[start - 1, cdn - 1] += sum([1 for service in services])
 
 np.savetxt(os.path.join(args.dest_folder, "res.txt"), res)
+if solve_cache is not None:
+    solve_cache.log_stats()
 print(res)
 print((np.sum(res)))
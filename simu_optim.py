@@ -5,6 +5,12 @@ import logging
 import os
 
 from offline.core.sla import generate_random_slas
+from offline.core.clustering import CLUSTERING_MODES, set_clustering_mode
+from offline.core.grid_search import enable_grid_search
+from offline.core.relax import BOUNDS, enable_bound_pruning
+from offline.core.distance_cache import log_cache_stats
+from offline.core.solve_stats import enable_solve_stats, read_solve_stats, log_report
+from offline.core.solver import SOLVER_BACKENDS, set_solver_backend, set_solve_limits, set_corridor_pruning, enable_solve_cache, enable_scip_pool
 from offline.time.persistence import Tenant, Session
 from offline.tools.ostep import clean_and_create_experiment
 from offline.tools.ostep import optimize_sla
@@ -45,9 +51,49 @@ parser.add_argument('--sourcebw', help="cumulated source bw from every source (d
 parser.add_argument('--topo', help="specify topo to use", default=('grid', ["5", "5", "100000000", "10", "200"]),
                     type=valid_topo)
 parser.add_argument('--disable-heuristic', dest="disable_heuristic", action="store_true")
+parser.add_argument('--solver', help="solver backend used for embedding", choices=SOLVER_BACKENDS, default="scip")
 parser.add_argument('--dest_folder', help="destination folder for restults", default=RESULTS_FOLDER)
+parser.add_argument('--time-limit', dest="time_limit", type=float, default=None,
+                    help="time limit of each solve in seconds, the best solution found so far is used")
+parser.add_argument('--gap-limit', dest="gap_limit", type=float, default=None,
+                    help="relative gap at which each solve stops (eg. 0.01)")
+parser.add_argument('--corridor', dest="corridor", type=int, default=None,
+                    help="solve on the substrate nodes near the starters and on the CORRIDOR shortest paths toward "
+                         "the CDNs first, the full substrate is used if no solution is found")
+parser.add_argument('--bound-pruning', dest="bound_pruning", choices=BOUNDS, default=None,
+                    help="solve the candidates by increasing lower bound and skip the ones that cannot beat the best "
+                         "one so far, the bound is the cpu cost (fixed) or the LP relaxation (lp)")
+parser.add_argument('--grid-search', dest="grid_search", action="store_true",
+                    help="explore the vhg and vcdn counts by increasing estimated cost, and stop once the remaining "
+                         "ones cannot beat the best candidate so far")
+parser.add_argument('--clustering', dest="clustering", choices=CLUSTERING_MODES, default="auto",
+                    help="how the heuristic groups the starters behind vhgs and vcdns, exact is exponential in the "
+                         "number of starters, auto uses it for small slas and k-medoids for the others")
+parser.add_argument('--solve-stats', dest="solve_stats", default=None,
+                    help="file where the telemetry of every solve is appended, see offline.tools.solve_report")
+parser.add_argument('--scip-workers', dest="scip_workers", type=int, default=None,
+                    help="number of long-lived scip sessions, one scip process per model if not set")
+parser.add_argument('--solve-cache', dest="solve_cache", default=None,
+                    help="folder of a persistent cache of solved models, disabled if not set")
 
 args = parser.parse_args()
+solve_cache = None
+if args.solve_cache is not None:
+    solve_cache = enable_solve_cache(args.solve_cache)
+set_solver_backend(args.solver)
+set_solve_limits(args.time_limit, args.gap_limit)
+set_corridor_pruning(args.corridor)
+set_clustering_mode(args.clustering)
+bound_pruning = None
+if args.bound_pruning is not None:
+    bound_pruning = enable_bound_pruning(args.bound_pruning)
+grid_search = None
+if args.grid_search:
+    grid_search = enable_grid_search()
+if args.solve_stats is not None:
+    enable_solve_stats(args.solve_stats)
+if args.scip_workers is not None:
+    enable_scip_pool(args.scip_workers)
 
 # create the topology
 rs, su = clean_and_create_experiment(args.topo, args.seed)
@@ -93,6 +139,16 @@ for sla in slas:
                                                  service_yes_heuristic11_mapping_objective_function
                                                  )))
 
+if solve_cache is not None:
+    solve_cache.log_stats()
+if bound_pruning is not None:
+    bound_pruning.log_stats()
+if grid_search is not None:
+    grid_search.log_stats()
+if args.solve_stats is not None:
+    log_report(read_solve_stats(args.solve_stats))
+log_cache_stats()
+
 
 
 '''
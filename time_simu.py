@@ -8,16 +8,48 @@ import matplotlib
 matplotlib.use('Agg')
 
 import multiprocessing
+from offline.core.distance_cache import log_cache_stats
+from offline.core.grid_search import enable_grid_search
+from offline.core.solve_stats import enable_solve_stats, read_solve_stats, log_report
+from offline.core.solver import enable_solve_cache, enable_scip_pool, set_solve_limits
 from offline.pricing.generator import price_slas, p
 from offline.time.simu_time import do_simu
 
 parser = argparse.ArgumentParser(description='launch time simu')
 parser.add_argument('--ispmigration', '-i', default=10, type=float)
 parser.add_argument('--cdnDiscount', '-d', default=0.5, type=float)
-parser.add_argument('--threads', '-t', default=(multiprocessing.cpu_count() - 1), type=int)
+parser.add_argument('--threads', '-t', default=1, type=int,
+                    help="number of processes solving the candidate services, they are solved in the simulation "
+                         "process if 1")
 parser.add_argument('--log', '-l', default="DEBUG", type=str)
+parser.add_argument('--scip-workers', dest="scip_workers", type=int, default=None,
+                    help="number of long-lived scip sessions, one scip process per model if not set")
+parser.add_argument('--time-limit', dest="time_limit", type=float, default=None,
+                    help="time limit of each solve in seconds, the best solution found so far is used")
+parser.add_argument('--gap-limit', dest="gap_limit", type=float, default=None,
+                    help="relative gap at which each solve stops (eg. 0.01)")
+parser.add_argument('--hour-budget', dest="hour_budget", type=float, default=None,
+                    help="solving time budget of each simulated hour in seconds")
+parser.add_argument('--solve-cache', dest="solve_cache", default=None,
+                    help="folder of a persistent cache of solved models, disabled if not set")
+parser.add_argument('--grid-search', dest="grid_search", action="store_true",
+                    help="explore the vhg and vcdn counts by increasing estimated cost, and stop once the remaining "
+                         "ones cannot beat the best candidate so far")
+parser.add_argument('--solve-stats', dest="solve_stats", default=None,
+                    help="file where the telemetry of every solve is appended, see offline.tools.solve_report")
 
 args = parser.parse_args()
+solve_cache = None
+if args.solve_cache is not None:
+    solve_cache = enable_solve_cache(args.solve_cache)
+if args.scip_workers is not None:
+    enable_scip_pool(args.scip_workers)
+set_solve_limits(args.time_limit, args.gap_limit)
+grid_search = None
+if args.grid_search:
+    grid_search = enable_grid_search()
+if args.solve_stats is not None:
+    enable_solve_stats(args.solve_stats)
 
 numeric_level = getattr(logging, args.log.upper(), None)
 if numeric_level is None:
@@ -26,7 +58,15 @@ if numeric_level is None:
 best_discretization_param_str, isp_cost, total_bw, total_sla_price, sla_count = do_simu(
     migration_costs_func=lambda x: sum([10 + abs(y[0] - y[1]) for y in x]) * args.ispmigration,
     sla_pricer=partial(price_slas, f=partial(p, r=args.cdnDiscount, m=24)), loglevel=numeric_level,
-    threads=args.threads)
+    threads=args.threads, hour_budget=args.hour_budget)
+
+if solve_cache is not None:
+    solve_cache.log_stats()
+if grid_search is not None:
+    grid_search.log_stats()
+if args.solve_stats is not None:
+    log_report(read_solve_stats(args.solve_stats))
+log_cache_stats()
 
 print("migration_cos\t\tcdn_discount\t\tbest_discretization_param_str\t\tisp_cost\t\ttotal_bw=\t\ttotal_sla_price=\t\tsla_count=%d" )
 print(("%lf\t\t%lf\t\t%s\t\t%lf\t\t%lf\t\t%lf\t\t%d" % (